@@ -0,0 +1,409 @@
+"""学习记录的统计与导出
+
+按 id 游标分批读取 chat_history（每批一次短查询，不长时间占用读事务），
+边读边累加统计，内存占用与记录总数无关：
+- 每个小节的提问数、追加提问数、回答数、回答长度（总字数、最长）
+- 每个小节最常见的追加提问：Space-Saving 算法，每个小节只保留固定数量的计数器
+- 追加提问指同一会话在同一页面上第一个问题之后的提问，由 SQL 按索引判断，无需在内存中记录会话
+
+统计结果保存在数据库的汇总表中，refresh() 只处理上次处理到的 id 之后的新记录。
+export() 以 JSONL、CSV 或 Parquet（需要 pyarrow）流式导出原始记录。
+
+用法:
+    python analytics.py refresh
+    python analytics.py summary --top 5
+    python analytics.py export --format parquet --output chat_history.parquet
+"""
+import argparse
+import csv
+import json
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from db import Database
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_TOP_K = 20
+# 追加提问计入统计前截断到的长度，避免个别超长提问占用过多内存
+MAX_QUESTION_CHARS = 200
+
+EXPORT_FORMATS = ("jsonl", "csv", "parquet")
+EXPORT_COLUMNS = ("id", "session_id", "lecture", "page", "section", "subsection",
+                  "role", "content", "timestamp", "is_follow_up")
+
+_WHITESPACE = re.compile(r"\s+")
+
+# 同一会话、同一页面上更早的提问存在时为追加提问（走 idx_chat_history_page 索引）
+_ROWS_SQL = """
+    SELECT c.id, c.session_id, c.lecture, c.page, c.section, c.subsection,
+           c.role, c.content, c.timestamp,
+           CASE WHEN c.role = 'user' THEN EXISTS (
+               SELECT 1 FROM chat_history h
+               WHERE h.session_id = c.session_id
+                 AND h.section = c.section
+                 AND h.subsection = c.subsection
+                 AND h.id < c.id
+                 AND h.role = 'user'
+                 AND h.lecture IS c.lecture
+           ) END AS is_follow_up
+    FROM chat_history c
+    WHERE c.id > ? AND c.id <= ?
+    ORDER BY c.id
+    LIMIT ?
+"""
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS analytics_state (
+        name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_section_stats (
+        lecture TEXT NOT NULL,
+        section TEXT NOT NULL,
+        subsection TEXT NOT NULL,
+        questions INTEGER NOT NULL DEFAULT 0,
+        follow_ups INTEGER NOT NULL DEFAULT 0,
+        answers INTEGER NOT NULL DEFAULT 0,
+        answer_chars INTEGER NOT NULL DEFAULT 0,
+        max_answer_chars INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (lecture, section, subsection)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_top_follow_ups (
+        lecture TEXT NOT NULL,
+        section TEXT NOT NULL,
+        subsection TEXT NOT NULL,
+        question TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        error INTEGER NOT NULL,
+        PRIMARY KEY (lecture, section, subsection, question)
+    )
+    """,
+]
+
+_UPSERT_STATS_SQL = """
+    INSERT INTO analytics_section_stats
+    (lecture, section, subsection, questions, follow_ups, answers, answer_chars, max_answer_chars)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (lecture, section, subsection) DO UPDATE SET
+        questions = questions + excluded.questions,
+        follow_ups = follow_ups + excluded.follow_ups,
+        answers = answers + excluded.answers,
+        answer_chars = answer_chars + excluded.answer_chars,
+        max_answer_chars = MAX(max_answer_chars, excluded.max_answer_chars)
+"""
+
+# (lecture, section, subsection)；早期记录没有 lecture，记为空字符串
+SectionKey = Tuple[str, str, str]
+
+
+def normalize_question(text: str) -> str:
+    """合并空白并截断，使措辞相同的提问计为同一个"""
+    return _WHITESPACE.sub(" ", text).strip()[:MAX_QUESTION_CHARS]
+
+
+class SpaceSaving:
+    """Space-Saving 频繁项统计：最多 capacity 个计数器，计数上界为 count，误差不超过 error"""
+    __slots__ = ("capacity", "counts", "errors")
+
+    def __init__(self, capacity: int = DEFAULT_TOP_K):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, item: str, count: int = 1):
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        error = 0
+        if len(self.counts) >= self.capacity:
+            # 替换计数最小的项，新项继承其计数作为误差
+            victim = min(self.counts, key=self.counts.__getitem__)
+            error = self.counts.pop(victim)
+            del self.errors[victim]
+        self.counts[item] = error + count
+        self.errors[item] = error
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """按计数从高到低返回 (项, 计数, 误差)"""
+        items = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(item, count, self.errors[item]) for item, count in items[:k]]
+
+
+class _SectionDelta:
+    """一次刷新中某个小节的增量"""
+    __slots__ = ("questions", "follow_ups", "answers", "answer_chars", "max_answer_chars")
+
+    def __init__(self):
+        self.questions = 0
+        self.follow_ups = 0
+        self.answers = 0
+        self.answer_chars = 0
+        self.max_answer_chars = 0
+
+
+class LearningAnalytics:
+    """chat_history 的流式读取、增量统计和导出"""
+
+    def __init__(self, db: Database, batch_size: int = DEFAULT_BATCH_SIZE,
+                 top_k: int = DEFAULT_TOP_K):
+        self.db = db
+        self.batch_size = batch_size
+        self.top_k = top_k
+        with self.db.connection() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+
+    def iter_batches(self, after_id: int = 0,
+                     until_id: Optional[int] = None) -> Iterator[List[tuple]]:
+        """按 id 游标分批产出 (after_id, until_id] 范围内的记录，列顺序同 EXPORT_COLUMNS"""
+        with self.db.connection() as conn:
+            if until_id is None:
+                until_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chat_history").fetchone()[0]
+        cursor = after_id
+        while cursor < until_id:
+            # 每批单独借用连接，批与批之间不持有读事务，不妨碍写入和 WAL 检查点
+            with self.db.connection() as conn:
+                rows = conn.execute(_ROWS_SQL, (cursor, until_id, self.batch_size)).fetchall()
+            if not rows:
+                break
+            yield rows
+            cursor = rows[-1][0]
+
+    def iter_rows(self, after_id: int = 0, until_id: Optional[int] = None) -> Iterator[tuple]:
+        for rows in self.iter_batches(after_id, until_id):
+            yield from rows
+
+    def last_id(self) -> int:
+        """汇总表已处理到的记录 id"""
+        with self.db.connection() as conn:
+            row = conn.execute(
+                "SELECT last_id FROM analytics_state WHERE name = 'section_stats'"
+            ).fetchone()
+        return row[0] if row else 0
+
+    def _load_top(self, conn, key: SectionKey) -> SpaceSaving:
+        counter = SpaceSaving(self.top_k)
+        for question, count, error in conn.execute(
+            """
+            SELECT question, count, error FROM analytics_top_follow_ups
+            WHERE lecture = ? AND section = ? AND subsection = ?
+            """,
+            key
+        ):
+            counter.counts[question] = count
+            counter.errors[question] = error
+        return counter
+
+    def refresh(self) -> Dict[str, int]:
+        """处理上次刷新之后的新记录，更新汇总表；每批单独提交，中断后可继续"""
+        start_id = self.last_id()
+        processed = 0
+        # 只为本次出现过的小节加载追加提问计数器，内存占用与小节数有关，与记录数无关
+        tops: Dict[SectionKey, SpaceSaving] = {}
+        for rows in self.iter_batches(start_id):
+            deltas: Dict[SectionKey, _SectionDelta] = {}
+            touched = set()
+            with self.db.connection() as conn:
+                for (_, _, lecture, _, section, subsection,
+                     role, content, _, is_follow_up) in rows:
+                    key = (lecture or "", section or "", subsection or "")
+                    delta = deltas.get(key)
+                    if delta is None:
+                        delta = deltas[key] = _SectionDelta()
+                    if role == "user":
+                        delta.questions += 1
+                        if is_follow_up:
+                            delta.follow_ups += 1
+                            top = tops.get(key)
+                            if top is None:
+                                top = tops[key] = self._load_top(conn, key)
+                            top.add(normalize_question(content or ""))
+                            touched.add(key)
+                    elif role == "assistant":
+                        length = len(content or "")
+                        delta.answers += 1
+                        delta.answer_chars += length
+                        delta.max_answer_chars = max(delta.max_answer_chars, length)
+
+                conn.executemany(_UPSERT_STATS_SQL, [
+                    (*key, delta.questions, delta.follow_ups, delta.answers,
+                     delta.answer_chars, delta.max_answer_chars)
+                    for key, delta in deltas.items()
+                ])
+                for key in touched:
+                    conn.execute(
+                        """
+                        DELETE FROM analytics_top_follow_ups
+                        WHERE lecture = ? AND section = ? AND subsection = ?
+                        """,
+                        key
+                    )
+                    conn.executemany(
+                        """
+                        INSERT INTO analytics_top_follow_ups
+                        (lecture, section, subsection, question, count, error)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        [(*key, question, count, error) for question, count, error in tops[key].top()]
+                    )
+                conn.execute(
+                    """
+                    INSERT INTO analytics_state (name, last_id) VALUES ('section_stats', ?)
+                    ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+                    """,
+                    (rows[-1][0],)
+                )
+                conn.commit()
+            processed += len(rows)
+        return {"processed": processed, "last_id": self.last_id()}
+
+    def rebuild(self) -> Dict[str, int]:
+        """清空汇总表后从头统计"""
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM analytics_section_stats")
+            conn.execute("DELETE FROM analytics_top_follow_ups")
+            conn.execute("DELETE FROM analytics_state")
+            conn.commit()
+        return self.refresh()
+
+    def section_stats(self, lecture: Optional[str] = None) -> List[Dict]:
+        """各小节的统计（按提问数从多到少）"""
+        query = """
+            SELECT lecture, section, subsection, questions, follow_ups, answers,
+                   answer_chars, max_answer_chars
+            FROM analytics_section_stats
+        """
+        params: list = []
+        if lecture is not None:
+            query += " WHERE lecture = ?"
+            params.append(lecture)
+        query += " ORDER BY questions DESC, lecture, section, subsection"
+        with self.db.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {
+                "lecture": row[0],
+                "section": row[1],
+                "subsection": row[2],
+                "questions": row[3],
+                "follow_ups": row[4],
+                "answers": row[5],
+                "avg_answer_chars": row[6] / row[5] if row[5] else 0,
+                "max_answer_chars": row[7]
+            }
+            for row in rows
+        ]
+
+    def top_follow_ups(self, lecture: str, section: str, subsection: str,
+                       limit: int = 10) -> List[Dict]:
+        """小节中最常见的追加提问；count 为上界，count - error 为下界"""
+        with self.db.connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT question, count, error FROM analytics_top_follow_ups
+                WHERE lecture = ? AND section = ? AND subsection = ?
+                ORDER BY count DESC, question LIMIT ?
+                """,
+                (lecture, section, subsection, limit)
+            ).fetchall()
+        return [{"question": row[0], "count": row[1], "error": row[2]} for row in rows]
+
+    def export(self, path: str, format: str = "jsonl", after_id: int = 0) -> int:
+        """流式导出 after_id 之后的记录，返回导出的条数"""
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {format}")
+        if format == "parquet":
+            return self._export_parquet(path, after_id)
+
+        count = 0
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if format == "csv":
+                writer = csv.writer(f)
+                writer.writerow(EXPORT_COLUMNS)
+            for rows in self.iter_batches(after_id):
+                if format == "csv":
+                    writer.writerows(rows)
+                else:
+                    f.writelines(
+                        json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+                        for row in rows
+                    )
+                count += len(rows)
+        return count
+
+    def _export_parquet(self, path: str, after_id: int) -> int:
+        if pyarrow is None:
+            raise RuntimeError("导出 Parquet 需要安装 pyarrow")
+        schema = pyarrow.schema([
+            ("id", pyarrow.int64()),
+            ("session_id", pyarrow.string()),
+            ("lecture", pyarrow.string()),
+            ("page", pyarrow.string()),
+            ("section", pyarrow.string()),
+            ("subsection", pyarrow.string()),
+            ("role", pyarrow.string()),
+            ("content", pyarrow.string()),
+            ("timestamp", pyarrow.string()),
+            ("is_follow_up", pyarrow.bool_()),
+        ])
+        count = 0
+        # 每批写成一个行组，内存中最多只有一批记录
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            for rows in self.iter_batches(after_id):
+                columns = [list(column) for column in zip(*rows)]
+                columns[-1] = [None if value is None else bool(value) for value in columns[-1]]
+                writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+                count += len(rows)
+        return count
+
+
+def main():
+    from config import DB_PATH
+
+    arg_parser = argparse.ArgumentParser(description="学习记录的统计与导出")
+    arg_parser.add_argument("--db-path", default=DB_PATH)
+    arg_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    refresh = commands.add_parser("refresh", help="增量更新汇总表")
+    refresh.add_argument("--rebuild", action="store_true", help="清空汇总表后从头统计")
+    summary = commands.add_parser("summary", help="显示各小节的统计")
+    summary.add_argument("--lecture")
+    summary.add_argument("--top", type=int, default=3, help="每个小节显示的常见追加提问数")
+    export = commands.add_parser("export", help="导出对话记录")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    export.add_argument("--output", required=True)
+    export.add_argument("--after-id", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    analytics = LearningAnalytics(Database(args.db_path), batch_size=args.batch_size)
+    if args.command == "refresh":
+        stats = analytics.rebuild() if args.rebuild else analytics.refresh()
+        print(f"处理 {stats['processed']} 条记录，已处理到 id {stats['last_id']}")
+    elif args.command == "summary":
+        analytics.refresh()
+        for item in analytics.section_stats(args.lecture):
+            print(f"{item['section']} / {item['subsection']}: 提问 {item['questions']}"
+                  f"（追加 {item['follow_ups']}），回答平均 {item['avg_answer_chars']:.0f} 字"
+                  f"、最长 {item['max_answer_chars']} 字")
+            for top in analytics.top_follow_ups(item["lecture"], item["section"],
+                                                item["subsection"], limit=args.top):
+                print(f"    {top['count']:>5}  {top['question']}")
+    else:
+        count = analytics.export(args.output, args.format, after_id=args.after_id)
+        print(f"导出 {count} 条记录到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
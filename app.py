@@ -1,13 +1,46 @@
 import streamlit as st
-import os
-from deepseek_client import DeepSeekClient
-from utils import init_session_state, render_markdown, add_message
-from doc_parser import GuideParser
-from config import DEEPSEEK_API_KEY
+import time
+from deepseek_client import AsyncRunner, close_async, get_async_client, get_async_runner
+from utils import init_session_state, show_markdown, StreamingMarkdown
+from config import (
+    DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEEPSEEK_MODEL, DEEPSEEK_TIMEOUT,
+    DEEPSEEK_CONNECT_TIMEOUT, DEEPSEEK_MAX_CONNECTIONS, DEEPSEEK_MAX_KEEPALIVE,
+    DEEPSEEK_MAX_CONCURRENCY, DEEPSEEK_SPECULATIVE_FOLLOW_UPS, DEEPSEEK_RATE_LIMIT,
+    DEEPSEEK_RATE_BURST, DEEPSEEK_MAX_RETRIES, DEEPSEEK_RETRY_BACKOFF, DEEPSEEK_COALESCE,
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_LOW_WATERMARK, CONTEXT_SUMMARIZE, CONTEXT_SUMMARY_MAX_TOKENS, DB_PATH, DB_JOURNAL_MODE, DB_SYNCHRONOUS,
+    DB_BUSY_TIMEOUT_MS, DB_POOL_SIZE, DB_ASYNC_WRITES, DB_WRITE_BATCH_SIZE,
+    DB_WRITE_FLUSH_INTERVAL, DB_WRITE_QUEUE_SIZE, RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_PATH, PRECOMPUTED_ANSWERS_PATH, STREAM_RENDER_INTERVAL,
+    STREAM_RENDER_MIN_CHARS, SEARCH_RESULT_LIMIT, RETRIEVAL_TOP_K, RETRIEVAL_MAX_CHARS,
+    RETRIEVAL_CHUNK_CHARS, LECTURE_WATCH, LECTURE_WATCH_BACKEND, LECTURE_POLL_INTERVAL,
+    METRICS_ENABLED, METRICS_HOST, METRICS_PORT, METRICS_FILE, METRICS_FILE_INTERVAL,
+    FOLLOW_UP_PREFETCH_SETS, FOLLOW_UP_WORKERS, FOLLOW_UP_TIMEOUT, FOLLOW_UP_WAIT, FOLLOW_UP_CACHE_SIZE,
+    SESSION_MAX_PAGES, LEARNING_HISTORY_LIMIT, SHARED_BACKEND, CHAT_BACKEND
+)
 from typing import List
-from db import Database
+from db import Database, get_database
 import uuid
+import hashlib
 from lecture_manager import LectureManager
+from response_cache import get_response_cache
+from context_window import get_context_window
+from search_index import get_search_index
+from retrieval import lecture_references as retrieve_references
+from precompute import get_precomputed_store, lecture_topic
+from metrics import observe, start_metrics
+from follow_up_prefetch import conversation_key, get_follow_up_prefetcher
+from session_store import SessionStore, SharedChatStore
+from shared_backend import get_shared_backend
+from resources import get_resource
+
+rerun_start = time.perf_counter()
+
+# 运行指标（进程内只启动一次）
+if METRICS_ENABLED:
+    start_metrics(port=METRICS_PORT, host=METRICS_HOST, path=METRICS_FILE or None,
+                  interval=METRICS_FILE_INTERVAL)
 
 # 页面配置
 st.set_page_config(
@@ -19,8 +52,33 @@ st.set_page_config(
 # 初始化会话状态
 init_session_state()
 
-# 初始化教案管理器
-lecture_manager = LectureManager()
+# 客户端、数据库和管理器都是进程级资源（resources.py）：只在首次运行时创建，
+# 之后的重跑直接取用，定期检查是否可用，进程退出时按依赖顺序关闭
+
+# 多个应用进程共用的状态后端（未配置时各进程独立）
+shared_backend = get_resource(
+    "shared_backend",
+    lambda: get_shared_backend(SHARED_BACKEND),
+    close=lambda backend: backend.close()
+) if SHARED_BACKEND else None
+
+# 初始化教案管理器（加载教案时在后台预先渲染章节内容；监视目录，教案修改后自动重新加载）
+lecture_manager = get_resource(
+    "lecture_manager",
+    lambda: LectureManager(
+        prerender=True,
+        watch=LECTURE_WATCH,
+        watch_backend=LECTURE_WATCH_BACKEND,
+        poll_interval=LECTURE_POLL_INTERVAL,
+        shared=shared_backend
+    ),
+    health_check=LectureManager.healthy,
+    close=LectureManager.close,
+    depends=("shared_backend",)
+)
+
+# 全文检索索引（进程内共享，检索时按教案增量同步）
+search_index = get_search_index(lecture_manager.lecture_dir)
 
 # 初始化文档解析器
 if 'guide_parser' not in st.session_state:
@@ -43,10 +101,6 @@ if 'guide_parser' not in st.session_state:
 if 'ai_responses' not in st.session_state:
     st.session_state.ai_responses = {}
 
-# 初始化对话历史
-if 'chat_histories' not in st.session_state:
-    st.session_state.chat_histories = {}
-
 # 初始化 DeepSeek 客户端
 try:
     if not DEEPSEEK_API_KEY:
@@ -57,17 +111,160 @@ try:
     else:
         api_key = DEEPSEEK_API_KEY
         
-    deepseek_client = DeepSeekClient(api_key=api_key)
+    # 异步客户端与后台事件循环进程内共享，HTTP 长连接、限流和相同请求的合并对所有会话生效；
+    # 事件循环停止后重新创建，客户端随之重建（关闭事件循环时一并关闭所有客户端）
+    async_runner = get_resource(
+        "async_runner",
+        get_async_runner,
+        health_check=AsyncRunner.alive,
+        close=lambda runner: close_async()
+    )
+
+    def create_deepseek_client():
+        # 响应缓存在所有会话之间共享
+        response_cache = get_response_cache(
+            RESPONSE_CACHE_BACKEND,
+            ttl=RESPONSE_CACHE_TTL,
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+            max_bytes=RESPONSE_CACHE_MAX_BYTES,
+            db_path=RESPONSE_CACHE_PATH,
+            shared=shared_backend
+        )
+        return get_async_client(
+            api_key,
+            cache=response_cache,
+            model=DEEPSEEK_MODEL,
+            base_url=DEEPSEEK_BASE_URL,
+            timeout=DEEPSEEK_TIMEOUT,
+            connect_timeout=DEEPSEEK_CONNECT_TIMEOUT,
+            max_connections=DEEPSEEK_MAX_CONNECTIONS,
+            max_keepalive=DEEPSEEK_MAX_KEEPALIVE,
+            max_concurrency=DEEPSEEK_MAX_CONCURRENCY,
+            rate_limit=DEEPSEEK_RATE_LIMIT,
+            rate_burst=DEEPSEEK_RATE_BURST,
+            max_retries=DEEPSEEK_MAX_RETRIES,
+            retry_backoff=DEEPSEEK_RETRY_BACKOFF,
+            coalesce=DEEPSEEK_COALESCE,
+            context=get_context_window(
+                max_tokens=CONTEXT_MAX_TOKENS,
+                low_watermark=CONTEXT_LOW_WATERMARK,
+                summarize=CONTEXT_SUMMARIZE,
+                summary_max_tokens=CONTEXT_SUMMARY_MAX_TOKENS
+            )
+        )
+
+    deepseek_client = get_resource(
+        # 资源名会出现在日志和指标中，只使用密钥的哈希
+        ("deepseek_client", hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]),
+        create_deepseek_client,
+        depends=("async_runner", "shared_backend")
+    )
+    # 追加提问在后台预取，按对话缓存多组候选
+    follow_up_prefetcher = get_follow_up_prefetcher(
+        deepseek_client,
+        async_runner,
+        sets=FOLLOW_UP_PREFETCH_SETS,
+        max_workers=FOLLOW_UP_WORKERS,
+        timeout=FOLLOW_UP_TIMEOUT,
+        cache_size=FOLLOW_UP_CACHE_SIZE
+    )
 except Exception as e:
     st.error(f"初始化 DeepSeek 客户端失败: {str(e)}")
     st.stop()
 
-# 初始化数据库
-db = Database()
+# 初始化数据库（进程内共享，连接池在重跑之间复用；后台写线程退出后重新创建）
+db = get_resource(
+    "database",
+    lambda: get_database(
+        DB_PATH,
+        journal_mode=DB_JOURNAL_MODE,
+        synchronous=DB_SYNCHRONOUS,
+        busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+        pool_size=DB_POOL_SIZE,
+        async_writes=DB_ASYNC_WRITES,
+        write_batch_size=DB_WRITE_BATCH_SIZE,
+        write_flush_interval=DB_WRITE_FLUSH_INTERVAL,
+        write_queue_size=DB_WRITE_QUEUE_SIZE
+    ),
+    health_check=Database.healthy,
+    close=Database.close
+)
+
+# 会话和对话记录：单机保存在 SQLite 数据库中，多机部署时保存在共享后端中
+if CHAT_BACKEND == "shared":
+    if shared_backend is None:
+        st.error("CHAT_BACKEND 为 shared 时需要配置 SHARED_BACKEND")
+        st.stop()
+    chat_store = get_resource(
+        "chat_store",
+        lambda: SharedChatStore(shared_backend),
+        depends=("shared_backend",)
+    )
+else:
+    chat_store = db
+
+# 预生成的首轮回答（由 precompute.py 离线生成）
+precomputed_store = get_precomputed_store(PRECOMPUTED_ANSWERS_PATH)
+
+def prefetch_follow_up_questions(chat_history: List[dict], current_topic: str):
+    """在后台预取追加提问，不阻塞当前回答的输出；结果在下次渲染时取用"""
+    follow_up_prefetcher.prefetch(chat_history, current_topic)
+
+def lecture_references(question: str, page_id: str, sub_section: str) -> List[str]:
+    """检索教案中与问题最相关的片段（当前页面优先），附加到系统提示词中"""
+    return retrieve_references(
+        st.session_state.guide_parser, question, page_id, sub_section,
+        k=RETRIEVAL_TOP_K, max_chars=RETRIEVAL_MAX_CHARS, chunk_chars=RETRIEVAL_CHUNK_CHARS
+    )
+
+def drop_stale_choice(key: str, options):
+    """教案更新后原来选中的项可能已不存在，清除失效的选择"""
+    if key in st.session_state and st.session_state[key] not in options:
+        del st.session_state[key]
+
+def go_to_page(navigation, nav_key: str, node_id: str):
+    """切换到指定页面：在导航选择框渲染前设置它们的值"""
+    entry = navigation[node_id]
+    st.session_state[f"{nav_key}_section"] = entry.section
+    if not entry.is_section:
+        st.session_state[f"{nav_key}_{entry.section}"] = node_id
+
+def jump_to_result(lecture: dict, node_id: str):
+    """跳转到检索结果所在的教案和页面"""
+    st.session_state.lecture_select = lecture
+    navigation = lecture_manager.load_lecture(lecture["path"]).navigation
+    go_to_page(navigation, f"nav_{lecture['path']}", node_id)
+
+def restore_position(session: dict):
+    """回到会话最后浏览的教案和页面（教案或页面已不存在时忽略）"""
+    lecture = next((item for item in lecture_manager.get_available_lectures()
+                    if item["path"] == session["lecture"]), None)
+    if lecture is None:
+        return
+    st.session_state.lecture_select = lecture
+    navigation = lecture_manager.load_lecture(lecture["path"]).navigation
+    if session["page"] in navigation:
+        go_to_page(navigation, f"nav_{lecture['path']}", session["page"])
 
-# 在会话状态初始化部分添加
-if 'session_id' not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())
+# 会话：地址栏中的会话标识存在时恢复该会话（对话历史和浏览位置），否则新建会话
+if 'session_store' not in st.session_state:
+    session_id = st.query_params.get("session")
+    session = chat_store.get_session(session_id) if session_id else None
+    if session is None:
+        session_id = str(uuid.uuid4())
+        chat_store.ensure_session(session_id)
+        st.query_params["session"] = session_id
+    elif session["lecture"]:
+        restore_position(session)
+    st.session_state.session_id = session_id
+    # 对话历史以数据库为准，内存中只保留最近访问的几个页面
+    st.session_state.session_store = SessionStore(chat_store, session_id, max_pages=SESSION_MAX_PAGES)
+elif st.session_state.session_store.db is not chat_store:
+    # 数据库等资源重新创建后，按同一会话标识换用新的实例（页面历史重新从数据库加载）
+    st.session_state.session_store = SessionStore(
+        chat_store, st.session_state.session_id, max_pages=SESSION_MAX_PAGES
+    )
+session_store = st.session_state.session_store
 
 # 侧边栏导航
 with st.sidebar:
@@ -81,44 +278,74 @@ with st.sidebar:
         st.stop()
     
     # 选择教案
+    drop_stale_choice("lecture_select", available_lectures)
     selected_lecture = st.selectbox(
         "选择学习内容",
         options=available_lectures,
-        format_func=lambda x: x["name"]
+        format_func=lambda x: x["name"],
+        key="lecture_select"
     )
     
+    # 全文检索
+    search_query = st.text_input("搜索教案", key="search_query", placeholder="输入关键词，如：连接池、Servlet")
+    if search_query.strip():
+        search_index.sync(lecture_manager)
+        search_results = search_index.search(search_query, limit=SEARCH_RESULT_LIMIT)
+        if not search_results:
+            st.caption("没有找到相关内容")
+        lectures_by_path = {lecture["path"]: lecture for lecture in available_lectures}
+        for idx, result in enumerate(search_results):
+            st.button(
+                result.title,
+                key=f"search_result_{idx}",
+                on_click=jump_to_result,
+                args=(lectures_by_path[result.lecture_path], result.node_id),
+                use_container_width=True
+            )
+            st.caption(f"{result.lecture_name} · {result.section}：{result.snippet}")
+    
     # 加载选中的教案
     if 'current_lecture' not in st.session_state or \
        st.session_state.current_lecture != selected_lecture["path"]:
         try:
             st.session_state.guide_parser = lecture_manager.load_lecture(selected_lecture["path"])
             st.session_state.current_lecture = selected_lecture["path"]
-            # 清除之前的对话历史
-            st.session_state.chat_histories = {}
-            st.session_state.learning_history = []
         except Exception as e:
             st.error(f"加载教案失败: {str(e)}")
             st.stop()
+    else:
+        # 每次重跑都从共享缓存取最新的解析树，教案修改后无需重启即可看到
+        st.session_state.guide_parser = lecture_manager.load_lecture(selected_lecture["path"])
     
     st.title("学习导航")
     
     try:
+        # 导航索引在解析教案时已构建，这里只做字典查找
+        navigation = st.session_state.guide_parser.navigation
+        nav_key = f"nav_{st.session_state.current_lecture}"
+        
         # 主章节选择
+        drop_stale_choice(f"{nav_key}_section", navigation.section_titles)
         main_section = st.selectbox(
             "选择章节",
-            options=list(st.session_state.guide_parser.root.keys())
+            options=navigation.section_titles,
+            key=f"{nav_key}_section"
         )
         
-        # 子章节选择
+        # 子章节选择（选项为节点标识，重名小节也能区分）
+        sub_section = None
         if main_section:
-            current_section = st.session_state.guide_parser.root[main_section]
-            if current_section.children:
-                sub_section = st.selectbox(
+            current_entry = navigation[main_section]
+            current_section = current_entry.node
+            if current_entry.children:
+                drop_stale_choice(f"{nav_key}_{main_section}", current_entry.children)
+                current_entry = navigation[st.selectbox(
                     "选择小节",
-                    options=[node.title for node in current_section.children]
-                )
-            else:
-                sub_section = None
+                    options=current_entry.children,
+                    format_func=lambda key: navigation[key].title,
+                    key=f"{nav_key}_{main_section}"
+                )]
+                sub_section = current_entry.title
     except Exception as e:
         st.error(f"加载导航失败: {str(e)}")
         st.stop()
@@ -127,39 +354,41 @@ with st.sidebar:
 if main_section:
     st.title(main_section)
 
+    # 记录浏览位置，恢复会话时回到这里
+    position = (st.session_state.current_lecture, current_entry.node_id)
+    if st.session_state.get("session_position") != position:
+        chat_store.update_session_position(st.session_state.session_id, *position)
+        st.session_state.session_position = position
+
     try:
         if sub_section:
             # 获取当前子节点
-            current_node = next(
-                node for node in current_section.children 
-                if node.title == sub_section
-            )
+            current_node = current_entry.node
             
             # 显示子标题
             st.subheader(sub_section)
             
-            # 生成当前页面的唯一标识
-            page_id = f"{main_section}_{sub_section}"
+            # 当前页面的唯一标识
+            page_id = current_entry.node_id
             
-            # 初始化当前页面的对话历史
-            if page_id not in st.session_state.chat_histories:
-                st.session_state.chat_histories[page_id] = []
+            # 当前页面的对话历史（不在内存中时从数据库加载）
+            chat_history = session_store.history(st.session_state.current_lecture, page_id)
             
             # 初始化消息占位符
             if "message_placeholder" not in st.session_state:
                 st.session_state.message_placeholder = st.empty()
             
             # 显示历史对话
-            for message in st.session_state.chat_histories[page_id]:
+            for message in chat_history:
                 with st.chat_message(message["role"]):
                     st.markdown(message["content"])
             
             # 如果还没有对话历史，显示初始提问部分
-            if not st.session_state.chat_histories[page_id]:
-                # 将内容作为提示词
+            if not chat_history:
+                # 默认使用教案中的AI提示词；没有时给出简短的提问，相关内容由检索附加
                 edited_prompt = st.text_area(
                     "编辑提示词来获取AI指导",
-                    value=current_node.prompt if current_node.prompt else current_node.content,
+                    value=current_node.prompt if current_node.prompt else f"请讲解「{sub_section}」这一节的内容",
                     height=150,
                     key=f"prompt_{page_id}"
                 )
@@ -170,37 +399,62 @@ if main_section:
                             st.markdown(edited_prompt)
                         
                         with st.chat_message("assistant"):
-                            message_placeholder = st.empty()
-                            full_response = ""
+                            renderer = StreamingMarkdown(
+                                interval=STREAM_RENDER_INTERVAL,
+                                min_chars=STREAM_RENDER_MIN_CHARS
+                            )
+                            
+                            # 未修改的教案提示词优先使用预生成的回答（附加的检索片段也需相同）
+                            references = lecture_references(edited_prompt, page_id, sub_section)
+                            precomputed = None
+                            if current_node.prompt and edited_prompt.strip() == current_node.prompt.strip():
+                                precomputed = precomputed_store.get(
+                                    st.session_state.guide_parser.source.digest(),
+                                    page_id,
+                                    edited_prompt,
+                                    references
+                                )
                             
-                            # 构建完整的对话历史
-                            messages = st.session_state.chat_histories[page_id] + [
-                                {"role": "user", "content": edited_prompt}
-                            ]
+                            # 与回答同时生成追加提问
+                            if DEEPSEEK_SPECULATIVE_FOLLOW_UPS:
+                                prefetch_follow_up_questions(
+                                    chat_history + [
+                                        {"role": "user", "content": edited_prompt}
+                                    ],
+                                    f"{main_section} - {sub_section}"
+                                )
+                            
+                            if precomputed is not None:
+                                response_stream = [precomputed]
+                            else:
+                                # 构建完整的对话历史
+                                messages = chat_history + [
+                                    {"role": "user", "content": edited_prompt}
+                                ]
+                                response_stream = async_runner.iterate(deepseek_client.stream_response(
+                                    messages=messages,
+                                    current_topic=lecture_topic(selected_lecture['name'], main_section, sub_section),
+                                    references=references
+                                ))
                             
                             # 流式输出响应
-                            for response_chunk in deepseek_client.get_streaming_response(
-                                messages=messages,
-                                current_topic=f"{selected_lecture['name']} - {main_section} - {sub_section}"
-                            ):
-                                full_response += response_chunk
-                                message_placeholder.markdown(full_response + "▌")
+                            for response_chunk in response_stream:
+                                renderer.write(response_chunk)
                             
-                            message_placeholder.markdown(full_response)
+                            full_response = renderer.finish()
                             
-                            # 保存到对话历史
-                            st.session_state.chat_histories[page_id].extend([
-                                {"role": "user", "content": edited_prompt},
-                                {"role": "assistant", "content": full_response}
-                            ])
+                            # 保存到对话历史，同时写入数据库（由后台线程批量提交，不阻塞页面）
+                            session_store.append(
+                                st.session_state.current_lecture, page_id,
+                                main_section, sub_section, edited_prompt, full_response
+                            )
                             
-                            # 保存到学习历史
-                            st.session_state.learning_history.append({
-                                "section": main_section,
-                                "subsection": sub_section,
-                                "prompt": edited_prompt,
-                                "response": full_response
-                            })
+                            # 未提前生成时，回答结束后在后台开始生成追加提问
+                            if not DEEPSEEK_SPECULATIVE_FOLLOW_UPS:
+                                prefetch_follow_up_questions(
+                                    chat_history,
+                                    f"{main_section} - {sub_section}"
+                                )
                             
                             # 使用新的 rerun 方法
                             st.rerun()
@@ -209,13 +463,17 @@ if main_section:
                         st.error(f"获取AI响应失败: {str(e)}")
             
             # 修改显示建议的追加提问部分
-            if st.session_state.chat_histories[page_id]:
-                # 初始化问题状态
-                if f"questions_{page_id}" not in st.session_state:
-                    st.session_state[f"questions_{page_id}"] = deepseek_client.generate_follow_up_questions(
-                        chat_history=st.session_state.chat_histories[page_id],
-                        current_topic=f"{main_section} - {sub_section}"
+            if chat_history:
+                # 对话变化后取一组新问题（通常已在后台生成好）
+                follow_up_topic = f"{main_section} - {sub_section}"
+                questions_key = conversation_key(chat_history, follow_up_topic)
+                if st.session_state.get(f"questions_key_{page_id}") != questions_key:
+                    st.session_state[f"questions_{page_id}"] = follow_up_prefetcher.take(
+                        chat_history,
+                        follow_up_topic,
+                        wait=FOLLOW_UP_WAIT
                     )
+                    st.session_state[f"questions_key_{page_id}"] = questions_key
                 
                 # 显示建议的追加提问按钮
                 st.write("建议的追加提问：")
@@ -224,7 +482,7 @@ if main_section:
                 for idx, question in enumerate(st.session_state[f"questions_{page_id}"]):
                     if st.button(
                         question,
-                        key=f"suggest_{page_id}_{len(st.session_state.chat_histories[page_id])}_{idx}",
+                        key=f"suggest_{page_id}_{len(chat_history)}_{idx}",
                         use_container_width=True  # 使按钮宽度填满
                     ):
                         try:
@@ -232,44 +490,43 @@ if main_section:
                                 st.markdown(question)
                                 
                             with st.chat_message("assistant"):
-                                message_placeholder = st.empty()
-                                full_response = ""
+                                renderer = StreamingMarkdown(
+                                    interval=STREAM_RENDER_INTERVAL,
+                                    min_chars=STREAM_RENDER_MIN_CHARS
+                                )
                                 
                                 # 构建完整的对话历史
-                                messages = st.session_state.chat_histories[page_id] + [
+                                messages = chat_history + [
                                     {"role": "user", "content": question}
                                 ]
                                 
+                                # 与回答同时生成新的问题集
+                                if DEEPSEEK_SPECULATIVE_FOLLOW_UPS:
+                                    prefetch_follow_up_questions(messages, follow_up_topic)
+                                
                                 # 流式输出响应
-                                for response_chunk in deepseek_client.get_streaming_response(
+                                for response_chunk in async_runner.iterate(deepseek_client.stream_response(
                                     messages=messages,
-                                    current_topic=f"{selected_lecture['name']} - {main_section} - {sub_section}"
-                                ):
-                                    full_response += response_chunk
-                                    message_placeholder.markdown(full_response + "▌")
+                                    current_topic=lecture_topic(selected_lecture['name'], main_section, sub_section),
+                                    references=lecture_references(question, page_id, sub_section)
+                                )):
+                                    renderer.write(response_chunk)
                                 
-                                message_placeholder.markdown(full_response)
+                                full_response = renderer.finish()
                                 
-                                # 保存到对话历史
-                                st.session_state.chat_histories[page_id].extend([
-                                    {"role": "user", "content": question},
-                                    {"role": "assistant", "content": full_response}
-                                ])
-                                
-                                # 保存到学习历史
-                                st.session_state.learning_history.append({
-                                    "section": main_section,
-                                    "subsection": sub_section,
-                                    "prompt": question,
-                                    "response": full_response
-                                })
-                                
-                                # 生成新的问题集
-                                st.session_state[f"questions_{page_id}"] = deepseek_client.generate_follow_up_questions(
-                                    chat_history=st.session_state.chat_histories[page_id],
-                                    current_topic=f"{main_section} - {sub_section}"
+                                # 保存到对话历史，同时写入数据库（由后台线程批量提交，不阻塞页面）
+                                session_store.append(
+                                    st.session_state.current_lecture, page_id,
+                                    main_section, sub_section, question, full_response
                                 )
                                 
+                                # 生成新的问题集（未提前生成时在后台开始，下次渲染时取用）
+                                if not DEEPSEEK_SPECULATIVE_FOLLOW_UPS:
+                                    prefetch_follow_up_questions(
+                                        chat_history,
+                                        follow_up_topic
+                                    )
+                                
                                 # 使用新的 rerun 方法
                                 st.rerun()
                         except Exception as e:
@@ -281,9 +538,11 @@ if main_section:
                     key=f"refresh_questions_{page_id}",
                     use_container_width=True  # 使按钮宽度填满
                 ):
-                    st.session_state[f"questions_{page_id}"] = deepseek_client.generate_follow_up_questions(
-                        chat_history=st.session_state.chat_histories[page_id],
-                        current_topic=f"{main_section} - {sub_section}"
+                    # 直接取出已预取的下一组
+                    st.session_state[f"questions_{page_id}"] = follow_up_prefetcher.take(
+                        chat_history,
+                        follow_up_topic,
+                        wait=FOLLOW_UP_WAIT
                     )
                     st.rerun()
                 
@@ -296,47 +555,51 @@ if main_section:
                     "进一步提问",
                     value="",  # 设置为空字符串，确保每次都是空白输入框
                     height=100,
-                    key=f"follow_up_{page_id}_{len(st.session_state.chat_histories[page_id])}"  # 动态key，确保每次都是新的输入框
+                    key=f"follow_up_{page_id}_{len(chat_history)}"  # 动态key，确保每次都是新的输入框
                 )
                 
-                if st.button("发送提问", key=f"follow_up_button_{page_id}_{len(st.session_state.chat_histories[page_id])}"):
+                if st.button("发送提问", key=f"follow_up_button_{page_id}_{len(chat_history)}"):
                     if follow_up.strip():  # 只有当输入不为空时才处理
                         try:
                             with st.chat_message("user"):
                                 st.markdown(follow_up)
                                 
                             with st.chat_message("assistant"):
-                                message_placeholder = st.empty()
-                                full_response = ""
+                                renderer = StreamingMarkdown(
+                                    interval=STREAM_RENDER_INTERVAL,
+                                    min_chars=STREAM_RENDER_MIN_CHARS
+                                )
                                 
                                 # 构建完整的对话历
-                                messages = st.session_state.chat_histories[page_id] + [
+                                messages = chat_history + [
                                     {"role": "user", "content": follow_up}
                                 ]
                                 
+                                # 与回答同时生成新的问题集
+                                if DEEPSEEK_SPECULATIVE_FOLLOW_UPS:
+                                    prefetch_follow_up_questions(messages, follow_up_topic)
+                                
                                 # 流式输出响应
-                                for response_chunk in deepseek_client.get_streaming_response(
+                                for response_chunk in async_runner.iterate(deepseek_client.stream_response(
                                     messages=messages,
-                                    current_topic=f"{selected_lecture['name']} - {main_section} - {sub_section}"
-                                ):
-                                    full_response += response_chunk
-                                    message_placeholder.markdown(full_response + "▌")
+                                    current_topic=lecture_topic(selected_lecture['name'], main_section, sub_section),
+                                    references=lecture_references(follow_up, page_id, sub_section)
+                                )):
+                                    renderer.write(response_chunk)
                                 
-                                message_placeholder.markdown(full_response)
+                                full_response = renderer.finish()
                                 
-                                # 保存到对话历史
-                                st.session_state.chat_histories[page_id].extend([
-                                    {"role": "user", "content": follow_up},
-                                    {"role": "assistant", "content": full_response}
-                                ])
+                                # 保存到对话历史，同时写入数据库（由后台线程批量提交，不阻塞页面）
+                                session_store.append(
+                                    st.session_state.current_lecture, page_id,
+                                    main_section, sub_section, follow_up, full_response
+                                )
                                 
-                                # 保存学习历史
-                                st.session_state.learning_history.append({
-                                    "section": main_section,
-                                    "subsection": sub_section,
-                                    "prompt": follow_up,
-                                    "response": full_response
-                                })
+                                if not DEEPSEEK_SPECULATIVE_FOLLOW_UPS:
+                                    prefetch_follow_up_questions(
+                                        chat_history,
+                                        follow_up_topic
+                                    )
                                 
                                 # 使用新的 rerun 方法
                                 st.rerun()
@@ -345,7 +608,26 @@ if main_section:
                             st.error(f"获取AI响应失败: {str(e)}")
         else:
             # 显示主章节内容
-            st.markdown(render_markdown(current_section.content), unsafe_allow_html=True)
+            show_markdown(current_section.content)
+        
+        # 上一页 / 下一页
+        prev_col, next_col = st.columns(2)
+        if current_entry.prev_id:
+            prev_col.button(
+                f"← {navigation[current_entry.prev_id].title}",
+                key="nav_prev",
+                on_click=go_to_page,
+                args=(navigation, nav_key, current_entry.prev_id),
+                use_container_width=True
+            )
+        if current_entry.next_id:
+            next_col.button(
+                f"{navigation[current_entry.next_id].title} →",
+                key="nav_next",
+                on_click=go_to_page,
+                args=(navigation, nav_key, current_entry.next_id),
+                use_container_width=True
+            )
 
     except Exception as e:
         st.error(f"显示内容失败: {str(e)}")
@@ -353,9 +635,11 @@ if main_section:
 # 显示学习历史
 if st.sidebar.checkbox("显示学习历史"):
     st.sidebar.subheader("学习历史")
-    for idx, item in enumerate(st.session_state.learning_history):
+    for idx, item in enumerate(session_store.learning_history(LEARNING_HISTORY_LIMIT)):
         with st.sidebar.expander(
             f"{item['section']} - {item['subsection']}"
         ):
             st.write("提示词：", item['prompt'])
-            st.write("AI回应：", item['response']) 
\ No newline at end of file
+            st.write("AI回应：", item['response']) 
+
+observe("javahelper_rerun_seconds", time.perf_counter() - rerun_start)
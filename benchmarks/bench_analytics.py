@@ -0,0 +1,109 @@
+"""学习记录统计：记录数增长时的内存占用与耗时
+
+先生成 --rows 的十分之一条对话记录统计一次，再补足到 --rows 条后重新统计，
+对比两次的峰值内存（tracemalloc）；然后测量追加少量记录后的增量刷新，
+以及三种格式的流式导出。
+
+用法: python benchmarks/bench_analytics.py --rows 1000000
+      python benchmarks/bench_analytics.py --rows 10000000 --skip-export
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import EXPORT_FORMATS, LearningAnalytics, pyarrow
+from db import Database
+
+QUESTIONS = [f"能举个例子说明第 {i} 个知识点吗？" for i in range(200)]
+PAGES = [(f"第{s}章", f"{s}.{p} 小节") for s in range(1, 11) for p in range(1, 9)]
+
+
+def generate(db_path: str, start: int, count: int, seed: int = 0):
+    """写入 count 条记录：每个会话在一个页面上问若干轮，提问按 Zipf 分布选取"""
+    rng = random.Random(seed + start)
+    weights = [1 / (i + 1) for i in range(len(QUESTIONS))]
+    conn = sqlite3.connect(db_path)
+    rows = []
+    written = 0
+    session = start
+    while written < count:
+        section, subsection = rng.choice(PAGES)
+        rounds = rng.randint(1, 5)
+        for i in range(rounds):
+            question = "请讲解这一节的内容" if i == 0 else rng.choices(QUESTIONS, weights)[0]
+            for role, content in (("user", question), ("assistant", "答" * rng.randint(200, 1200))):
+                rows.append((f"s{session}", section, subsection, role, content, "lecture.md",
+                             f"{section}/{subsection}"))
+        written += rounds * 2
+        session += 1
+        if len(rows) >= 50000:
+            conn.executemany(
+                "INSERT INTO chat_history (session_id, section, subsection, role, content, lecture, page)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            conn.commit()
+            rows = []
+    conn.executemany(
+        "INSERT INTO chat_history (session_id, section, subsection, role, content, lecture, page)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+    )
+    conn.commit()
+    conn.close()
+    return written
+
+
+def measure(func):
+    """返回 (耗时, 峰值内存)：耗时在不跟踪内存时测量，峰值内存再单独运行一次测量"""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="学习记录统计的内存占用与耗时")
+    arg_parser.add_argument("--rows", type=int, default=1000000)
+    arg_parser.add_argument("--batch-size", type=int, default=5000)
+    arg_parser.add_argument("--skip-export", action="store_true")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        analytics = LearningAnalytics(Database(db_path, pool_size=2), batch_size=args.batch_size)
+
+        total = 0
+        for target in (args.rows // 10, args.rows):
+            total += generate(db_path, total, target - total)
+            stats, elapsed, peak = measure(analytics.rebuild)
+            print(f"全量统计 {stats['processed']:>9} 条  {elapsed:7.2f} s"
+                  f"  {stats['processed'] / elapsed:9.0f} 条/秒  峰值内存 {peak / 1024 / 1024:6.1f} MB")
+
+        generate(db_path, total, 1000, seed=1)
+        start = time.perf_counter()
+        stats = analytics.refresh()
+        print(f"增量刷新 {stats['processed']:>9} 条  {(time.perf_counter() - start) * 1000:7.1f} ms")
+
+        if not args.skip_export:
+            for format in EXPORT_FORMATS:
+                if format == "parquet" and pyarrow is None:
+                    print("parquet: 未安装 pyarrow，跳过")
+                    continue
+                path = os.path.join(tmp, f"export.{format}")
+                count, elapsed, peak = measure(lambda: analytics.export(path, format))
+                print(f"导出 {format:<8} {count:>9} 条  {elapsed:7.2f} s"
+                      f"  {os.path.getsize(path) / 1024 / 1024:8.1f} MB 文件  峰值内存 {peak / 1024 / 1024:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
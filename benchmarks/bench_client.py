@@ -0,0 +1,70 @@
+"""一轮问答（流式回答 + 追加提问）的端到端耗时测试
+
+在本地模拟服务上对比：
+- 同步客户端：回答输出结束后再阻塞生成追加提问（原来的做法）
+- 异步客户端：回答输出的同时在后台生成追加提问，共用长连接池
+
+用法: python benchmarks/bench_client.py --rounds 5 --first-token-latency 0.3 --token-interval 0.01
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepseek_client import AsyncDeepSeekClient, AsyncRunner, DeepSeekClient
+from mock_llm_server import start_mock_server
+
+MESSAGES = [{"role": "user", "content": "请解释 Servlet 的生命周期"}]
+TOPIC = "Java Web - Servlet - 生命周期"
+
+
+def run_sync(base_url: str, rounds: int) -> float:
+    client = DeepSeekClient(api_key="mock", base_url=base_url)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        answer = "".join(client.get_streaming_response(MESSAGES, current_topic=TOPIC))
+        client.generate_follow_up_questions(
+            MESSAGES + [{"role": "assistant", "content": answer}], TOPIC
+        )
+    return (time.perf_counter() - start) / rounds
+
+
+def run_async(base_url: str, rounds: int) -> float:
+    runner = AsyncRunner()
+    client = AsyncDeepSeekClient(api_key="mock", base_url=base_url)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        questions = runner.submit(client.generate_follow_up_questions(MESSAGES, TOPIC))
+        "".join(runner.iterate(client.stream_response(MESSAGES, current_topic=TOPIC)))
+        questions.result()
+    elapsed = (time.perf_counter() - start) / rounds
+    runner.run(client.aclose())
+    runner.close()
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="一轮问答的端到端耗时测试")
+    arg_parser.add_argument("--rounds", type=int, default=5)
+    arg_parser.add_argument("--first-token-latency", type=float, default=0.3)
+    arg_parser.add_argument("--token-interval", type=float, default=0.01)
+    arg_parser.add_argument("--tokens", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    print(f"{'客户端':<12}{'每轮耗时(s)':>12}{'请求数':>8}{'连接数':>8}")
+    for name, run in (("同步串行", run_sync), ("异步并发", run_async)):
+        server, _ = start_mock_server(
+            first_token_latency=args.first_token_latency,
+            token_interval=args.token_interval,
+            tokens=args.tokens
+        )
+        elapsed = run(server.base_url, args.rounds)
+        print(f"{name:<12}{elapsed:>12.3f}{server.request_count:>8}{server.connection_count:>8}")
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
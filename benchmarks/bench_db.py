@@ -0,0 +1,71 @@
+"""多线程并发写入 chat_history 的吞吐量测试
+
+对比旧配置（每次操作新建连接、DELETE 日志、synchronous=FULL）、
+连接池 + WAL + synchronous=NORMAL，以及在此基础上的后台批量写入。
+
+用法: python benchmarks/bench_db.py --threads 1 4 16 --writes 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database
+
+CONFIGS = {
+    "旧配置": dict(journal_mode="DELETE", synchronous="FULL", pool_size=0),
+    "连接池+WAL": dict(journal_mode="WAL", synchronous="NORMAL", pool_size=32),
+    "后台批量写入": dict(journal_mode="WAL", synchronous="NORMAL", pool_size=32, async_writes=True),
+}
+
+
+def run(db: Database, threads: int, writes: int) -> float:
+    """返回每秒写入条数"""
+    errors = []
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(worker_id: int):
+        barrier.wait()
+        try:
+            for i in range(writes):
+                db.save_chat(f"session-{worker_id}", "章节", "小节", "user", f"问题 {i}")
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    # 后台写入模式下等待全部记录提交后再计时
+    db.flush()
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"  {len(errors)} 个线程出错，例如: {errors[0]}")
+    return threads * writes / elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    arg_parser.add_argument("--writes", type=int, default=200, help="每个线程写入的条数")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, options in CONFIGS.items():
+            for threads in args.threads:
+                db_path = os.path.join(tmp, f"{name}-{threads}.db")
+                db = Database(db_path, **options)
+                rate = run(db, threads, args.writes)
+                db.close()
+                print(f"{name:>10} {threads:>3} 线程: {rate:10.0f} 条/秒")
+
+
+if __name__ == "__main__":
+    main()
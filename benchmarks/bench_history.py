@@ -0,0 +1,107 @@
+"""chat_history 在百万/千万级数据下的查询耗时
+
+先生成不带索引的旧结构数据库，测量原来的全表扫描查询；
+再用 Database 打开同一数据库执行迁移（建立索引），测量按 id 游标分页的查询。
+
+用法: python benchmarks/bench_history.py --rows 1000000
+      python benchmarks/bench_history.py --rows 10000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database
+
+LEGACY_QUERY = """
+    SELECT * FROM chat_history
+    WHERE session_id = ? AND section = ? AND subsection = ?
+    ORDER BY timestamp
+"""
+
+
+def populate(db_path: str, rows: int, rows_per_session: int):
+    """生成旧结构（无索引）的测试数据"""
+    Database(db_path, pool_size=0).close()
+    conn = sqlite3.connect(db_path)
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'chat_history' "
+        "AND name NOT LIKE 'sqlite_%'"
+    ).fetchall():
+        conn.execute(f"DROP INDEX {name}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    batch = []
+    for i in range(rows):
+        session = i // rows_per_session
+        batch.append((
+            f"session-{session}",
+            f"章节{random.randint(0, 9)}",
+            f"小节{random.randint(0, 9)}",
+            "user" if i % 2 == 0 else "assistant",
+            "内容" * 20,
+        ))
+        if len(batch) == 100000:
+            conn.executemany(
+                "INSERT INTO chat_history (session_id, section, subsection, role, content) "
+                "VALUES (?, ?, ?, ?, ?)", batch
+            )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO chat_history (session_id, section, subsection, role, content) "
+            "VALUES (?, ?, ?, ?, ?)", batch
+        )
+    conn.commit()
+    conn.close()
+
+
+def timed(func, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=1000000)
+    arg_parser.add_argument("--rows-per-session", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "history.db")
+        start = time.perf_counter()
+        populate(db_path, args.rows, args.rows_per_session)
+        print(f"生成 {args.rows} 条记录: {time.perf_counter() - start:.1f} s")
+
+        session, section, subsection = "session-42", "章节3", "小节5"
+
+        conn = sqlite3.connect(db_path)
+        legacy = timed(lambda: conn.execute(LEGACY_QUERY, (session, section, subsection)).fetchall(), 3)
+        conn.close()
+        print(f"旧查询（全表扫描 + 排序）: {legacy * 1000:.2f} ms")
+
+        start = time.perf_counter()
+        db = Database(db_path)
+        print(f"迁移（建立索引）: {time.perf_counter() - start:.1f} s")
+
+        page = timed(lambda: db.get_chat_history_page(session, section, subsection, limit=20))
+        full = timed(lambda: list(db.iter_chat_history(session, section, subsection)))
+        whole_session = timed(lambda: list(db.iter_chat_history(session)))
+        print(f"游标分页首页: {page * 1000:.2f} ms")
+        print(f"逐页读取该页面全部记录: {full * 1000:.2f} ms")
+        print(f"逐页读取该会话全部记录: {whole_session * 1000:.2f} ms")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""章节内容渲染的耗时对比
+
+- 每次新建 Markdown 实例再转换（原 render_markdown 的做法）
+- 复用线程内的转换器，每次 reset 后转换
+- 内容哈希命中 HTML 缓存
+
+用法: python benchmarks/bench_markdown.py --rounds 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markdown
+
+from lecture_manager import LectureManager
+from markdown_renderer import EXTENSIONS, EXTENSION_CONFIGS, MarkdownRenderer, _converter
+
+
+def new_instance(content: str) -> str:
+    md = markdown.Markdown(extensions=EXTENSIONS, extension_configs=EXTENSION_CONFIGS)
+    return md.convert(content)
+
+
+def reused_converter(content: str) -> str:
+    md = _converter()
+    md.reset()
+    return md.convert(content)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="章节内容渲染的耗时对比")
+    arg_parser.add_argument("--lecture-dir", default="lecture")
+    arg_parser.add_argument("--rounds", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    manager = LectureManager(args.lecture_dir, use_index=False)
+    contents = [
+        section.content
+        for lecture in manager.get_available_lectures()
+        for section in manager.load_lecture(lecture["path"]).root.values()
+    ]
+    renderer = MarkdownRenderer()
+    for content in contents:
+        renderer.render(content)
+
+    print(f"{len(contents)} 个章节，共 {sum(map(len, contents))} 字符")
+    print(f"{'方式':<16}{'每个章节(ms)':>14}")
+    for name, render in (
+        ("新建实例", new_instance),
+        ("复用转换器", reused_converter),
+        ("HTML 缓存", renderer.render),
+    ):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for content in contents:
+                render(content)
+        elapsed = (time.perf_counter() - start) / (args.rounds * len(contents))
+        print(f"{name:<16}{elapsed * 1000:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""指标记录的额外开销
+
+对比空函数直接调用、@timed 装饰后指标关闭/开启时的每次调用耗时，
+以及 stream_timer 在每个片段上的开销和导出一次文本的耗时。
+
+用法: python benchmarks/bench_metrics.py --calls 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+
+def noop(x):
+    return x
+
+
+@metrics.timed("javahelper_db_seconds", operation="bench")
+def timed_noop(x):
+    return x
+
+
+def per_call(func, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls
+
+
+def stream_chunks(calls: int) -> float:
+    start = time.perf_counter()
+    stream_timer = metrics.stream_timer(client="bench")
+    for _ in range(calls):
+        stream_timer.chunk()
+    stream_timer.done()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="指标记录的额外开销")
+    arg_parser.add_argument("--calls", type=int, default=1000000)
+    args = arg_parser.parse_args()
+
+    baseline = per_call(noop, args.calls)
+    print(f"{'直接调用':<20}{baseline * 1e9:>10.1f} ns")
+    for enabled in (False, True):
+        metrics.registry.enabled = enabled
+        state = "开启" if enabled else "关闭"
+        cost = per_call(timed_noop, args.calls)
+        print(f"{'@timed（' + state + '）':<20}{cost * 1e9:>10.1f} ns  (+{(cost - baseline) * 1e9:.1f} ns)")
+        print(f"{'stream_timer（' + state + '）':<20}{stream_chunks(args.calls) * 1e9:>10.1f} ns / 片段")
+
+    start = time.perf_counter()
+    text = metrics.registry.render()
+    print(f"导出 {len(text.splitlines())} 行: {(time.perf_counter() - start) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""对比整篇解析、单遍流式解析与按需解码解析在大型合成教案上的性能
+
+用法: python benchmarks/bench_parser.py --sections 2000 --subsections 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from doc_parser import GuideParser
+
+
+MODES = ("legacy", "streaming", "lazy")
+
+
+def make_guide(sections: int, subsections: int) -> str:
+    """生成合成教案：每个章节包含若干带AI提示词的小节"""
+    lines = ["# 合成教案", "", "## 目录", "", "- 目录项", ""]
+    for i in range(sections):
+        lines.append(f"## 第{i}章")
+        lines.append("")
+        lines.append(f"本章介绍第{i}部分内容。" * 3)
+        lines.append("")
+        for j in range(subsections):
+            lines.append(f"### {j + 1}. 小节{i}-{j}")
+            lines.append("")
+            lines.append("**AI提示词：**")
+            lines.append("```")
+            lines.append(f"请说明第{i}章第{j}节的要点：")
+            lines.append("1. 核心概念")
+            lines.append("2. 示例代码")
+            lines.append("```")
+            lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def dump(root):
+    return [
+        (s.title, s.content, s.prompt, [(c.title, c.content, c.prompt) for c in s.children])
+        for s in root.values()
+    ]
+
+
+def measure(path: str, mode: str, repeat: int):
+    best = float("inf")
+    parser = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser = GuideParser(path, mode=mode)
+        best = min(best, time.perf_counter() - start)
+    return best, parser
+
+
+def memory_usage(path: str, mode: str):
+    """返回(解析结果常驻内存, 解析过程内存峰值)，单位字节；内存映射的页面不计入"""
+    tracemalloc.start()
+    parser = GuideParser(path, mode=mode)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del parser
+    return current, peak
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sections", type=int, default=2000)
+    arg_parser.add_argument("--subsections", type=int, default=5)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "guide.qmd")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(make_guide(args.sections, args.subsections))
+
+        headings = args.sections * (args.subsections + 1)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"合成教案: {headings} 个标题, {size_mb:.1f} MB")
+
+        results = {}
+        expected = None
+        for mode in MODES:
+            elapsed, parser = measure(path, mode=mode, repeat=args.repeat)
+            tree = dump(parser.root)
+            if expected is None:
+                expected = tree
+            elif tree != expected:
+                print(f"错误: {mode} 模式的解析结果与 legacy 不一致")
+                sys.exit(1)
+            results[mode] = (elapsed,) + memory_usage(path, mode=mode)
+
+        legacy_time = results["legacy"][0]
+        for mode, (elapsed, retained, peak) in results.items():
+            print(f"{mode:>9}: {elapsed * 1000:8.1f} ms  {legacy_time / elapsed:5.2f}x  "
+                  f"常驻 {retained / 1024 / 1024:.1f} MB  峰值 {peak / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
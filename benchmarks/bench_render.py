@@ -0,0 +1,92 @@
+"""流式回答渲染的开销对比
+
+用记录调用的假占位符代替 Streamlit 组件，对比原来的逐块拼接 + 整体重渲染
+与 StreamingMarkdown（节流 + 只重渲染最后一个块）的界面更新次数、
+发送到前端的文本总量和 CPU 时间。
+
+用法: python benchmarks/bench_render.py --chars 20000 --chunk 4 --token-interval 0.0005
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import StreamingMarkdown
+
+BLOCKS = [
+    "Servlet 的生命周期由容器管理，主要分为加载、初始化、处理请求和销毁四个阶段。\n\n",
+    "1. 加载并实例化 Servlet\n2. 调用 init() 完成初始化\n3. 每个请求调用 service()\n4. 卸载前调用 destroy()\n\n",
+    "```java\npublic class HelloServlet extends HttpServlet {\n    @Override\n"
+    "    protected void doGet(HttpServletRequest req, HttpServletResponse resp) throws IOException {\n"
+    "        resp.getWriter().write(\"hello\");\n    }\n}\n```\n\n",
+    "| 方法 | 调用次数 |\n| --- | --- |\n| init | 1 |\n| service | 多次 |\n| destroy | 1 |\n\n",
+]
+
+
+class FakeSlot:
+    def __init__(self, stats):
+        self.stats = stats
+
+    def markdown(self, text):
+        self.stats["updates"] += 1
+        self.stats["bytes"] += len(text.encode("utf-8"))
+
+    def empty(self):
+        return FakeSlot(self.stats)
+
+    def container(self):
+        return FakeSlot(self.stats)
+
+
+def make_chunks(chars: int, chunk: int):
+    text = ""
+    while len(text) < chars:
+        text += "".join(BLOCKS)
+    return [text[i:i + chunk] for i in range(0, len(text), chunk)]
+
+
+def run_legacy(chunks, interval):
+    stats = {"updates": 0, "bytes": 0}
+    placeholder = FakeSlot(stats)
+    cpu = time.process_time()
+    full_response = ""
+    for chunk in chunks:
+        full_response += chunk
+        placeholder.markdown(full_response + "▌")
+        time.sleep(interval)
+    placeholder.markdown(full_response)
+    stats["cpu"] = time.process_time() - cpu
+    return stats
+
+
+def run_streaming(chunks, interval):
+    stats = {"updates": 0, "bytes": 0}
+    renderer = StreamingMarkdown(FakeSlot(stats))
+    cpu = time.process_time()
+    for chunk in chunks:
+        renderer.write(chunk)
+        time.sleep(interval)
+    renderer.finish()
+    stats["cpu"] = time.process_time() - cpu
+    return stats
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="流式回答渲染的开销对比")
+    arg_parser.add_argument("--chars", type=int, default=20000, help="回答长度")
+    arg_parser.add_argument("--chunk", type=int, default=4, help="每个分块的字符数")
+    arg_parser.add_argument("--token-interval", type=float, default=0.0005, help="分块间隔（秒）")
+    args = arg_parser.parse_args()
+
+    chunks = make_chunks(args.chars, args.chunk)
+    print(f"{len(chunks)} 个分块")
+    print(f"{'方式':<14}{'界面更新次数':>12}{'发送文本(KB)':>14}{'CPU(ms)':>10}")
+    for name, run in (("逐块整体重渲染", run_legacy), ("增量渲染", run_streaming)):
+        stats = run(chunks, args.token_interval)
+        print(f"{name:<14}{stats['updates']:>12}{stats['bytes'] / 1024:>14.1f}{stats['cpu'] * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
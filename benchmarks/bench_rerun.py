@@ -0,0 +1,161 @@
+"""脚本重跑时创建客户端、数据库和教案管理器的开销
+
+Streamlit 每次交互都会重跑 app.py。对比脚本开头准备这些对象的三种方式（每次重跑的耗时）：
+- construct: 每次重跑都新建 LectureManager、Database（执行建表语句）和 DeepSeekClient
+- registry: 各模块的 get_xxx 进程内注册表，但每次重跑仍新建 LectureManager
+- resources: 进程级资源（resources.py），重跑时只查找已创建的实例
+--apptest 时再用 AppTest 驱动 app.py 重跑，给出整个脚本一次重跑的耗时作为参照。
+
+用法: python benchmarks/bench_rerun.py --reruns 200 --apptest
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db import Database, get_database
+from deepseek_client import (AsyncRunner, DeepSeekClient, close_async, get_async_client,
+                             get_async_runner)
+from lecture_manager import LectureManager
+from resources import ResourceRegistry
+from response_cache import get_response_cache
+
+API_KEY = "benchmark"
+BASE_URL = "http://127.0.0.1:9/v1"
+
+
+def setup_construct(workdir: str) -> Callable[[], None]:
+    lecture_dir = os.path.join(workdir, "lecture")
+    db_path = os.path.join(workdir, "construct.db")
+    created: List[Database] = []
+
+    def rerun():
+        LectureManager(lecture_dir, prerender=True)
+        created.append(Database(db_path))
+        DeepSeekClient(API_KEY, base_url=BASE_URL)
+
+    rerun.created = created
+    return rerun
+
+
+def setup_registry(workdir: str) -> Callable[[], None]:
+    lecture_dir = os.path.join(workdir, "lecture")
+    db_path = os.path.join(workdir, "registry.db")
+
+    def rerun():
+        LectureManager(lecture_dir, prerender=True)
+        get_database(db_path, pool_size=8)
+        cache = get_response_cache("memory")
+        get_async_runner()
+        get_async_client(API_KEY, cache=cache, base_url=BASE_URL)
+
+    return rerun
+
+
+def setup_resources(workdir: str) -> Callable[[], None]:
+    lecture_dir = os.path.join(workdir, "lecture")
+    db_path = os.path.join(workdir, "resources.db")
+    registry = ResourceRegistry()
+
+    def rerun():
+        registry.get("lecture_manager", lambda: LectureManager(lecture_dir, prerender=True),
+                     health_check=LectureManager.healthy, close=LectureManager.close)
+        registry.get("async_runner", get_async_runner, health_check=AsyncRunner.alive,
+                     close=lambda runner: close_async())
+        registry.get(("deepseek_client", "benchmark"),
+                     lambda: get_async_client(API_KEY, cache=get_response_cache("memory"),
+                                              base_url=BASE_URL),
+                     depends=("async_runner",))
+        registry.get("database", lambda: get_database(db_path, pool_size=8),
+                     health_check=Database.healthy, close=Database.close)
+
+    rerun.registry = registry
+    return rerun
+
+
+MODES = {"construct": setup_construct, "registry": setup_registry, "resources": setup_resources}
+
+
+def time_reruns(rerun: Callable[[], None], reruns: int) -> Dict[str, float]:
+    rerun()  # 首次运行负责创建，不计入
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        rerun()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p95_us": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6,
+    }
+
+
+def apptest_reruns(workdir: str, reruns: int) -> Dict[str, float]:
+    """用 AppTest 重跑整个 app.py，返回每次重跑的平均耗时（毫秒）"""
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.mock_llm_server import start_mock_server
+
+    server, _ = start_mock_server("127.0.0.1")
+    os.environ.update(
+        DEEPSEEK_API_KEY=API_KEY,
+        DEEPSEEK_BASE_URL=server.base_url,
+        DB_PATH=os.path.join(workdir, "learning_records.db"),
+        PRECOMPUTED_ANSWERS_PATH=os.path.join(workdir, "precomputed_answers.db"),
+        METRICS_ENABLED="false",
+    )
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60).run()
+        start = time.perf_counter()
+        for _ in range(reruns):
+            app = app.run()
+        elapsed = time.perf_counter() - start
+        errors = len(app.exception)
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+    return {"rerun_ms": elapsed / reruns * 1000, "errors": errors}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="脚本重跑时准备共享对象的开销")
+    arg_parser.add_argument("--reruns", type=int, default=200)
+    arg_parser.add_argument("--lecture-dir", default=os.path.join(ROOT, "lecture"))
+    arg_parser.add_argument("--apptest", action="store_true", help="同时测量 app.py 整体重跑耗时")
+    arg_parser.add_argument("--apptest-reruns", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copytree(args.lecture_dir, os.path.join(workdir, "lecture"))
+        results = {}
+        for name, setup in MODES.items():
+            rerun = setup(workdir)
+            results[name] = time_reruns(rerun, args.reruns)
+            for database in getattr(rerun, "created", []):
+                database.close()
+            if hasattr(rerun, "registry"):
+                rerun.registry.close()
+
+        base = results["construct"]["mean_us"]
+        print(f"每次重跑准备共享对象（{args.reruns} 次）")
+        for name, result in results.items():
+            print(f"  {name:<10} 平均 {result['mean_us']:9.1f} µs  p50 {result['p50_us']:9.1f} µs"
+                  f"  p95 {result['p95_us']:9.1f} µs  ×{base / result['mean_us']:.0f}")
+
+        if args.apptest:
+            result = apptest_reruns(workdir, args.apptest_reruns)
+            saved = (base - results["resources"]["mean_us"]) / 1000
+            print(f"app.py 整体重跑 {result['rerun_ms']:.1f} ms（异常 {result['errors']}），"
+                  f"每次重跑节省约 {saved:.2f} ms（相对 construct）")
+
+
+if __name__ == "__main__":
+    main()
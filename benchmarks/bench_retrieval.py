@@ -0,0 +1,75 @@
+"""教案片段检索：请求大小与检索耗时
+
+对每个页面比较两种首轮提问：
+- 原来的做法：没有AI提示词时把整节内容作为提问
+- 检索：提问只有一句话，系统提示词附加检索到的前 k 个片段
+
+输出请求的估算 token 数，以及建索引和单次检索的耗时。
+
+用法: python benchmarks/bench_retrieval.py --k 3 --max-chars 1500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_window import count_tokens
+from deepseek_client import DeepSeekClient
+from lecture_manager import LectureManager
+from retrieval import LectureRetriever
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="教案片段检索：请求大小与检索耗时")
+    arg_parser.add_argument("--lecture-dir", default="lecture")
+    arg_parser.add_argument("--k", type=int, default=3)
+    arg_parser.add_argument("--max-chars", type=int, default=1500)
+    arg_parser.add_argument("--chunk-chars", type=int, default=600)
+    args = arg_parser.parse_args()
+
+    client = DeepSeekClient("unused")
+    manager = LectureManager(args.lecture_dir, use_index=False)
+    # 按页面是否有AI提示词分别统计 [页面数, 原来的 token, 检索后的 token, 原来最大, 检索后最大]
+    totals = {True: [0, 0, 0, 0, 0], False: [0, 0, 0, 0, 0]}
+    build = 0.0
+    latencies = []
+    for lecture in manager.get_available_lectures():
+        parser = manager.load_lecture(lecture["path"])
+        start = time.perf_counter()
+        retriever = LectureRetriever(parser, args.chunk_chars)
+        build += time.perf_counter() - start
+
+        for node_id, entry in parser.navigation.entries.items():
+            node = entry.node
+            topic = f"{lecture['name']} - {entry.section} - {entry.title}"
+            question = node.prompt or f"请讲解「{entry.title}」这一节的内容"
+            old_question = node.prompt or node.content
+
+            start = time.perf_counter()
+            references = retriever.references(f"{entry.title} {question}", args.k, node_id, args.max_chars)
+            latencies.append(time.perf_counter() - start)
+
+            total = totals[bool(node.prompt)]
+            total[0] += 1
+            old_tokens = count_tokens(client._generate_system_prompt(topic)) + count_tokens(old_question)
+            new_tokens = count_tokens(client._generate_system_prompt(topic, references)) + count_tokens(question)
+            total[1] += old_tokens
+            total[2] += new_tokens
+            total[3] = max(total[3], old_tokens)
+            total[4] = max(total[4], new_tokens)
+
+    latencies.sort()
+    print(f"{len(latencies)} 个页面，建索引共 {build * 1000:.1f} ms")
+    for has_prompt, (pages, before, after, before_max, after_max) in totals.items():
+        if pages:
+            label = "有AI提示词" if has_prompt else "无AI提示词"
+            print(f"{label}的 {pages} 个页面，首轮请求 token: 平均 {before / pages:.0f} -> {after / pages:.0f}，"
+                  f"最大 {before_max} -> {after_max}")
+    print(f"检索延迟: p50 {latencies[len(latencies) // 2] * 1000:.3f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
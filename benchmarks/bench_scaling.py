@@ -0,0 +1,156 @@
+"""多进程扩展：应用进程数与页面吞吐量
+
+对每个进程数，用 serve.py 启动应用进程和负载均衡（共享后端为临时 SQLite 文件，
+响应缓存使用共享后端），然后由 --concurrency 个客户端通过负载均衡持续打开页面：
+建立 Streamlit 的 WebSocket 连接，请求运行脚本，等待脚本运行结束。
+每次打开都是一个新会话（创建会话、解析导航、渲染页面），是 CPU 密集的部分；
+吞吐量随进程数增长的上限是机器的 CPU 核数。
+
+用法: python benchmarks/bench_scaling.py --workers 1,2,4 --concurrency 16 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+from benchmarks.mock_llm_server import start_mock_server
+from serve import wait_ready
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def open_page(url: str, timeout: float) -> bool:
+    """打开一次页面，脚本正常运行结束且页面上没有异常时返回 True"""
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None,
+                                  open_timeout=timeout) as ws:
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        await ws.send(message.SerializeToString())
+        ok = True
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(ws.recv(), timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.new_element.WhichOneof("type") == "exception":
+                ok = False
+            if kind == "script_finished":
+                return ok and forward.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY
+
+
+async def load(url: str, concurrency: int, duration: float, timeout: float) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = await open_page(url, timeout)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        "pages": len(latencies),
+        "errors": errors,
+        "pages_per_second": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(0.5), 1),
+        "p95_ms": round(percentile(0.95), 1),
+    }
+
+
+def run_cluster(workers: int, args, workdir: str, base_url: str) -> Dict:
+    port = free_port()
+    env = dict(
+        os.environ,
+        DEEPSEEK_API_KEY="benchmark",
+        DEEPSEEK_BASE_URL=base_url,
+        DB_PATH=os.path.join(workdir, "learning_records.db"),
+        PRECOMPUTED_ANSWERS_PATH=os.path.join(workdir, "precomputed_answers.db"),
+        SHARED_BACKEND=f"sqlite:///{os.path.join(workdir, 'shared_state.db')}",
+        RESPONSE_CACHE_BACKEND="shared",
+        METRICS_ENABLED="false",
+    )
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", str(workers),
+         "--host", "127.0.0.1", "--port", str(port), "--worker-port", str(free_port())],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_ready("127.0.0.1", port, timeout=120, process=process):
+            raise RuntimeError("服务启动超时")
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        # 预热：每个进程都完成首次导入和教案加载
+        asyncio.run(load(url, workers, args.warmup, args.timeout))
+        return asyncio.run(load(url, args.concurrency, args.duration, args.timeout))
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="应用进程数与页面吞吐量")
+    arg_parser.add_argument("--workers", default="1,2,4", help="依次测试的进程数，逗号分隔")
+    arg_parser.add_argument("--concurrency", type=int, default=16, help="同时打开页面的客户端数")
+    arg_parser.add_argument("--duration", type=float, default=20.0, help="每轮压测时长（秒）")
+    arg_parser.add_argument("--warmup", type=float, default=3.0, help="预热时长（秒）")
+    arg_parser.add_argument("--timeout", type=float, default=60.0)
+    arg_parser.add_argument("--lecture-dir", default=os.path.join(ROOT, "lecture"))
+    arg_parser.add_argument("--output", help="结果写入 JSON 文件")
+    args = arg_parser.parse_args()
+
+    server, _ = start_mock_server("127.0.0.1")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copytree(args.lecture_dir, os.path.join(workdir, "lecture"))
+        for workers in [int(value) for value in args.workers.split(",")]:
+            result = {"workers": workers, **run_cluster(workers, args, workdir, server.base_url)}
+            results.append(result)
+            speedup = result["pages_per_second"] / results[0]["pages_per_second"] \
+                if results[0]["pages_per_second"] else 0.0
+            print(f"{workers:>2} 个进程  {result['pages_per_second']:8.2f} 页/秒  ×{speedup:4.2f}"
+                  f"  p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms"
+                  f"  失败 {result['errors']}")
+    server.shutdown()
+
+    print(f"CPU 核数: {os.cpu_count()}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cpu_count": os.cpu_count(), "concurrency": args.concurrency,
+                       "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""全文检索的建索引与查询耗时
+
+把 lecture/ 下的教案复制 N 份（默认 100 倍）组成测试语料，测量：
+全量建索引、无变化时的同步、单个文件修改后的增量同步，以及查询延迟分位数。
+
+用法: python benchmarks/bench_search.py --scale 100
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lecture_index import LECTURE_EXTENSIONS
+from lecture_manager import LectureCache, LectureManager
+from search_index import SearchIndex
+
+QUERIES = ["连接池", "Servlet 生命周期", "Maven", "库", "事务管理", "JDBC", "分页查询",
+           "Spring Boot 配置", "异常处理", "前端页面", "不存在的内容xyz"]
+
+
+def make_corpus(source_dir: str, target_dir: str, scale: int):
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith(LECTURE_EXTENSIONS):
+            continue
+        name, ext = os.path.splitext(filename)
+        for i in range(scale):
+            shutil.copyfile(os.path.join(source_dir, filename),
+                            os.path.join(target_dir, f"{name}-{i:03d}{ext}"))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="全文检索的建索引与查询耗时")
+    arg_parser.add_argument("--lecture-dir", default="lecture")
+    arg_parser.add_argument("--scale", type=int, default=100, help="语料放大倍数")
+    arg_parser.add_argument("--repeat", type=int, default=50, help="每个查询重复次数")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        make_corpus(args.lecture_dir, corpus_dir, args.scale)
+        manager = LectureManager(corpus_dir, cache=LectureCache(max_entries=10 ** 6), use_index=False)
+        index = SearchIndex()
+
+        start = time.perf_counter()
+        index.sync(manager)
+        build = time.perf_counter() - start
+        lectures = len(manager.get_available_lectures())
+        print(f"{lectures} 个教案，{len(index)} 个节点，{len(index._postings)} 个检索词")
+        print(f"全量建索引: {build * 1000:.1f} ms")
+
+        start = time.perf_counter()
+        index.sync(manager)
+        print(f"无变化同步: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        changed = os.path.join(corpus_dir, sorted(os.listdir(corpus_dir))[0])
+        with open(changed, "a", encoding="utf-8") as f:
+            f.write("\n## 附录\n\n新增的内容：线程池与连接池的区别\n")
+        start = time.perf_counter()
+        rebuilt = index.sync(manager)
+        print(f"修改 1 个文件后同步: {(time.perf_counter() - start) * 1000:.1f} ms（重建 {rebuilt} 个教案）")
+
+        latencies = []
+        for _ in range(args.repeat):
+            for query in QUERIES:
+                start = time.perf_counter()
+                index.search(query, limit=10)
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[int(len(latencies) * 0.95)]
+        print(f"查询延迟: p50 {p50 * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms, 最大 {latencies[-1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""会话存储：长时间学习后的内存占用与页面切换耗时
+
+模拟一个会话依次学习 --pages 个页面、每页 --exchanges 轮问答，对比：
+- 全部对话保存在内存字典中（原来的 st.session_state.chat_histories）
+- SessionStore：只在内存中保留最近 --max-pages 个页面，其余从数据库重新加载
+并测量切换到内存中页面 / 需要从数据库加载的页面所需的时间。
+
+用法: python benchmarks/bench_session_store.py --pages 200 --exchanges 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database
+from session_store import SessionStore
+
+ANSWER = "这是一个关于 Java Web 开发的回答。" * 40
+
+
+def study(store, pages: int, exchanges: int):
+    for page in range(pages):
+        for i in range(exchanges):
+            store(f"章节/小节{page}", f"问题 {i}", ANSWER)
+
+
+def measure(func) -> int:
+    tracemalloc.start()
+    func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="会话存储的内存占用与页面切换耗时")
+    arg_parser.add_argument("--pages", type=int, default=200)
+    arg_parser.add_argument("--exchanges", type=int, default=5)
+    arg_parser.add_argument("--max-pages", type=int, default=8)
+    arg_parser.add_argument("--switches", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    histories = {}
+
+    def in_memory(page, prompt, response):
+        histories.setdefault(page, []).extend([
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": response}
+        ])
+
+    print(f"全部在内存中    {measure(lambda: study(in_memory, args.pages, args.exchanges)) / 1024:10.0f} KB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        store = SessionStore(db, "bench-session", max_pages=args.max_pages)
+        db.ensure_session("bench-session")
+
+        def durable(page, prompt, response):
+            store.append("lecture.md", page, "章节", page, prompt, response)
+
+        memory = measure(lambda: study(durable, args.pages, args.exchanges))
+        db.flush()
+        print(f"SessionStore    {memory / 1024:10.0f} KB（内存中 {store.cached_pages()} 个页面）")
+
+        for label, pages in (("内存中的页面", range(args.pages - 1, args.pages - 1 - args.max_pages, -1)),
+                             ("从数据库加载", range(args.switches))):
+            pages = list(pages)
+            loads = store.loads
+            start = time.perf_counter()
+            for page in pages:
+                store.history("lecture.md", f"章节/小节{page % args.pages}")
+            elapsed = (time.perf_counter() - start) / len(pages)
+            print(f"切换到{label}  {elapsed * 1e6:10.1f} us / 次（加载 {store.loads - loads} 次）")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""对比冷启动时从预编译索引加载与从源文件解析教案的耗时
+
+用法: python benchmarks/bench_startup.py --lectures 20 --sections 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parser import make_guide
+from lecture_index import LectureIndex, build_index
+from lecture_manager import LectureCache, LectureManager
+
+
+def cold_start(lecture_dir: str, use_index: bool, load_all: bool) -> float:
+    """模拟新进程：全新的缓存与索引对象，列出教案并加载"""
+    start = time.perf_counter()
+    manager = LectureManager(lecture_dir, cache=LectureCache(), use_index=False)
+    if use_index:
+        manager.index = LectureIndex(lecture_dir)
+    lectures = manager.get_available_lectures()
+    for lecture in (lectures if load_all else lectures[:1]):
+        manager.load_lecture(lecture["path"])
+    return time.perf_counter() - start
+
+
+def best_of(repeat: int, *args) -> float:
+    return min(cold_start(*args) for _ in range(repeat))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--lectures", type=int, default=20)
+    arg_parser.add_argument("--sections", type=int, default=200)
+    arg_parser.add_argument("--subsections", type=int, default=5)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lecture_dir = os.path.join(tmp, "lecture")
+        os.makedirs(lecture_dir)
+        guide = make_guide(args.sections, args.subsections)
+        for i in range(args.lectures):
+            with open(os.path.join(lecture_dir, f"教案{i}.qmd"), "w", encoding="utf-8") as f:
+                f.write(guide)
+
+        start = time.perf_counter()
+        build_index(lecture_dir)
+        build_time = time.perf_counter() - start
+        print(f"{args.lectures} 个教案, 每个 {args.sections * (args.subsections + 1)} 个标题")
+        print(f"生成索引: {build_time * 1000:.1f} ms")
+
+        for load_all, label in ((False, "列出教案并加载第一个"), (True, "列出并加载全部教案")):
+            parse_time = best_of(args.repeat, lecture_dir, False, load_all)
+            index_time = best_of(args.repeat, lecture_dir, True, load_all)
+            print(f"{label}: 解析源文件 {parse_time * 1000:.1f} ms, "
+                  f"读取索引 {index_time * 1000:.1f} ms ({parse_time / index_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
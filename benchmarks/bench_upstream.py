@@ -0,0 +1,80 @@
+"""全班同时提问时的上游请求数与排队时间
+
+模拟 N 个会话在同一时刻提出相同（或各不相同）的问题，对比开启/关闭请求合并时
+实际发往上游的请求数、429 重试次数和排队等待时间。
+
+用法: python benchmarks/bench_upstream.py --sessions 40 --rate 5 --error-rate 0.1
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepseek_client import AsyncDeepSeekClient, AsyncRunner
+from mock_llm_server import start_mock_server
+
+
+def run(args, coalesce: bool, distinct: bool):
+    server, _ = start_mock_server(
+        first_token_latency=args.first_token_latency,
+        token_interval=args.token_interval,
+        tokens=args.tokens,
+        error_rate=args.error_rate
+    )
+    runner = AsyncRunner()
+    client = AsyncDeepSeekClient(
+        api_key="mock",
+        base_url=server.base_url,
+        rate_limit=args.rate,
+        rate_burst=args.burst,
+        retry_backoff=0.1,
+        coalesce=coalesce
+    )
+
+    def session(i: int) -> str:
+        question = f"问题 {i}" if distinct else "请解释 Servlet 的生命周期"
+        messages = [{"role": "user", "content": question}]
+        return "".join(runner.iterate(client.stream_response(messages, current_topic="Servlet")))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        answers = list(executor.map(session, range(args.sessions)))
+    elapsed = time.perf_counter() - start
+
+    stats = client.upstream.stats.snapshot()
+    runner.run(client.aclose())
+    runner.close()
+    server.shutdown()
+    server.server_close()
+    failed = sum(answer.startswith("错误") for answer in answers)
+    return elapsed, server.request_count, stats, failed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="全班同时提问时的上游请求数与排队时间")
+    arg_parser.add_argument("--sessions", type=int, default=40)
+    arg_parser.add_argument("--rate", type=float, default=5, help="每秒请求数上限")
+    arg_parser.add_argument("--burst", type=int, default=10)
+    arg_parser.add_argument("--error-rate", type=float, default=0.1, help="模拟服务返回 429 的比例")
+    arg_parser.add_argument("--first-token-latency", type=float, default=0.3)
+    arg_parser.add_argument("--token-interval", type=float, default=0.01)
+    arg_parser.add_argument("--tokens", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    print(f"{'场景':<16}{'总耗时(s)':>10}{'上游请求':>10}{'合并':>6}{'重试':>6}{'失败':>6}"
+          f"{'排队p50':>10}{'排队p95':>10}")
+    for name, coalesce, distinct in (
+        ("相同问题/不合并", False, False),
+        ("相同问题/合并", True, False),
+        ("不同问题/合并", True, True),
+    ):
+        elapsed, upstream_requests, stats, failed = run(args, coalesce, distinct)
+        print(f"{name:<16}{elapsed:>10.2f}{upstream_requests:>10}{stats['coalesced']:>6}"
+              f"{stats['retries']:>6}{failed:>6}{stats['queue_wait_p50']:>10.3f}{stats['queue_wait_p95']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
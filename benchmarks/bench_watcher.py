@@ -0,0 +1,75 @@
+"""教案目录监视：每次重跑的开销与修改生效延迟
+
+- 每次重跑的教案访问（get_available_lectures + load_lecture）：
+  不监视时每次都要 listdir / stat，监视时只读内存
+- 修改教案文件后，新解析树出现在缓存中所需的时间（watchdog 与轮询）
+
+用法: python benchmarks/bench_watcher.py --reruns 2000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lecture_index import LECTURE_EXTENSIONS
+from lecture_manager import LectureCache, LectureManager
+
+
+def rerun_cost(manager: LectureManager, reruns: int) -> float:
+    lectures = manager.get_available_lectures()
+    start = time.perf_counter()
+    for _ in range(reruns):
+        lectures = manager.get_available_lectures()
+        manager.load_lecture(lectures[0]["path"])
+    return (time.perf_counter() - start) / reruns
+
+
+def reload_latency(manager: LectureManager, rounds: int) -> list:
+    path = manager.get_available_lectures()[0]["path"]
+    latencies = []
+    for i in range(rounds):
+        parser = manager.load_lecture(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"\n## 附录{i}\n\n新增内容\n")
+        start = time.perf_counter()
+        while manager.load_lecture(path) is parser:
+            if time.perf_counter() - start > 10:
+                raise RuntimeError("修改未生效")
+            time.sleep(0.001)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="教案目录监视的开销与修改生效延迟")
+    arg_parser.add_argument("--lecture-dir", default="lecture")
+    arg_parser.add_argument("--reruns", type=int, default=2000)
+    arg_parser.add_argument("--rounds", type=int, default=10, help="修改文件的次数")
+    arg_parser.add_argument("--poll-interval", type=float, default=1.0)
+    args = arg_parser.parse_args()
+
+    for mode in ("不监视", "watchdog", "poll"):
+        with tempfile.TemporaryDirectory() as lecture_dir:
+            for filename in os.listdir(args.lecture_dir):
+                if filename.endswith(LECTURE_EXTENSIONS):
+                    shutil.copy(os.path.join(args.lecture_dir, filename), lecture_dir)
+            manager = LectureManager(
+                lecture_dir, cache=LectureCache(), use_index=False,
+                watch=mode != "不监视", watch_backend=mode, poll_interval=args.poll_interval
+            )
+            cost = rerun_cost(manager, args.reruns)
+            line = f"{mode:<10} 每次重跑 {cost * 1e6:8.1f} us"
+            if manager.watcher is not None:
+                latencies = sorted(reload_latency(manager, args.rounds))
+                line += (f"，修改生效 p50 {latencies[len(latencies) // 2] * 1000:.0f} ms"
+                         f" / 最大 {latencies[-1] * 1000:.0f} ms")
+                manager.watcher.stop()
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
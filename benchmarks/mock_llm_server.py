@@ -0,0 +1,169 @@
+"""本地模拟的 OpenAI 兼容接口（/chat/completions）
+
+支持流式（SSE）与非流式响应，可配置首 token 延迟、token 间隔、回答长度和
+按比例返回的 429 错误，并统计请求数与 TCP 连接数（用于验证连接复用）。
+
+用法: python benchmarks/mock_llm_server.py --port 8900 --first-token-latency 0.3 --token-interval 0.02
+然后把 DEEPSEEK_BASE_URL 设置为 http://127.0.0.1:8900
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+FOLLOW_UP_ANSWER = "这个概念在实际项目中如何应用？\n有哪些常见的错误需要避免？\n能给出一个完整的示例吗？"
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, first_token_latency: float = 0.0, token_interval: float = 0.0,
+                 tokens: int = 50, error_rate: float = 0.0):
+        super().__init__(address, MockLLMHandler)
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.error_count = 0
+        self.connection_count = 0
+        self._lock = threading.Lock()
+
+    def count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connection_count")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        self.server.count("request_count")
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.server.count("error_count")
+            self._error(429, "rate limit exceeded")
+            return
+
+        messages = body.get("messages", [])
+        model = body.get("model", "mock")
+        is_follow_up = any("追加提问" in m.get("content", "") for m in messages if m.get("role") == "system")
+        if is_follow_up:
+            pieces = [FOLLOW_UP_ANSWER]
+        else:
+            pieces = [f"第{i}段 " for i in range(self.server.tokens)]
+
+        time.sleep(self.server.first_token_latency)
+        if body.get("stream"):
+            self._stream(pieces, model)
+        else:
+            time.sleep(self.server.token_interval * max(len(pieces) - 1, 0))
+            self._complete("".join(pieces), model)
+
+    def _complete(self, text: str, model: str):
+        payload = json.dumps({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, message: str):
+        payload = json.dumps({"error": {"message": message, "type": "rate_limit_error"}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, pieces, model: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(self.server.token_interval)
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, **options) -> Tuple[MockLLMServer, threading.Thread]:
+    """在后台线程中启动模拟服务，port 为 0 时自动选择端口"""
+    server = MockLLMServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8900)
+    arg_parser.add_argument("--first-token-latency", type=float, default=0.3, help="首 token 延迟（秒）")
+    arg_parser.add_argument("--token-interval", type=float, default=0.02, help="token 间隔（秒）")
+    arg_parser.add_argument("--tokens", type=int, default=50, help="每个回答的 token 数")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="返回 429 的请求比例")
+    args = arg_parser.parse_args()
+
+    server = MockLLMServer(
+        (args.host, args.port),
+        first_token_latency=args.first_token_latency,
+        token_interval=args.token_interval,
+        tokens=args.tokens,
+        error_rate=args.error_rate
+    )
+    print(f"模拟服务已启动: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
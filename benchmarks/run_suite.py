@@ -0,0 +1,342 @@
+"""可复现的基准测试套件，结果输出为 JSON
+
+- parser: 合成教案上三种解析模式的吞吐量
+- db: 多线程并发写入对话记录的同时读取对话历史，统计写入吞吐和读取延迟
+- e2e: 启动本地模拟的 LLM 接口，用 Streamlit AppTest 驱动 app.py 完成
+  打开页面、切换小节、获取AI指导、点击追加提问的完整流程，多个会话并发执行。
+  AppTest 会替换进程级的 Streamlit 运行时，不能在线程中并发，因此每个会话在独立进程中运行
+
+结果中以 _ms 结尾的指标越小越好，以 _per_sec 结尾的越大越好，--compare 按此判断是否退化。
+
+用法:
+    python benchmarks/run_suite.py --output bench.json
+    python benchmarks/run_suite.py --quick --only parser db
+    python benchmarks/run_suite.py --compare baseline.json bench.json --threshold 0.1
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_parser import MODES, make_guide
+from benchmarks.mock_llm_server import start_mock_server
+
+SUITES = ("parser", "db", "e2e")
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """延迟分位数（毫秒）"""
+    if not seconds:
+        return {}
+    values = sorted(seconds)
+
+    def percentile(p: float) -> float:
+        return values[min(int(len(values) * p), len(values) - 1)] * 1000
+
+    return {
+        "p50_ms": round(percentile(0.5), 3),
+        "p95_ms": round(percentile(0.95), 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+def bench_parser(args) -> Dict:
+    from doc_parser import GuideParser
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for sections in args.parser_sections:
+            path = os.path.join(tmp, f"guide-{sections}.qmd")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(make_guide(sections, args.parser_subsections))
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            headings = sections * (args.parser_subsections + 1)
+            modes = {}
+            for mode in MODES:
+                best = float("inf")
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    GuideParser(path, mode=mode)
+                    best = min(best, time.perf_counter() - start)
+                modes[mode] = {
+                    "parse_ms": round(best * 1000, 3),
+                    "mb_per_sec": round(size_mb / best, 2),
+                    "headings_per_sec": round(headings / best),
+                }
+            results[f"sections_{sections}"] = {"size_mb": round(size_mb, 2), "headings": headings, **modes}
+    return results
+
+
+def bench_db(args) -> Dict:
+    from db import Database
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for threads in args.db_threads:
+            db = Database(os.path.join(tmp, f"bench-{threads}.db"), async_writes=True)
+            barrier = threading.Barrier(threads * 2 + 1)
+            read_latencies: List[float] = []
+            errors: List[Exception] = []
+            writing = threading.Event()
+            writing.set()
+
+            def writer(worker_id: int):
+                barrier.wait()
+                try:
+                    for i in range(args.db_writes):
+                        db.save_chat(f"session-{worker_id}", "章节", "小节", "user", f"问题 {i}")
+                except Exception as e:
+                    errors.append(e)
+
+            def reader(worker_id: int):
+                latencies = []
+                barrier.wait()
+                try:
+                    while writing.is_set():
+                        start = time.perf_counter()
+                        db.get_chat_history(f"session-{worker_id}", "章节", "小节")
+                        latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors.append(e)
+                read_latencies.extend(latencies)
+
+            writers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+            readers = [threading.Thread(target=reader, args=(i,)) for i in range(threads)]
+            for t in writers + readers:
+                t.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for t in writers:
+                t.join()
+            db.flush()
+            elapsed = time.perf_counter() - start
+            writing.clear()
+            for t in readers:
+                t.join()
+            db.close()
+
+            results[f"threads_{threads}"] = {
+                "writes_per_sec": round(threads * args.db_writes / elapsed),
+                "reads_per_sec": round(len(read_latencies) / elapsed),
+                "read": latency_summary(read_latencies),
+                "errors": len(errors),
+            }
+    return results
+
+
+def _run_session(index: int, workdir: str, env: Dict[str, str], pages: int,
+                 follow_ups: int, timeout: float) -> Dict:
+    """在独立进程中模拟一个会话，返回各步骤耗时（秒）"""
+    os.environ.update(env)
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    from streamlit.testing.v1 import AppTest
+    from metrics import registry
+
+    steps = {"load": [], "navigate": [], "answer": [], "follow_up": []}
+    errors = 0
+
+    def timed_run(step: str, action):
+        nonlocal errors
+        start = time.perf_counter()
+        result = action()
+        steps[step].append(time.perf_counter() - start)
+        errors += len(result.exception)
+        return result
+
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+    app = timed_run("load", app.run)
+    # 不同会话停在不同页面，避免所有请求完全相同
+    for _ in range(index % pages + 1):
+        app = timed_run("navigate", app.button(key="nav_next").click().run)
+    buttons = [button for button in app.button if button.key and button.key.startswith("button_")]
+    if buttons:
+        app = timed_run("answer", buttons[0].click().run)
+        for _ in range(follow_ups):
+            suggestions = [button for button in app.button
+                           if button.key and button.key.startswith("suggest_")]
+            if not suggestions:
+                break
+            app = timed_run("follow_up", suggestions[0].click().run)
+    errors += sum(
+        1 for message in app.chat_message
+        for markdown in message.markdown if markdown.value.startswith("错误:")
+    )
+
+    ttft = registry.histogram("javahelper_llm_ttft_seconds", (("client", "async"),)).snapshot()
+    return {"steps": steps, "errors": errors, "ttft_sum": ttft[1], "ttft_count": ttft[2]}
+
+
+def _session_worker(task):
+    return _run_session(*task)
+
+
+def bench_e2e(args) -> Dict:
+    server, _ = start_mock_server(
+        "127.0.0.1",
+        first_token_latency=args.first_token_latency,
+        token_interval=args.token_interval,
+        tokens=args.tokens
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copytree(os.path.join(ROOT, args.lecture_dir), os.path.join(workdir, "lecture"))
+        env = {
+            "DEEPSEEK_API_KEY": "benchmark",
+            "DEEPSEEK_BASE_URL": server.base_url,
+            "DB_PATH": os.path.join(workdir, "learning_records.db"),
+            "PRECOMPUTED_ANSWERS_PATH": os.path.join(workdir, "precomputed_answers.db"),
+            "RESPONSE_CACHE_BACKEND": "memory" if args.response_cache else "none",
+            "METRICS_ENABLED": "true",
+            "METRICS_PORT": "0",
+        }
+        tasks = [
+            (index, workdir, env, args.pages, args.follow_ups, args.session_timeout)
+            for index in range(args.sessions)
+        ]
+        context = multiprocessing.get_context("spawn")
+        start = time.perf_counter()
+        with context.Pool(processes=args.concurrency) as pool:
+            sessions = pool.map(_session_worker, tasks)
+        elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    result = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "wall_ms": round(elapsed * 1000, 1),
+        "sessions_per_sec": round(args.sessions / elapsed, 3),
+        "upstream_requests": server.request_count,
+        "errors": sum(session["errors"] for session in sessions),
+    }
+    for step in ("load", "navigate", "answer", "follow_up"):
+        result[step] = latency_summary([t for session in sessions for t in session["steps"][step]])
+    ttft_count = sum(session["ttft_count"] for session in sessions)
+    if ttft_count:
+        result["ttft"] = {"mean_ms": round(sum(session["ttft_sum"] for session in sessions)
+                                           / ttft_count * 1000, 3)}
+    return result
+
+
+def _flatten(data: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)):
+            flat[path] = value
+    return flat
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> int:
+    """比较两次结果，返回退化的指标数"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = _flatten(json.load(f)["results"])
+    with open(current_path, encoding="utf-8") as f:
+        current = _flatten(json.load(f)["results"])
+
+    regressions = 0
+    for key in sorted(baseline.keys() & current.keys()):
+        if key.endswith("_ms"):
+            lower_is_better = True
+        elif key.endswith("_per_sec"):
+            lower_is_better = False
+        else:
+            continue
+        old, new = baseline[key], current[key]
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = change > threshold if lower_is_better else change < -threshold
+        if worse:
+            regressions += 1
+        mark = "退化" if worse else ""
+        print(f"{key:<50}{old:>14.3f}{new:>14.3f}{change * 100:>+9.1f}%  {mark}")
+    print(f"共 {regressions} 项指标退化超过 {threshold * 100:.0f}%")
+    return regressions
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="基准测试套件")
+    arg_parser.add_argument("--output", default="bench_results.json")
+    arg_parser.add_argument("--only", nargs="+", choices=SUITES, default=list(SUITES))
+    arg_parser.add_argument("--quick", action="store_true", help="缩小规模，用于快速检查")
+    arg_parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                            help="比较两次结果，有指标退化时返回非零退出码")
+    arg_parser.add_argument("--threshold", type=float, default=0.1, help="判定退化的相对变化")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--parser-sections", type=int, nargs="+", default=[200, 2000])
+    arg_parser.add_argument("--parser-subsections", type=int, default=5)
+    arg_parser.add_argument("--db-threads", type=int, nargs="+", default=[1, 4, 16])
+    arg_parser.add_argument("--db-writes", type=int, default=500, help="每个线程写入的条数")
+    arg_parser.add_argument("--lecture-dir", default="lecture")
+    arg_parser.add_argument("--sessions", type=int, default=8)
+    arg_parser.add_argument("--concurrency", type=int, default=4)
+    arg_parser.add_argument("--pages", type=int, default=5, help="会话分散到的页面数")
+    arg_parser.add_argument("--follow-ups", type=int, default=1)
+    arg_parser.add_argument("--session-timeout", type=float, default=120)
+    arg_parser.add_argument("--first-token-latency", type=float, default=0.3)
+    arg_parser.add_argument("--token-interval", type=float, default=0.02)
+    arg_parser.add_argument("--tokens", type=int, default=100)
+    arg_parser.add_argument("--response-cache", action="store_true", help="e2e 中启用响应缓存")
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    if args.quick:
+        args.repeat = 1
+        args.parser_sections = [200]
+        args.db_threads = [1, 4]
+        args.db_writes = 100
+        args.sessions = 2
+        args.concurrency = 2
+        args.first_token_latency = 0.05
+        args.token_interval = 0.002
+
+    suites = {"parser": bench_parser, "db": bench_db, "e2e": bench_e2e}
+    results = {}
+    for name in SUITES:
+        if name in args.only:
+            start = time.perf_counter()
+            results[name] = suites[name](args)
+            print(f"{name}: {time.perf_counter() - start:.1f} s")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key != "compare"},
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
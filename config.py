@@ -13,4 +13,85 @@ if not DEEPSEEK_API_KEY:
     try:
         DEEPSEEK_API_KEY = st.secrets["DEEPSEEK_API_KEY"]
     except:
-        pass
\ No newline at end of file
+        pass
+
+# DeepSeek 接口配置
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")  # 可指向本地模拟服务
+DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+DEEPSEEK_TIMEOUT = float(os.getenv("DEEPSEEK_TIMEOUT", "60"))                 # 单个请求的超时（秒）
+DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "10"))  # 建立连接的超时（秒）
+DEEPSEEK_MAX_CONNECTIONS = int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", "20"))    # 连接池最大连接数
+DEEPSEEK_MAX_KEEPALIVE = int(os.getenv("DEEPSEEK_MAX_KEEPALIVE", "10"))        # 保持的空闲长连接数
+DEEPSEEK_MAX_CONCURRENCY = int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "8"))     # 同时进行的请求数上限
+DEEPSEEK_SPECULATIVE_FOLLOW_UPS = os.getenv("DEEPSEEK_SPECULATIVE_FOLLOW_UPS", "true").lower() == "true"  # 回答输出期间提前生成追加提问
+DEEPSEEK_RATE_LIMIT = float(os.getenv("DEEPSEEK_RATE_LIMIT", "10"))             # 进程内每秒最多发出的请求数，0 表示不限
+DEEPSEEK_RATE_BURST = int(os.getenv("DEEPSEEK_RATE_BURST", "20"))               # 令牌桶容量（允许的突发请求数）
+DEEPSEEK_MAX_RETRIES = int(os.getenv("DEEPSEEK_MAX_RETRIES", "3"))              # 限流或连接失败时的重试次数
+DEEPSEEK_RETRY_BACKOFF = float(os.getenv("DEEPSEEK_RETRY_BACKOFF", "0.5"))      # 重试的初始退避时间（秒）
+DEEPSEEK_COALESCE = os.getenv("DEEPSEEK_COALESCE", "true").lower() == "true"    # 合并进行中的相同请求
+
+# 追加提问预取配置
+FOLLOW_UP_PREFETCH_SETS = int(os.getenv("FOLLOW_UP_PREFETCH_SETS", "3"))  # 每个对话预先生成的问题组数
+FOLLOW_UP_WORKERS = int(os.getenv("FOLLOW_UP_WORKERS", "4"))              # 同时生成追加提问的最大请求数
+FOLLOW_UP_TIMEOUT = float(os.getenv("FOLLOW_UP_TIMEOUT", "20"))           # 生成一组问题的超时（秒）
+FOLLOW_UP_WAIT = float(os.getenv("FOLLOW_UP_WAIT", "0.5"))                # 页面渲染时最多等待的时间（秒），超时使用默认问题
+FOLLOW_UP_CACHE_SIZE = int(os.getenv("FOLLOW_UP_CACHE_SIZE", "256"))      # 缓存的对话数
+
+# 对话上下文配置
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "6000"))              # 每次请求的上下文 token 预算
+CONTEXT_LOW_WATERMARK = float(os.getenv("CONTEXT_LOW_WATERMARK", "0.5"))       # 超出预算时折叠到预算的该比例以下
+CONTEXT_SUMMARIZE = os.getenv("CONTEXT_SUMMARIZE", "true").lower() == "true"   # 较早的对话生成摘要，否则直接截断
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "500"))  # 摘要长度上限
+
+# 流式回答渲染配置
+STREAM_RENDER_INTERVAL = float(os.getenv("STREAM_RENDER_INTERVAL", "0.1"))   # 界面刷新的最小间隔（秒）
+STREAM_RENDER_MIN_CHARS = int(os.getenv("STREAM_RENDER_MIN_CHARS", "0"))     # 累计到该字符数时立即刷新，0 表示只按时间
+
+# 全文检索配置
+SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", "8"))  # 侧边栏显示的检索结果数
+
+# 教案片段检索（附加到系统提示词中的参考内容）
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))                # 每次提问附加的片段数，0 表示不检索
+RETRIEVAL_MAX_CHARS = int(os.getenv("RETRIEVAL_MAX_CHARS", "1500"))     # 附加片段的总字数上限
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "600"))  # 切分片段的长度
+
+# 数据库配置
+DB_PATH = os.getenv("DB_PATH", "learning_records.db")            # SQLite 数据库文件
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")            # 日志模式，WAL 允许读写并发
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")           # WAL 模式下 NORMAL 足够安全
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))  # 数据库被锁定时的等待时间
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))               # 连接池保留的空闲连接数
+DB_ASYNC_WRITES = os.getenv("DB_ASYNC_WRITES", "true").lower() == "true"  # 对话记录后台批量写入
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))        # 每批最多写入条数
+DB_WRITE_FLUSH_INTERVAL = float(os.getenv("DB_WRITE_FLUSH_INTERVAL", "0.5"))  # 最长攒批时间（秒）
+DB_WRITE_QUEUE_SIZE = int(os.getenv("DB_WRITE_QUEUE_SIZE", "10000"))      # 写入队列容量
+
+# 多进程部署配置（serve.py 启动多个应用进程时各进程共用的状态）
+SHARED_BACKEND = os.getenv("SHARED_BACKEND", "")          # sqlite:///shared_state.db 或 redis://主机:6379/0，为空时不共享
+CHAT_BACKEND = os.getenv("CHAT_BACKEND", "sqlite")        # 对话记录保存在 sqlite（DB_PATH）或 shared（共享后端，多机部署）
+
+# 会话存储配置
+SESSION_MAX_PAGES = int(os.getenv("SESSION_MAX_PAGES", "8"))          # 每个会话在内存中保留对话历史的页面数
+LEARNING_HISTORY_LIMIT = int(os.getenv("LEARNING_HISTORY_LIMIT", "50"))  # 侧边栏显示的最近问答轮数
+
+# 响应缓存配置
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")   # memory / sqlite / shared / none
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))  # 过期时间（秒）
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))  # 最多缓存条数
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 最大容量
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.db")  # sqlite 后端的文件
+
+# 教案目录监视配置
+LECTURE_WATCH = os.getenv("LECTURE_WATCH", "true").lower() == "true"  # 后台监视教案目录，修改后自动重新加载
+LECTURE_WATCH_BACKEND = os.getenv("LECTURE_WATCH_BACKEND", "auto")     # auto、watchdog 或 poll
+LECTURE_POLL_INTERVAL = float(os.getenv("LECTURE_POLL_INTERVAL", "1.0"))  # 轮询间隔（秒）
+
+# 运行指标配置
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"  # 记录解析、数据库、回答等耗时
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))                 # 不为 0 时在该端口提供 /metrics
+METRICS_FILE = os.getenv("METRICS_FILE", "")                       # 不为空时定期把指标写入该文件
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))  # 写入文件的间隔（秒）
+
+# 预生成回答配置
+PRECOMPUTED_ANSWERS_PATH = os.getenv("PRECOMPUTED_ANSWERS_PATH", "precomputed_answers.db")  # precompute.py 的输出
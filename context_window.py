@@ -0,0 +1,170 @@
+"""对话上下文窗口
+
+按本地估算的 token 数控制每次发送给 API 的对话历史：
+- 历史未超出预算时原样发送
+- 超出预算时把较早的若干轮折叠为摘要，只保留最近的对话；
+  一次折叠到预算的 low_watermark 以下，之后几轮都不需要再折叠
+- 摘要以对话前缀的链式哈希为键缓存，下一次折叠在上一份摘要的基础上
+  只追加新移出的消息，同一段前缀不会被重复发送或重复摘要
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# 每条消息的格式开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PREFIX = "此前对话的摘要：\n"
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """估算文本的 token 数
+
+    按 DeepSeek 文档给出的换算：1 个英文字符约 0.3 个 token，1 个中文字符约 0.6 个 token。
+    中文字符在 UTF-8 中占 3 字节，用字节数与字符数之差估算中文字符个数。
+    """
+    if not text:
+        return 0
+    chars = len(text)
+    wide = (len(text.encode("utf-8")) - chars) // 2
+    return int((chars - wide) * 0.3 + wide * 0.6) + 1
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextPlan:
+    """一次请求的上下文裁剪结果；fold 非空时需要先生成新的摘要"""
+
+    __slots__ = ("summary", "kept", "fold", "key")
+
+    def __init__(self, summary: Optional[str], kept: List[Dict[str, str]],
+                 fold: List[Dict[str, str]], key: Optional[str]):
+        self.summary = summary
+        self.kept = kept
+        self.fold = fold
+        self.key = key
+
+
+class ContextWindow:
+    """按 token 预算裁剪对话历史，并缓存较早对话的摘要"""
+
+    def __init__(self, max_tokens: int = 6000, low_watermark: float = 0.5,
+                 summarize: bool = True, summary_max_tokens: int = 500,
+                 cache_size: int = 1024):
+        self.max_tokens = max_tokens
+        self.low_watermark = low_watermark
+        self.summarize = summarize
+        self.summary_max_tokens = summary_max_tokens
+        self.cache_size = cache_size
+        # 前缀链式哈希 -> 该前缀的摘要（不摘要时为空字符串，只记录裁剪位置）
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prefix_keys(messages: List[Dict[str, str]]) -> List[str]:
+        """keys[k] 唯一标识前 k 条消息"""
+        keys = [""]
+        digest = hashlib.sha1()
+        for message in messages:
+            digest.update(message["role"].encode("utf-8") + b"\0")
+            digest.update(message["content"].encode("utf-8") + b"\0")
+            keys.append(digest.copy().hexdigest())
+        return keys
+
+    def _cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+            return summary
+
+    def _store(self, key: str, summary: str):
+        with self._lock:
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def plan(self, messages: List[Dict[str, str]], system_prompt: str = "") -> ContextPlan:
+        """计算需要发送的消息；最后一条（本轮提问）总是保留"""
+        history, current = messages[:-1], messages[-1:]
+        budget = self.max_tokens - count_tokens(system_prompt) - sum(map(message_tokens, current))
+        costs = [message_tokens(message) for message in history]
+        if sum(costs) <= budget:
+            return ContextPlan(None, list(messages), [], None)
+
+        # 找到已缓存的最长前缀
+        keys = self._prefix_keys(history)
+        cut, summary = 0, None
+        for k in range(len(history), 0, -1):
+            cached = self._cached(keys[k])
+            if cached is not None:
+                cut, summary = k, cached
+                break
+
+        kept_tokens = sum(costs[cut:])
+        summary_tokens = message_tokens({"content": summary}) if summary else 0
+        if summary_tokens + kept_tokens <= budget:
+            return ContextPlan(summary, history[cut:] + current, [], None)
+
+        # 折叠到低水位以下，并且从一轮提问开始保留，不拆开问答
+        target = int(budget * self.low_watermark)
+        new_cut = cut
+        while new_cut < len(history) and (kept_tokens > target or history[new_cut]["role"] != "user"):
+            kept_tokens -= costs[new_cut]
+            new_cut += 1
+        return ContextPlan(summary, history[new_cut:] + current, history[cut:new_cut], keys[new_cut])
+
+    def resolve(self, plan: ContextPlan, summary: Optional[str] = None,
+                system_prompt: str = "") -> List[Dict[str, str]]:
+        """生成最终发送的消息列表
+
+        summary 为折叠后的新摘要；为 None 时（未启用摘要或摘要失败）直接丢弃被折叠的消息。
+        """
+        if plan.fold:
+            if summary is not None:
+                self._store(plan.key, summary)
+                plan.summary = summary
+            elif not self.summarize:
+                # 只记录裁剪位置，保持发送的前缀稳定
+                self._store(plan.key, plan.summary or "")
+
+        messages = list(plan.kept)
+        if plan.summary:
+            messages.insert(0, {"role": "system", "content": SUMMARY_PREFIX + plan.summary})
+
+        # 兜底：单条消息过长时继续从最早的对话开始丢弃
+        budget = self.max_tokens - count_tokens(system_prompt)
+        total = sum(map(message_tokens, messages))
+        start = 1 if plan.summary else 0
+        while total > budget and len(messages) - start > 1:
+            total -= message_tokens(messages.pop(start))
+        return messages
+
+    def fit(self, messages: List[Dict[str, str]], system_prompt: str = "") -> List[Dict[str, str]]:
+        """不生成新摘要的裁剪：使用已缓存的摘要，其余较早的消息直接丢弃"""
+        return self.resolve(self.plan(messages, system_prompt), None, system_prompt)
+
+
+_windows: Dict[Tuple, ContextWindow] = {}
+_windows_lock = threading.Lock()
+
+
+def get_context_window(max_tokens: int = 6000, low_watermark: float = 0.5,
+                       summarize: bool = True, summary_max_tokens: int = 500) -> ContextWindow:
+    """获取进程内共享的上下文窗口，摘要缓存在各会话之间复用"""
+    key = (max_tokens, low_watermark, summarize, summary_max_tokens)
+    with _windows_lock:
+        window = _windows.get(key)
+        if window is None:
+            window = _windows[key] = ContextWindow(
+                max_tokens=max_tokens,
+                low_watermark=low_watermark,
+                summarize=summarize,
+                summary_max_tokens=summary_max_tokens
+            )
+        return window
@@ -1,17 +1,312 @@
+import atexit
+import logging
+import queue
 import sqlite3
-from datetime import datetime
-from typing import List, Dict
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Dict, Iterator, Optional, Sequence, Tuple
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+# (session_id, section, subsection, role, content, timestamp, lecture, page)
+ChatRow = Tuple[str, str, str, str, str, str, Optional[str], Optional[str]]
+
+_INSERT_CHAT_SQL = """
+    INSERT INTO chat_history
+    (session_id, section, subsection, role, content, timestamp, lecture, page)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 数据库结构迁移，按顺序执行；已执行到的版本记录在 PRAGMA user_version 中
+_MIGRATIONS = [
+    # 1: 按页面查询对话历史（session_id + section + subsection，按 id 顺序）
+    """
+    CREATE INDEX IF NOT EXISTS idx_chat_history_page
+    ON chat_history (session_id, section, subsection, id)
+    """,
+    # 2: 按会话查询全部对话历史
+    """
+    CREATE INDEX IF NOT EXISTS idx_chat_history_session
+    ON chat_history (session_id, id)
+    """,
+    # 3-5: 记录所属教案和页面（导航节点标识），按页面恢复对话历史
+    "ALTER TABLE chat_history ADD COLUMN lecture TEXT",
+    "ALTER TABLE chat_history ADD COLUMN page TEXT",
+    """
+    CREATE INDEX IF NOT EXISTS idx_chat_history_lecture_page
+    ON chat_history (session_id, lecture, page, id)
+    """,
+    # 6-7: 会话最后浏览的教案和页面，恢复会话时回到该位置
+    "ALTER TABLE sessions ADD COLUMN lecture TEXT",
+    "ALTER TABLE sessions ADD COLUMN page TEXT",
+]
+
+def _utc_timestamp() -> str:
+    """与 SQLite CURRENT_TIMESTAMP 相同格式的 UTC 时间"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+class _FlushRequest:
+    """插入队列的刷新请求，写线程处理到这里时立即提交并通知等待方"""
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+_STOP = object()
+
+class ChatWriter:
+    """对话记录的后台批量写入器
+
+    save_chat 只把记录放入内存队列，后台线程在攒够 batch_size 条或
+    距上次提交超过 flush_interval 秒时，用 executemany 在一个事务中写入。
+    队列满时调用方最多阻塞 put_timeout 秒（背压），仍然放不进去则同步写入，
+    保证不丢数据；进程退出时自动刷新剩余记录。
+    """
+
+    def __init__(self, database: "Database", batch_size: int = 100,
+                 flush_interval: float = 0.5, max_queue: int = 10000,
+                 put_timeout: float = 5.0, max_retries: int = 3):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._pending = 0
+        # 各会话尚未提交的记录数，读取没有待写入记录的会话时无需等待
+        self._pending_sessions: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        # 放入记录与关闭互斥：关闭后 _STOP 一定是队列中的最后一项
+        self._put_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        """尚未提交到数据库的记录数"""
+        with self._pending_lock:
+            return self._pending
+
+    def pending_for(self, session_id: str) -> int:
+        """会话尚未提交到数据库的记录数"""
+        with self._pending_lock:
+            return self._pending_sessions.get(session_id, 0)
+
+    def alive(self) -> bool:
+        """写线程仍在运行"""
+        return self._thread.is_alive()
+
+    def _track(self, rows: Sequence[ChatRow], delta: int):
+        with self._pending_lock:
+            self._pending += delta * len(rows)
+            for row in rows:
+                count = self._pending_sessions.get(row[0], 0) + delta
+                if count > 0:
+                    self._pending_sessions[row[0]] = count
+                else:
+                    self._pending_sessions.pop(row[0], None)
+
+    def put(self, row: ChatRow):
+        """放入一条记录，队列满时阻塞等待；已关闭时同步写入"""
+        with self._put_lock:
+            if not self._closed:
+                self._track([row], 1)
+                try:
+                    self._queue.put(row, timeout=self.put_timeout)
+                    return
+                except queue.Full:
+                    self._track([row], -1)
+                    logger.warning("对话写入队列已满，改为同步写入")
+        self.database.save_chats([row])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中已有的记录全部提交，返回是否在超时前完成"""
+        if self.pending == 0 or not self.alive():
+            return self.pending == 0
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """刷新剩余记录并停止写线程"""
+        with self._put_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        atexit.unregister(self.close)
+        self._thread.join(timeout)
+
+    def _run(self):
+        batch: List[ChatRow] = []
+        waiters: List[_FlushRequest] = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+                # 正常情况下 _STOP 是最后一项；仍有剩余记录时一并写入
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, _FlushRequest):
+                        waiters.append(item)
+                    elif item is not _STOP:
+                        batch.append(item)
+            elif isinstance(item, _FlushRequest):
+                waiters.append(item)
+            elif item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if batch and (len(batch) >= self.batch_size or due or waiters or stopping):
+                self._write(batch)
+                batch = []
+                deadline = None
+            for waiter in waiters:
+                waiter.done.set()
+            waiters = []
+
+    def _write(self, batch: List[ChatRow]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.database.save_chats(batch)
+                break
+            except sqlite3.Error as e:
+                if attempt == self.max_retries:
+                    logger.error("批量写入对话记录失败，丢弃 %d 条: %s", len(batch), e)
+                    break
+                time.sleep(0.1 * (2 ** attempt))
+        self._track(batch, -1)
 
 class Database:
-    def __init__(self, db_path: str = "learning_records.db"):
+    def __init__(self, db_path: str = "learning_records.db", journal_mode: str = "WAL",
+                 synchronous: str = "NORMAL", busy_timeout_ms: int = 5000,
+                 pool_size: int = 8, async_writes: bool = False,
+                 write_batch_size: int = 100, write_flush_interval: float = 0.5,
+                 write_queue_size: int = 10000):
+        """
+        journal_mode/synchronous/busy_timeout_ms 对应 SQLite 的同名 pragma；
+        pool_size 为连接池中保留的空闲连接数，为 0 时每次操作都新建连接；
+        async_writes 为 True 时 save_chat 交给后台 ChatWriter 批量写入。
+        """
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in _JOURNAL_MODES:
+            raise ValueError(f"不支持的 journal_mode: {journal_mode}")
+        if synchronous not in _SYNCHRONOUS_MODES:
+            raise ValueError(f"不支持的 synchronous: {synchronous}")
+
         self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=max(pool_size, 0))
+        self._pool_enabled = pool_size > 0
+        self._closed = False
+        self._lock = threading.Lock()
         self.init_db()
-    
+        self.writer: Optional[ChatWriter] = None
+        if async_writes:
+            self.writer = ChatWriter(
+                self,
+                batch_size=write_batch_size,
+                flush_interval=write_flush_interval,
+                max_queue=write_queue_size
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建新连接并设置 pragma"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """从连接池借出一个连接，用完后归还；出错时回滚未提交的事务"""
+        conn = None
+        if self._pool_enabled:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                pass
+        if conn is None:
+            conn = self._connect()
+
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._lock:
+            if self._pool_enabled and not self._closed:
+                try:
+                    self._pool.put_nowait(conn)
+                    return
+                except queue.Full:
+                    pass
+        conn.close()
+
+    def flush(self, timeout: Optional[float] = None, session_id: Optional[str] = None) -> bool:
+        """等待后台写入队列中的记录全部提交；指定 session_id 时该会话没有待写入的记录则立即返回"""
+        if self.writer is None:
+            return True
+        if session_id is not None and self.writer.pending_for(session_id) == 0:
+            return True
+        return self.writer.flush(timeout)
+
+    def healthy(self) -> bool:
+        """未关闭，且启用后台写入时写线程仍在运行"""
+        if self._closed:
+            return False
+        return self.writer is None or self.writer.alive()
+
+    def close(self):
+        """刷新待写入的记录并关闭连接池中的所有连接"""
+        if self.writer is not None:
+            self.writer.close()
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
     def init_db(self):
         """初始化数据库表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
-            
+
             # 创建用户会话表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS sessions (
@@ -19,7 +314,7 @@ class Database:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-            
+
             # 创建对话历史表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS chat_history (
@@ -33,47 +328,168 @@ class Database:
                     FOREIGN KEY (session_id) REFERENCES sessions(session_id)
                 )
             """)
-            
+
             conn.commit()
-    
-    def save_chat(self, session_id: str, section: str, subsection: str, 
-                  role: str, content: str):
-        """保存单条对话记录"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO chat_history 
-                (session_id, section, subsection, role, content)
-                VALUES (?, ?, ?, ?, ?)
-            """, (session_id, section, subsection, role, content))
+
+        self.migrate()
+
+    def migrate(self):
+        """执行尚未应用的结构迁移"""
+        with self.connection() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= len(_MIGRATIONS):
+                return
+            # 多个进程可能同时打开新数据库：先取得写锁，再重新读取版本，
+            # 其他进程已执行的步骤不再重复；全部步骤在同一个事务中提交
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, statement in enumerate(_MIGRATIONS[version:], start=version + 1):
+                conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+
+    def ensure_session(self, session_id: str):
+        """登记会话"""
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id) VALUES (?)",
+                (session_id,)
+            )
+            conn.commit()
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        """获取会话信息，会话不存在时返回 None"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT session_id, created_at, lecture, page FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"session_id": row[0], "created_at": row[1], "lecture": row[2], "page": row[3]}
+
+    def update_session_position(self, session_id: str, lecture: str, page: str):
+        """记录会话最后浏览的教案和页面"""
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE sessions SET lecture = ?, page = ? WHERE session_id = ?",
+                (lecture, page, session_id)
+            )
+            conn.commit()
+
+    @timed("javahelper_db_seconds", operation="save_chat")
+    def save_chat(self, session_id: str, section: str, subsection: str,
+                  role: str, content: str, lecture: Optional[str] = None,
+                  page: Optional[str] = None):
+        """保存单条对话记录；启用后台写入时立即返回"""
+        row = (session_id, section, subsection, role, content, _utc_timestamp(), lecture, page)
+        if self.writer is not None:
+            self.writer.put(row)
+        else:
+            self.save_chats([row])
+
+    @timed("javahelper_db_seconds", operation="save_chats")
+    def save_chats(self, rows: Sequence[ChatRow]):
+        """在一个事务中批量保存对话记录"""
+        with self.connection() as conn:
+            conn.executemany(_INSERT_CHAT_SQL, rows)
             conn.commit()
-    
-    def get_chat_history(self, session_id: str, section: str = None, 
-                        subsection: str = None) -> List[Dict]:
+
+    @timed("javahelper_db_seconds", operation="get_chat_history")
+    def get_chat_history(self, session_id: str, section: str = None,
+                        subsection: str = None, lecture: str = None,
+                        page: str = None) -> List[Dict]:
         """获取对话历史"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            query = "SELECT * FROM chat_history WHERE session_id = ?"
-            params = [session_id]
-            
-            if section:
-                query += " AND section = ?"
-                params.append(section)
-            if subsection:
-                query += " AND subsection = ?"
-                params.append(subsection)
-                
-            query += " ORDER BY timestamp"
-            
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            return [
-                {
-                    "role": row[4],
-                    "content": row[5],
-                    "timestamp": row[6]
-                }
-                for row in rows
-            ] 
\ No newline at end of file
+        return list(self.iter_chat_history(session_id, section, subsection,
+                                           lecture=lecture, page=page))
+
+    def get_chat_history_page(self, session_id: str, section: str = None,
+                              subsection: str = None, after_id: int = 0,
+                              limit: int = 50, lecture: str = None,
+                              page: str = None) -> Tuple[List[Dict], Optional[int]]:
+        """按 id 游标分页获取对话历史，返回 (本页记录, 下一页游标)；没有更多记录时游标为 None"""
+        # 该会话还有记录在后台队列中时先提交，保证能读到刚写入的内容；其他会话不等待
+        self.flush(session_id=session_id)
+
+        query = "SELECT id, role, content, timestamp FROM chat_history WHERE session_id = ?"
+        params: list = [session_id]
+
+        if lecture:
+            query += " AND lecture = ?"
+            params.append(lecture)
+        if page:
+            query += " AND page = ?"
+            params.append(page)
+        if section:
+            query += " AND section = ?"
+            params.append(section)
+        if subsection:
+            query += " AND subsection = ?"
+            params.append(subsection)
+
+        query += " AND id > ? ORDER BY id LIMIT ?"
+        params.extend([after_id, limit])
+
+        with self.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        records = [
+            {
+                "id": row[0],
+                "role": row[1],
+                "content": row[2],
+                "timestamp": row[3]
+            }
+            for row in rows
+        ]
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return records, next_cursor
+
+    def iter_chat_history(self, session_id: str, section: str = None,
+                          subsection: str = None, after_id: int = 0,
+                          page_size: int = 500, lecture: str = None,
+                          page: str = None) -> Iterator[Dict]:
+        """逐条产出对话历史，按页读取，不一次性加载全部记录"""
+        cursor: Optional[int] = after_id
+        while cursor is not None:
+            records, cursor = self.get_chat_history_page(
+                session_id, section, subsection, after_id=cursor, limit=page_size,
+                lecture=lecture, page=page
+            )
+            yield from records
+
+    def get_recent_chat(self, session_id: str, limit: int = 50) -> List[Dict]:
+        """获取会话最近的 limit 条对话记录（按时间先后排列）"""
+        self.flush(session_id=session_id)
+        with self.connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, section, subsection, role, content, timestamp
+                FROM chat_history WHERE session_id = ?
+                ORDER BY id DESC LIMIT ?
+                """,
+                (session_id, limit)
+            ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "section": row[1],
+                "subsection": row[2],
+                "role": row[3],
+                "content": row[4],
+                "timestamp": row[5]
+            }
+            for row in reversed(rows)
+        ]
+
+
+_databases: Dict[tuple, Database] = {}
+_databases_lock = threading.Lock()
+
+def get_database(db_path: str = "learning_records.db", **options) -> Database:
+    """获取进程内共享的 Database 实例，使连接池在多次脚本重跑之间得以复用"""
+    key = (db_path, tuple(sorted(options.items())))
+    with _databases_lock:
+        database = _databases.get(key)
+        if database is None or database._closed:
+            database = _databases[key] = Database(db_path, **options)
+        return database
\ No newline at end of file
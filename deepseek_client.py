@@ -1,47 +1,53 @@
-import os
-from openai import OpenAI
-from typing import Generator, List, Dict
+import asyncio
+import atexit
+import logging
+import threading
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from concurrent.futures import Future
+from typing import AsyncGenerator, Awaitable, Dict, Generator, Iterator, List, Optional
+from response_cache import ResponseCache
+from context_window import ContextPlan, ContextWindow
+from upstream import Upstream
+import metrics
 
-class DeepSeekClient:
-    def __init__(self, api_key: str):
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.deepseek.com"
-        )
+DEFAULT_BASE_URL = "https://api.deepseek.com"
 
-    def get_streaming_response(
-        self, 
-        messages: List[Dict[str, str]], 
-        current_topic: str = None,
-        system_prompt: str = None
-    ) -> Generator:
-        """获取DeepSeek API的流式响应"""
-        # 如果没有提供系统提示词，根据当前主题生成
-        if not system_prompt:
-            system_prompt = self._generate_system_prompt(current_topic)
-            
-        messages = [{"role": "system", "content": system_prompt}] + messages
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
-                stream=True
-            )
-            
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
-                    
-        except Exception as e:
-            yield f"错误: {str(e)}"
-    
-    def _generate_system_prompt(self, current_topic: str) -> str:
-        """根据当前主题生成系统提示词"""
+logger = logging.getLogger(__name__)
+
+# 追加提问生成失败或数量不足时使用的默认问题
+DEFAULT_FOLLOW_UP_QUESTIONS = [
+    "这个概念还有哪些深入的内容需要了解？",
+    "能结合实际项目详细说明一下吗？",
+    "有什么常见的问题需要注意？"
+]
+
+# 同一对话生成多组追加提问时，各组依次使用的侧重点
+FOLLOW_UP_FOCUSES = [
+    "",
+    "侧重实际项目中的应用和实践",
+    "侧重底层原理和常见错误",
+]
+
+
+class _PromptMixin:
+    """同步和异步客户端共用的提示词构建与结果解析"""
+
+    context: Optional[ContextWindow] = None
+
+    def _generate_system_prompt(self, current_topic: str, references: Optional[List[str]] = None) -> str:
+        """根据当前主题生成系统提示词；references 为检索到的教案片段，附加在末尾"""
+        system_prompt = self._topic_prompt(current_topic)
+        if references:
+            system_prompt += "\n\n以下是教案中与问题相关的内容，回答时优先参考：\n\n" + "\n\n".join(references)
+        return system_prompt
+
+    @staticmethod
+    def _topic_prompt(current_topic: str) -> str:
         if not current_topic:
             return """你是一个专业的教育辅导助手，擅长解答学习过程中的各类问题。
 请用清晰、专业的中文回答用户的问题。如果涉及代码或专业概念，请提供详细的解释和示例。"""
-            
+
         return f"""你是一个专业的教育辅导助手，专注于{current_topic}相关内容的指导。
 你将帮助学生理解和掌握这个主题的各个方面。
 
@@ -57,13 +63,15 @@ class DeepSeekClient:
 2. 掌握相关的实践技能
 3. 培养独立解决问题的能力
 4. 建立系统性的知识体系"""
-            
-    def generate_follow_up_questions(
+
+    def _follow_up_messages(
         self,
         chat_history: List[Dict[str, str]],
-        current_topic: str
-    ) -> List[str]:
-        """根据对话历史和当前主题生成相关的追加提问"""
+        current_topic: str,
+        variant: int = 0,
+        exclude: Optional[List[str]] = None
+    ) -> List[Dict[str, str]]:
+        """构建生成追加提问的请求消息；variant 选择问题的侧重点，exclude 为需要避开的已有问题"""
         system_prompt = f"""你是一个专注于{current_topic}的教育辅导专家。
 请根据学生的学习对话历史和当前主题，生成3个最相关的追加提问。
 这些问题应该：
@@ -72,57 +80,430 @@ class DeepSeekClient:
 3. 引导学生思考实际应用
 4. 关注重要的细节和原理
 请直接返回3个问题，每行一个，不要添加序号、空行或其他标记。"""
-        
+
         # 构建提示信息
         prompt = f"""
 当前主题：{current_topic}
 
 对话历史：
-{self._format_chat_history(chat_history)}
+{self._format_chat_history(self._follow_up_history(chat_history))}
 
 请生成3个相关的追加提问，帮助学生更深入地理解这个主题。每个问题必须是完整的句子。
 """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=False
-            )
-            
-            # 分割响应获取问题列表并过滤空行
-            questions = [
-                q.strip() for q in response.choices[0].message.content.strip().split('\n')
-                if q.strip()  # 只保留非空的问题
-            ]
-            
-            # 如果获取的问题少于3个，补充默认问题
-            default_questions = [
-                "这个概念还有哪些深入的内容需要了解？",
-                "能结合实际项目详细说明一下吗？",
-                "有什么常见的问题需要注意？"
-            ]
-            
-            while len(questions) < 3:
-                questions.append(default_questions[len(questions)])
-            
-            # 确保只返回3个问题
-            return questions[:3]
-            
-        except Exception as e:
-            return [
-                "这个概念还有哪些深入的内容需要了解？",
-                "能结合实际项目详细说明一下吗？",
-                "有什么常见的问题需要注意？"
-            ]
-    
+        focus = FOLLOW_UP_FOCUSES[variant % len(FOLLOW_UP_FOCUSES)]
+        if focus:
+            prompt += f"这组问题请{focus}。\n"
+        if exclude:
+            prompt += "不要与以下已经提出的问题重复：\n" + "\n".join(exclude) + "\n"
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _summary_messages(self, plan: ContextPlan) -> List[Dict[str, str]]:
+        """构建把较早对话折叠为摘要的请求消息"""
+        limit = self.context.summary_max_tokens
+        previous = f"已有摘要：\n{plan.summary}\n\n" if plan.summary else ""
+        return [
+            {"role": "system", "content": f"""你负责压缩学生与辅导助手的学习对话。
+请在已有摘要的基础上合并新的对话，输出一份简洁的中文摘要。
+保留学生提出的问题、得到的关键结论、重要的代码要点和尚未解决的疑问，
+不要添加对话中没有的内容，长度不超过{limit}个字。"""},
+            {"role": "user", "content": f"{previous}新的对话：\n{self._format_chat_history(plan.fold)}"}
+        ]
+
+    def _follow_up_history(self, chat_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """生成追加提问时只使用已缓存的摘要，不触发新的摘要请求"""
+        if self.context is None or not chat_history:
+            return chat_history
+        return self.context.fit(chat_history)
+
+    @staticmethod
+    def _parse_follow_up_questions(content: str) -> List[str]:
+        """分割响应获取问题列表，不足3个时补充默认问题"""
+        questions = [
+            q.strip() for q in content.strip().split('\n')
+            if q.strip()  # 只保留非空的问题
+        ]
+
+        while len(questions) < 3:
+            questions.append(DEFAULT_FOLLOW_UP_QUESTIONS[len(questions)])
+
+        # 确保只返回3个问题
+        return questions[:3]
+
     def _format_chat_history(self, chat_history: List[Dict[str, str]]) -> str:
         """格式化对话历史"""
         formatted = []
+        roles = {"user": "学生", "system": "摘要"}
         for msg in chat_history:
-            role = "学生" if msg["role"] == "user" else "助手"
+            role = roles.get(msg["role"], "助手")
             formatted.append(f"{role}：{msg['content']}")
-        return "\n".join(formatted)
\ No newline at end of file
+        return "\n".join(formatted)
+
+
+class DeepSeekClient(_PromptMixin):
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None,
+                 model: str = "deepseek-chat", base_url: str = DEFAULT_BASE_URL,
+                 context: Optional[ContextWindow] = None):
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url
+        )
+        self.cache = cache
+        self.model = model
+        self.context = context
+
+    def _fit_context(self, messages: List[Dict[str, str]], system_prompt: str) -> List[Dict[str, str]]:
+        """按 token 预算裁剪对话历史，必要时先把较早的对话折叠为摘要"""
+        if self.context is None:
+            return messages
+        plan = self.context.plan(messages, system_prompt)
+        summary = None
+        if plan.fold and self.context.summarize:
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self._summary_messages(plan),
+                    max_tokens=self.context.summary_max_tokens,
+                    stream=False
+                )
+                summary = response.choices[0].message.content.strip()
+            except Exception:
+                # 摘要失败时退化为直接截断
+                summary = None
+        return self.context.resolve(plan, summary, system_prompt)
+
+    def get_streaming_response(
+        self,
+        messages: List[Dict[str, str]],
+        current_topic: str = None,
+        system_prompt: str = None,
+        references: Optional[List[str]] = None
+    ) -> Generator:
+        """获取DeepSeek API的流式响应（命中缓存时直接回放缓存内容）"""
+        # 如果没有提供系统提示词，根据当前主题生成
+        if not system_prompt:
+            system_prompt = self._generate_system_prompt(current_topic, references)
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(messages, self.model, system_prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield from self.cache.replay(cached)
+                return
+
+        stream_timer = metrics.stream_timer(client="sync")
+        try:
+            messages = [{"role": "system", "content": system_prompt}] + self._fit_context(messages, system_prompt)
+
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True
+            )
+
+            chunks = []
+            for chunk in response:
+                if chunk.choices[0].delta.content is not None:
+                    stream_timer.chunk()
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+            stream_timer.done()
+
+            # 只缓存完整结束的回答
+            if cache_key is not None and chunks:
+                self.cache.set(cache_key, "".join(chunks))
+
+        except Exception as e:
+            metrics.inc("javahelper_llm_stream_errors_total", client="sync")
+            yield f"错误: {str(e)}"
+
+    def get_response(
+        self,
+        messages: List[Dict[str, str]],
+        current_topic: str = None,
+        system_prompt: str = None,
+        references: Optional[List[str]] = None
+    ) -> str:
+        """获取完整的（非流式）回答；与流式接口不同，出错时直接抛出异常"""
+        if not system_prompt:
+            system_prompt = self._generate_system_prompt(current_topic, references)
+
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": system_prompt}] + self._fit_context(messages, system_prompt),
+            stream=False
+        )
+        return response.choices[0].message.content
+
+    def generate_follow_up_questions(
+        self,
+        chat_history: List[Dict[str, str]],
+        current_topic: str
+    ) -> List[str]:
+        """根据对话历史和当前主题生成相关的追加提问"""
+        try:
+            with metrics.timer("javahelper_follow_up_seconds", client="sync"):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self._follow_up_messages(chat_history, current_topic),
+                    stream=False
+                )
+            return self._parse_follow_up_questions(response.choices[0].message.content)
+
+        except Exception:
+            metrics.inc("javahelper_follow_up_failures_total", client="sync")
+            logger.warning("生成追加提问失败，使用默认问题", exc_info=True)
+            return list(DEFAULT_FOLLOW_UP_QUESTIONS)
+
+
+class AsyncDeepSeekClient(_PromptMixin):
+    """异步客户端
+
+    所有请求共用一个保持长连接的 HTTP 连接池，可以在流式输出回答的同时生成追加提问。
+    请求经过进程内共享的 Upstream：令牌桶限流、并发上限、失败重试，
+    以及相同请求的合并（多个会话同时提出相同的问题时只向上游发送一次）。
+    """
+
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None,
+                 model: str = "deepseek-chat", base_url: str = DEFAULT_BASE_URL,
+                 timeout: float = 60.0, connect_timeout: float = 10.0,
+                 max_connections: int = 20, max_keepalive: int = 10,
+                 max_concurrency: int = 8, context: Optional[ContextWindow] = None,
+                 rate_limit: float = 0, rate_burst: int = 10, max_retries: int = 3,
+                 retry_backoff: float = 0.5, coalesce: bool = True):
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout)
+        )
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            # 重试由 Upstream 统一处理
+            max_retries=0
+        )
+        self.cache = cache
+        self.model = model
+        self.context = context
+        self.upstream = Upstream(
+            rate=rate_limit,
+            burst=rate_burst,
+            max_concurrency=max_concurrency,
+            max_retries=max_retries,
+            backoff=retry_backoff,
+            coalesce=coalesce
+        )
+
+    async def _complete(self, key: Optional[str], messages: List[Dict[str, str]], **options) -> str:
+        """发送一个非流式请求，返回回答文本"""
+        async def request():
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=False,
+                **options
+            )
+            return response.choices[0].message.content
+
+        return await self.upstream.call(key, request)
+
+    async def _fit_context(self, messages: List[Dict[str, str]], system_prompt: str) -> List[Dict[str, str]]:
+        """按 token 预算裁剪对话历史，必要时先把较早的对话折叠为摘要"""
+        if self.context is None:
+            return messages
+        plan = self.context.plan(messages, system_prompt)
+        summary = None
+        if plan.fold and self.context.summarize:
+            try:
+                summary = (await self._complete(
+                    f"summary:{plan.key}",
+                    self._summary_messages(plan),
+                    max_tokens=self.context.summary_max_tokens
+                )).strip()
+            except Exception:
+                summary = None
+        return self.context.resolve(plan, summary, system_prompt)
+
+    async def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        current_topic: str = None,
+        system_prompt: str = None,
+        references: Optional[List[str]] = None
+    ) -> AsyncGenerator[str, None]:
+        """异步流式响应，用法和错误处理与 DeepSeekClient.get_streaming_response 相同"""
+        if not system_prompt:
+            system_prompt = self._generate_system_prompt(current_topic, references)
+
+        request_key = ResponseCache.make_key(messages, self.model, system_prompt)
+        on_complete = None
+        if self.cache is not None:
+            cached = self.cache.get(request_key)
+            if cached is not None:
+                for piece in self.cache.replay(cached):
+                    yield piece
+                return
+            # 只缓存完整结束的回答
+            on_complete = lambda text: self.cache.set(request_key, text)
+
+        stream_timer = metrics.stream_timer(client="async")
+        try:
+            request_messages = [{"role": "system", "content": system_prompt}] + \
+                await self._fit_context(messages, system_prompt)
+
+            async def open_stream():
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=request_messages,
+                    stream=True
+                )
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
+                        yield chunk.choices[0].delta.content
+
+            async for chunk in self.upstream.stream(request_key, open_stream, on_complete):
+                stream_timer.chunk()
+                yield chunk
+            stream_timer.done()
+
+        except Exception as e:
+            metrics.inc("javahelper_llm_stream_errors_total", client="async")
+            yield f"错误: {str(e)}"
+
+    async def get_response(
+        self,
+        messages: List[Dict[str, str]],
+        current_topic: str = None,
+        system_prompt: str = None,
+        references: Optional[List[str]] = None
+    ) -> str:
+        """获取完整的（非流式）回答，出错时直接抛出异常"""
+        if not system_prompt:
+            system_prompt = self._generate_system_prompt(current_topic, references)
+
+        request_messages = [{"role": "system", "content": system_prompt}] + \
+            await self._fit_context(messages, system_prompt)
+        return await self._complete(
+            "response:" + ResponseCache.make_key(messages, self.model, system_prompt),
+            request_messages
+        )
+
+    async def fetch_follow_up_questions(
+        self,
+        chat_history: List[Dict[str, str]],
+        current_topic: str,
+        variant: int = 0,
+        exclude: Optional[List[str]] = None
+    ) -> List[str]:
+        """生成追加提问，出错时直接抛出异常"""
+        messages = self._follow_up_messages(chat_history, current_topic, variant, exclude)
+        with metrics.timer("javahelper_follow_up_seconds", client="async"):
+            content = await self._complete(
+                "follow_up:" + ResponseCache.make_key(messages, self.model, ""),
+                messages
+            )
+        return self._parse_follow_up_questions(content)
+
+    async def generate_follow_up_questions(
+        self,
+        chat_history: List[Dict[str, str]],
+        current_topic: str
+    ) -> List[str]:
+        """根据对话历史和当前主题生成相关的追加提问，失败时返回默认问题"""
+        try:
+            return await self.fetch_follow_up_questions(chat_history, current_topic)
+        except Exception:
+            metrics.inc("javahelper_follow_up_failures_total", client="async")
+            logger.warning("生成追加提问失败，使用默认问题", exc_info=True)
+            return list(DEFAULT_FOLLOW_UP_QUESTIONS)
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+
+class AsyncRunner:
+    """在后台线程中运行一个事件循环，供同步代码（Streamlit 脚本）调用异步客户端"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True,
+                                        name="deepseek-async-loop")
+        self._thread.start()
+
+    def submit(self, coro: Awaitable) -> Future:
+        """在后台事件循环中开始执行协程，立即返回 Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable):
+        """执行协程并等待结果"""
+        return self.submit(coro).result()
+
+    def iterate(self, agen: AsyncGenerator) -> Iterator:
+        """把异步生成器转换为同步迭代器；提前结束迭代时关闭异步生成器"""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+    def alive(self) -> bool:
+        """后台线程和事件循环是否仍在运行"""
+        return self._thread.is_alive() and self.loop.is_running()
+
+    def close(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+
+
+_runner: Optional[AsyncRunner] = None
+_async_clients: Dict[tuple, AsyncDeepSeekClient] = {}
+_async_lock = threading.Lock()
+
+
+def get_async_runner() -> AsyncRunner:
+    """获取进程内共享的后台事件循环"""
+    global _runner
+    with _async_lock:
+        if _runner is None:
+            _runner = AsyncRunner()
+            atexit.register(close_async)
+        return _runner
+
+
+def get_async_client(api_key: str, cache: Optional[ResponseCache] = None,
+                     **options) -> AsyncDeepSeekClient:
+    """获取进程内共享的异步客户端，连接池在各会话和重跑之间复用"""
+    key = (api_key, id(cache), tuple(sorted(options.items())))
+    with _async_lock:
+        client = _async_clients.get(key)
+        if client is None or client.http_client.is_closed:
+            client = _async_clients[key] = AsyncDeepSeekClient(api_key, cache=cache, **options)
+        return client
+
+
+def close_async():
+    """关闭所有异步客户端并停止事件循环（进程退出时自动调用，可重复调用）"""
+    global _runner
+    with _async_lock:
+        runner, _runner = _runner, None
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    if runner is None:
+        return
+    if runner.alive():
+        for client in clients:
+            try:
+                runner.submit(client.aclose()).result(timeout=5)
+            except Exception:
+                pass
+    runner.close()
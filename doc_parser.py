@@ -1,30 +1,323 @@
+import hashlib
+import io
+from array import array
+import mmap
 import re
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from types import MappingProxyType
 import os
+from metrics import timed
+
+PROMPT_MARKER = "**AI提示词：**"
+CODE_FENCE = "```"
+TOC_HEADING = "## 目录"
+
+_PROMPT_MARKER_BYTES = PROMPT_MARKER.encode('utf-8')
+_CODE_FENCE_BYTES = CODE_FENCE.encode('utf-8')
+_TOC_HEADING_BYTES = TOC_HEADING.encode('utf-8')
+
+class LectureSource:
+    """教案源文件的只读视图
+
+    默认保存文件内容的副本，同一教案的所有节点共享一个实例；节点的字节偏移
+    统一保存在 spans 数组中，正文在需要渲染时才从这里解码。
+    """
+    
+    # 每个节点在 spans 中占用的槽位：
+    # 正文片段、需要 strip 的正文片段、提示词片段（起始为 -1 表示不存在）
+    SPAN_FIELDS = 6
+    
+    def __init__(self, data, file=None):
+        self.data = data    # mmap 或 bytes
+        self._file = file   # 内存映射对应的文件，用于检测文件被原地截断
+        self.spans = array('q')
+        self._digest: Optional[str] = None
+    
+    @classmethod
+    def open(cls, file_path: str, use_mmap: bool = False) -> 'LectureSource':
+        """打开教案文件，默认把内容读入内存
+
+        解析树会在文件被修改后继续使用（搜索索引、检索器、预渲染线程），
+        内存映射在文件被原地重写后会解码出错位的内容，被截断时访问还会使进程
+        收到 SIGBUS 而崩溃。只有确定文件不会被修改时才传 use_mmap=True。
+        """
+        if not use_mmap:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            if data.find(b'\r') != -1:
+                data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+            return cls(data)
+        f = open(file_path, 'rb')
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                f.close()
+                return cls(b'')
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            f.close()
+            raise
+        
+        if data.find(b'\r') != -1:
+            # 统一换行符，与文本模式读取文件的结果保持一致
+            normalized = data[:].replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+            data.close()
+            f.close()
+            return cls(normalized)
+        return cls(data, f)
+    
+    @classmethod
+    def from_text(cls, content: str) -> 'LectureSource':
+        """使用已读取的文本创建（不使用内存映射）"""
+        return cls(content.encode('utf-8'))
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    def text(self, start: int, end: int, strip: bool = False) -> str:
+        """解码指定字节范围的文本"""
+        if start >= end:
+            return ''
+        if self._file is not None and os.fstat(self._file.fileno()).st_size < end:
+            raise RuntimeError("教案文件已被修改，请重新加载")
+        value = self.data[start:end].decode('utf-8')
+        return value.strip() if strip else value
+    
+    def digest(self) -> str:
+        """内容哈希（只计算一次）"""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+    
+    def add_span(self, head: Tuple[int, int], tail: Tuple[int, int],
+                 prompt: Tuple[int, int] = (-1, -1)) -> int:
+        """登记一个节点的字节偏移，返回其编号"""
+        index = len(self.spans) // self.SPAN_FIELDS
+        self.spans.extend((head[0], head[1], tail[0], tail[1], prompt[0], prompt[1]))
+        return index
+    
+    def node_content(self, index: int) -> str:
+        base = index * self.SPAN_FIELDS
+        spans = self.spans
+        return (self.text(spans[base], spans[base + 1])
+                + self.text(spans[base + 2], spans[base + 3], strip=True))
+    
+    def node_prompt(self, index: int) -> Optional[str]:
+        base = index * self.SPAN_FIELDS + 4
+        if self.spans[base] < 0:
+            return None
+        return self.text(self.spans[base], self.spans[base + 1], strip=True)
 
-@dataclass
 class ContentNode:
-    title: str
-    content: str
-    prompt: Optional[str] = None
-    children: List['ContentNode'] = None
+    """教案节点
+
+    使用 __slots__ 保持节点紧凑。由 LectureSource 解析得到的节点只保存
+    标题和字节偏移编号，content/prompt 在访问时才解码，且不可修改；
+    直接传入文本的节点（如 parse_document 的结果）则按原样保存字符串。
+    """
+    __slots__ = ('title', 'children', 'start_line', 'end_line',
+                 'source', 'span_index', '_content', '_prompt')
+    
+    def __init__(self, title: str, content: str = '', prompt: Optional[str] = None,
+                 children: Optional[List['ContentNode']] = None,
+                 start_line: int = 0, end_line: int = 0):
+        self.title = title
+        self.children = children if children is not None else []
+        self.start_line = start_line  # 节点标题所在行（从0开始）
+        self.end_line = end_line      # 节点内容结束行（不包含）
+        self.source: Optional[LectureSource] = None
+        self.span_index = -1
+        self._content = content
+        self._prompt = prompt
+    
+    @property
+    def content(self) -> str:
+        if self.source is None:
+            return self._content
+        return self.source.node_content(self.span_index)
     
-    def __post_init__(self):
-        if self.children is None:
-            self.children = []
+    @content.setter
+    def content(self, value: str):
+        if self.source is not None:
+            raise AttributeError("按需解码的节点内容不可修改")
+        self._content = value
+    
+    @property
+    def prompt(self) -> Optional[str]:
+        if self.source is None:
+            return self._prompt
+        return self.source.node_prompt(self.span_index)
+    
+    @prompt.setter
+    def prompt(self, value: Optional[str]):
+        if self.source is not None:
+            raise AttributeError("按需解码的节点内容不可修改")
+        self._prompt = value
+    
+    def __repr__(self) -> str:
+        return f"ContentNode(title={self.title!r}, children={len(self.children)})"
+
+class NavEntry:
+    """导航索引中的一个节点（章节或小节）"""
+    __slots__ = ('node_id', 'section', 'title', 'node', 'children', 'prev_id', 'next_id')
+    
+    def __init__(self, node_id: str, section: str, title: str, node: ContentNode):
+        self.node_id = node_id
+        self.section = section          # 所属章节标题
+        self.title = title
+        self.node = node
+        self.children: Tuple[str, ...] = ()  # 小节的 node_id（按文档顺序）
+        self.prev_id: Optional[str] = None   # 阅读顺序中的上一页
+        self.next_id: Optional[str] = None   # 阅读顺序中的下一页
+    
+    @property
+    def is_section(self) -> bool:
+        return self.node_id == self.section
+    
+    def __repr__(self) -> str:
+        return f"NavEntry(node_id={self.node_id!r})"
+
+
+def node_id(section: str, subsection: Optional[str] = None, occurrence: int = 1) -> str:
+    """节点的稳定标识：章节为标题本身，小节为 "章节/小节"，
+    同一章节下重名的小节从第二个起追加 "#序号"
+    """
+    if subsection is None:
+        return section
+    key = f"{section}/{subsection}"
+    return key if occurrence == 1 else f"{key}#{occurrence}"
+
+
+class NavigationIndex:
+    """教案的导航索引，解析完成后一次性构建，之后的查找都是 O(1)
+
+    - 每个节点有稳定的 node_id，重名小节也能区分
+    - 按 (章节, 小节) 或 node_id 直接查找
+    - 预先计算的章节标题、小节 node_id 列表
+    - 阅读顺序（有小节的章节按小节，没有小节的章节自身为一页）中的上一页/下一页
+    """
+    
+    def __init__(self, root: Dict[str, ContentNode]):
+        self.entries: Dict[str, NavEntry] = {}
+        self._by_title: Dict[Tuple[str, Optional[str]], str] = {}
+        pages = []
+        for section in root.values():
+            entry = NavEntry(node_id(section.title), section.title, section.title, section)
+            self._add(entry, (section.title, None))
+            occurrences: Dict[str, int] = {}
+            children = []
+            for child in section.children:
+                occurrences[child.title] = occurrences.get(child.title, 0) + 1
+                child_entry = NavEntry(
+                    node_id(section.title, child.title, occurrences[child.title]),
+                    section.title, child.title, child
+                )
+                # 重名小节按标题查找时返回第一个
+                self._add(child_entry, (section.title, child.title))
+                children.append(child_entry.node_id)
+            entry.children = tuple(children)
+            pages.extend(children or [entry.node_id])
+        self.section_titles: Tuple[str, ...] = tuple(root.keys())
+        self.pages: Tuple[str, ...] = tuple(pages)
+        
+        for previous, current in zip(pages, pages[1:]):
+            self.entries[previous].next_id = current
+            self.entries[current].prev_id = previous
+    
+    def _add(self, entry: NavEntry, title_key: Tuple[str, Optional[str]]):
+        self.entries[entry.node_id] = entry
+        self._by_title.setdefault(title_key, entry.node_id)
+    
+    def __getitem__(self, key: str) -> NavEntry:
+        return self.entries[key]
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+    
+    def get(self, key: str) -> Optional[NavEntry]:
+        return self.entries.get(key)
+    
+    def lookup(self, section: str, subsection: Optional[str] = None) -> Optional[NavEntry]:
+        """按标题查找节点"""
+        key = self._by_title.get((section, subsection))
+        return self.entries[key] if key is not None else None
+    
+    def children(self, section: str) -> Tuple[str, ...]:
+        """章节下各小节的 node_id"""
+        entry = self.entries.get(section)
+        return entry.children if entry is not None else ()
+
 
 class GuideParser:
-    def __init__(self, file_path: str):
-        if not os.path.exists(file_path):
+    def __init__(self, file_path: str, content: Optional[str] = None, mode: str = "lazy"):
+        """解析教案文件
+
+        content 不为空时直接使用已读取的文本，避免重复读盘。mode 可选：
+        - lazy: 基于内存映射按标题跳转解析，节点正文按需解码（默认）
+        - streaming: 单遍逐行解析
+        - legacy: 原有的整篇解析
+        """
+        if content is None and not os.path.exists(file_path):
             raise FileNotFoundError(f"找不到文件: {file_path}")
             
+        self.file_path = file_path
+        self.content = content
+        self.source: Optional[LectureSource] = None
+        try:
+            if mode == "lazy":
+                if content is None:
+                    self.source = LectureSource.open(file_path)
+                else:
+                    self.source = LectureSource.from_text(content)
+                self.root = self.parse_source(self.source)
+            elif mode == "streaming":
+                if content is None:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        self.root = self.parse_lines(f)
+                else:
+                    self.root = self.parse_lines(io.StringIO(content))
+            else:
+                if content is None:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        self.content = f.read()
+                self.root = self.parse_document()
+        except Exception as e:
+            raise Exception(f"解析文档时出错: {str(e)}")
+    
+    @classmethod
+    def from_source(cls, file_path: str, source: LectureSource,
+                    root: Optional[Dict[str, ContentNode]] = None) -> 'GuideParser':
+        """使用已打开的 LectureSource 创建，避免重复打开文件
+
+        root 不为空时直接使用已有的解析树（如从预编译索引恢复），不再解析。
+        """
+        parser = cls.__new__(cls)
+        parser.file_path = file_path
+        parser.content = None
+        parser.source = source
+        if root is not None:
+            parser.root = root
+            return parser
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                self.content = f.read()
-            self.root = self.parse_document()
+            parser.root = parser.parse_source(source)
         except Exception as e:
             raise Exception(f"解析文档时出错: {str(e)}")
+        return parser
+    
+    def freeze(self) -> 'GuideParser':
+        """冻结解析结果，使其可以在多个会话之间安全共享，并构建导航索引"""
+        for section in self.root.values():
+            section.children = tuple(section.children)
+        self.root = MappingProxyType(dict(self.root))
+        self._navigation = NavigationIndex(self.root)
+        return self
+    
+    @property
+    def navigation(self) -> NavigationIndex:
+        """导航索引；冻结时构建，未冻结的解析结果在首次访问时构建（之后修改树不会更新）"""
+        navigation = getattr(self, '_navigation', None)
+        if navigation is None:
+            navigation = self._navigation = NavigationIndex(self.root)
+        return navigation
     
     def extract_prompt(self, content: str) -> tuple[str, str]:
         """提取AI提示词，返回(提示词, 剩余内容)"""
@@ -49,6 +342,7 @@ class GuideParser:
         
         return prompt, remaining_content
     
+    @timed("javahelper_lecture_parse_seconds", mode="legacy")
     def parse_document(self) -> Dict[str, ContentNode]:
         """解析文档结构"""
         sections = {}
@@ -62,7 +356,7 @@ class GuideParser:
         
         for line in lines:
             # 跳过目录部分
-            if line.startswith('## 目录'):
+            if line.startswith(TOC_HEADING):
                 skip_content = True
                 continue
             elif skip_content and line.startswith('## '):
@@ -129,4 +423,232 @@ class GuideParser:
                     main_content.append(line)
                 section.content = '\n'.join(main_content).strip()
                 
-        return sections
\ No newline at end of file
+        return sections
+    
+    def split_prompt(self, content: str) -> Tuple[Optional[str], str]:
+        """提取AI提示词，结果与 extract_prompt 相同，但只按位置查找，不拆分整段文本"""
+        marker = content.find(PROMPT_MARKER)
+        if marker == -1:
+            return None, content
+        
+        # 提示词部分截止到下一个提示词标记（与 split 的行为一致）
+        part_start = marker + len(PROMPT_MARKER)
+        part_end = content.find(PROMPT_MARKER, part_start)
+        if part_end == -1:
+            part_end = len(content)
+        
+        prompt_start = content.find(CODE_FENCE, part_start, part_end)
+        if prompt_start == -1:
+            return None, content
+        prompt_end = content.find(CODE_FENCE, prompt_start + len(CODE_FENCE), part_end)
+        if prompt_end == -1:
+            return None, content
+        
+        prompt = content[prompt_start + len(CODE_FENCE):prompt_end].strip()
+        remaining_content = content[:marker] + content[prompt_end + len(CODE_FENCE):part_end].strip()
+        return prompt, remaining_content
+    
+    def _close_node(self, section: Optional[ContentNode], subsection: Optional[ContentNode],
+                    buffer: List[str], end_line: int, trim_newline: bool, has_children: bool):
+        """保存当前节点的内容（每个节点只拼接一次字符串）"""
+        if not buffer:
+            return
+        node = subsection or section
+        if not node:
+            return
+        
+        content = ''.join(buffer)
+        # 节点在下一个标题或目录前结束时，最后一行的换行符不属于内容
+        if trim_newline and content.endswith('\n'):
+            content = content[:-1]
+        
+        if subsection:
+            subsection.prompt, subsection.content = self.split_prompt(content)
+        else:
+            # 有子节点的主章节只保留子标题之前的内容
+            section.content = content.strip() if has_children else content
+        node.end_line = end_line
+    
+    @timed("javahelper_lecture_parse_seconds", mode="streaming")
+    def parse_lines(self, lines: Iterable[str]) -> Dict[str, ContentNode]:
+        """单遍流式解析文档结构
+
+        lines 可以是文件对象、io.StringIO 或任意保留换行符的行迭代器。
+        每个节点只缓存自己的原始行，在节点结束时一次性拼接内容，
+        并记录起止行号；结果与 parse_document 一致。
+        """
+        sections = {}
+        current_section = None
+        current_subsection = None
+        buffer = []
+        buffer_end = 0
+        skip_content = False
+        
+        for line_no, line in enumerate(lines):
+            if line.startswith('#'):
+                # 跳过目录部分
+                if line.startswith(TOC_HEADING):
+                    skip_content = True
+                    continue
+                elif skip_content and line.startswith('## '):
+                    skip_content = False
+                
+                if skip_content:
+                    continue
+                
+                # 匹配主标题 (## 开头)
+                if line.startswith('## '):
+                    self._close_node(current_section, current_subsection, buffer,
+                                     buffer_end, True, False)
+                    buffer = []
+                    
+                    title = line.replace('## ', '').strip()
+                    current_section = ContentNode(title=title, content='', start_line=line_no)
+                    sections[title] = current_section
+                    current_subsection = None
+                
+                # 匹配子标题 (### 开头)
+                elif line.startswith('### '):
+                    self._close_node(current_section, current_subsection, buffer,
+                                     buffer_end, True, True)
+                    buffer = []
+                    
+                    if current_section:
+                        title = line.replace('### ', '').strip()
+                        current_subsection = ContentNode(title=title, content='', start_line=line_no)
+                        current_section.children.append(current_subsection)
+            elif skip_content:
+                continue
+            
+            # 累积内容
+            buffer.append(line)
+            buffer_end = line_no + 1
+        
+        # 保存最后一个节点的内容；文档以目录结尾时同样去掉末尾换行
+        self._close_node(current_section, current_subsection, buffer,
+                         buffer_end, skip_content, False)
+        return sections
+    
+    def _split_prompt_span(self, data, start: int, end: int):
+        """在字节范围内定位AI提示词，返回 add_span 所需的三个片段，规则与 split_prompt 相同"""
+        no_prompt = (start, end), (0, 0), (-1, -1)
+        marker = data.find(_PROMPT_MARKER_BYTES, start, end)
+        if marker == -1:
+            return no_prompt
+        
+        part_start = marker + len(_PROMPT_MARKER_BYTES)
+        part_end = data.find(_PROMPT_MARKER_BYTES, part_start, end)
+        if part_end == -1:
+            part_end = end
+        
+        prompt_start = data.find(_CODE_FENCE_BYTES, part_start, part_end)
+        if prompt_start == -1:
+            return no_prompt
+        prompt_end = data.find(_CODE_FENCE_BYTES, prompt_start + len(_CODE_FENCE_BYTES), part_end)
+        if prompt_end == -1:
+            return no_prompt
+        
+        return (
+            (start, marker),
+            (prompt_end + len(_CODE_FENCE_BYTES), part_end),
+            (prompt_start + len(_CODE_FENCE_BYTES), prompt_end),
+        )
+    
+    def _close_span(self, source: LectureSource, section: Optional[ContentNode],
+                    subsection: Optional[ContentNode], start: int, end: int,
+                    end_line: int, trim_newline: bool, has_children: bool):
+        """记录当前节点在源文件中的字节范围"""
+        node = subsection or section
+        if not node:
+            return
+        
+        data = source.data
+        # 节点在下一个标题或目录前结束时，最后一行的换行符不属于内容
+        if trim_newline and end > start and data[end - 1:end] == b'\n':
+            end -= 1
+        
+        if subsection:
+            node.span_index = source.add_span(*self._split_prompt_span(data, start, end))
+        elif has_children:
+            # 有子节点的主章节只保留子标题之前的内容（去除首尾空白）
+            node.span_index = source.add_span((0, 0), (start, end))
+        else:
+            node.span_index = source.add_span((start, end), (0, 0))
+        node.source = source
+        node.end_line = end_line
+    
+    @timed("javahelper_lecture_parse_seconds", mode="lazy")
+    def parse_source(self, source: LectureSource) -> Dict[str, ContentNode]:
+        """基于字节偏移解析文档结构
+
+        只在以 # 开头的行之间跳转，正文行不做任何处理；
+        节点只记录字节范围，结果与 parse_document 一致。
+        """
+        data = source.data
+        size = len(data)
+        sections = {}
+        current_section = None
+        current_subsection = None
+        node_start = 0
+        buffer_end = 0
+        skip_content = False
+        line_no = 0
+        counted = 0
+        
+        pos = 0 if data[:1] == b'#' else data.find(b'\n#')
+        if pos > 0:
+            pos += 1
+        
+        while pos != -1:
+            line_end = data.find(b'\n', pos)
+            if line_end == -1:
+                line_end = size
+            line = data[pos:line_end]
+            line_no += data[counted:pos].count(b'\n')
+            counted = pos
+            
+            # 标题之前的正文行都属于当前节点
+            if not skip_content:
+                buffer_end = pos
+            
+            # 跳过目录部分
+            if line.startswith(_TOC_HEADING_BYTES):
+                skip_content = True
+            else:
+                if skip_content and line.startswith(b'## '):
+                    skip_content = False
+                
+                if skip_content:
+                    pass
+                # 匹配主标题 (## 开头)
+                elif line.startswith(b'## '):
+                    self._close_span(source, current_section, current_subsection,
+                                     node_start, buffer_end, line_no, True, False)
+                    title = line.decode('utf-8').replace('## ', '').strip()
+                    current_section = ContentNode(title=title, start_line=line_no)
+                    sections[title] = current_section
+                    current_subsection = None
+                    node_start = pos
+                # 匹配子标题 (### 开头)
+                elif line.startswith(b'### '):
+                    self._close_span(source, current_section, current_subsection,
+                                     node_start, buffer_end, line_no, True, True)
+                    if current_section:
+                        title = line.decode('utf-8').replace('### ', '').strip()
+                        current_subsection = ContentNode(title=title, start_line=line_no)
+                        current_section.children.append(current_subsection)
+                        node_start = pos
+            
+            pos = data.find(b'\n#', line_end)
+            if pos != -1:
+                pos += 1
+        
+        # 保存最后一个节点；文档以目录结尾时同样去掉末尾换行
+        total_lines = line_no + data[counted:size].count(b'\n')
+        if size and data[size - 1:size] != b'\n':
+            total_lines += 1
+        if not skip_content:
+            buffer_end = size
+        self._close_span(source, current_section, current_subsection,
+                         node_start, buffer_end, total_lines, skip_content, False)
+        return sections
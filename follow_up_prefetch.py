@@ -0,0 +1,172 @@
+"""追加提问的后台预取
+
+回答开始（或结束）时在共享事件循环中并发生成若干组候选问题，
+按对话内容的哈希缓存；页面渲染和“换一组问题”直接取出已生成的一组，
+只有尚未生成完时才等待，最长等待 wait 秒。
+
+- 同一对话的各组问题使用不同的侧重点，补充生成时避开已经生成过的问题
+- 单组生成超时或失败时记录日志和指标（javahelper_follow_up_prefetch_total），
+  所有候选都失败时才使用默认问题（javahelper_follow_up_take_total{result="fallback"}）
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import metrics
+from deepseek_client import DEFAULT_FOLLOW_UP_QUESTIONS, AsyncDeepSeekClient, AsyncRunner
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_key(chat_history: List[Dict[str, str]], current_topic: str) -> str:
+    """对话的缓存键：忽略末尾的回答，回答生成期间提前开始的预取与回答结束后的查找使用同一个键"""
+    history = list(chat_history)
+    if history and history[-1]["role"] == "assistant":
+        history.pop()
+    return ResponseCache.make_key(history, "follow_up", current_topic or "")
+
+
+class _Entry:
+    """一个对话的候选问题集"""
+    __slots__ = ("ready", "pending", "seen", "variant")
+
+    def __init__(self):
+        self.ready: deque = deque()
+        self.pending: List[Future] = []
+        self.seen: List[str] = []
+        self.variant = 0
+
+
+class FollowUpPrefetcher:
+    """后台生成并缓存追加提问"""
+
+    def __init__(self, client: AsyncDeepSeekClient, runner: AsyncRunner, sets: int = 3,
+                 max_workers: int = 4, timeout: float = 20.0, cache_size: int = 256):
+        self.client = client
+        self.runner = runner
+        self.sets = sets
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # 已完成的 Future 添加回调时会在当前线程立即执行，因此使用可重入锁
+        self._cond = threading.Condition(threading.RLock())
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _entry(self, key: str) -> _Entry:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+            while len(self._entries) > self.cache_size:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def _generate(self, chat_history: List[Dict[str, str]], current_topic: str,
+                        variant: int, exclude: List[str]) -> List[str]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        async with self._semaphore:
+            try:
+                questions = await asyncio.wait_for(
+                    self.client.fetch_follow_up_questions(chat_history, current_topic,
+                                                          variant=variant, exclude=exclude),
+                    self.timeout
+                )
+            except asyncio.TimeoutError:
+                metrics.inc("javahelper_follow_up_prefetch_total", result="timeout")
+                logger.warning("生成追加提问超时（%.1f 秒）", self.timeout)
+                raise
+            except Exception:
+                metrics.inc("javahelper_follow_up_prefetch_total", result="error")
+                logger.warning("生成追加提问失败", exc_info=True)
+                raise
+        metrics.inc("javahelper_follow_up_prefetch_total", result="ok")
+        return questions
+
+    def _submit(self, entry: _Entry, chat_history: List[Dict[str, str]], current_topic: str):
+        variant = entry.variant
+        entry.variant += 1
+        future = self.runner.submit(
+            self._generate(list(chat_history), current_topic, variant, list(entry.seen))
+        )
+        entry.pending.append(future)
+        future.add_done_callback(lambda done: self._finish(entry, done))
+
+    def _finish(self, entry: _Entry, future: Future):
+        with self._cond:
+            if future in entry.pending:
+                entry.pending.remove(future)
+            if not future.cancelled() and future.exception() is None:
+                questions = future.result()
+                entry.ready.append(questions)
+                entry.seen.extend(questions)
+            self._cond.notify_all()
+
+    def prefetch(self, chat_history: List[Dict[str, str]], current_topic: str,
+                 count: Optional[int] = None):
+        """在后台补足该对话的候选问题集（已生成和生成中的合计 count 组）"""
+        count = self.sets if count is None else count
+        with self._cond:
+            entry = self._entry(conversation_key(chat_history, current_topic))
+            for _ in range(count - len(entry.ready) - len(entry.pending)):
+                self._submit(entry, chat_history, current_topic)
+
+    def take(self, chat_history: List[Dict[str, str]], current_topic: str,
+             wait: float = 0.5) -> List[str]:
+        """取出一组问题；还没有生成好的候选时最多等待 wait 秒，仍然没有则返回默认问题"""
+        deadline = time.monotonic() + wait
+        waited = False
+        with self._cond:
+            entry = self._entry(conversation_key(chat_history, current_topic))
+            if not entry.ready and not entry.pending:
+                self._submit(entry, chat_history, current_topic)
+            while not entry.ready and entry.pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                waited = True
+                self._cond.wait(remaining)
+
+            questions = entry.ready.popleft() if entry.ready else None
+            # 候选用完后在后台生成下一批，下次“换一组问题”时无需等待
+            if not entry.ready and not entry.pending:
+                for _ in range(self.sets):
+                    self._submit(entry, chat_history, current_topic)
+
+        if questions is None:
+            metrics.inc("javahelper_follow_up_take_total", result="fallback")
+            logger.warning("没有可用的追加提问，使用默认问题")
+            return list(DEFAULT_FOLLOW_UP_QUESTIONS)
+        metrics.inc("javahelper_follow_up_take_total", result="waited" if waited else "ready")
+        return questions
+
+
+_prefetchers: Dict[AsyncDeepSeekClient, FollowUpPrefetcher] = {}
+_prefetchers_lock = threading.Lock()
+
+
+def _stale(prefetcher: FollowUpPrefetcher) -> bool:
+    """事件循环已停止或客户端已关闭（close_async 之后）"""
+    return not prefetcher.runner.alive() or prefetcher.client.http_client.is_closed
+
+
+def get_follow_up_prefetcher(client: AsyncDeepSeekClient, runner: AsyncRunner,
+                             **options) -> FollowUpPrefetcher:
+    """获取客户端对应的预取器（进程内共享，首次调用时的参数生效）
+
+    客户端或事件循环重建后旧的预取器随之丢弃，其信号量绑定在已停止的事件循环上。
+    """
+    with _prefetchers_lock:
+        for stale in [key for key, prefetcher in _prefetchers.items() if _stale(prefetcher)]:
+            del _prefetchers[stale]
+        prefetcher = _prefetchers.get(client)
+        if prefetcher is None or prefetcher.runner is not runner:
+            prefetcher = _prefetchers[client] = FollowUpPrefetcher(client, runner, **options)
+        return prefetcher
@@ -0,0 +1,252 @@
+"""教案预编译索引
+
+将教案目录下所有教案的章节结构（标题、行号、字节偏移）序列化到一个
+二进制索引文件中。冷启动时只需读取一次索引即可得到教案列表和解析树，
+无需 os.listdir 和重新解析；源文件变化时自动重建对应条目。多个应用进程部署在不同机器上时，
+解析树可以保存在共享后端中：每个条目以内容哈希为键单独保存，相同内容的教案在各进程、
+各机器之间复用，互不覆盖；文件状态和教案列表只与本机有关，保存在进程内。
+
+用法: python lecture_index.py [教案目录]
+"""
+import marshal
+import os
+import sys
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+from doc_parser import ContentNode, GuideParser, LectureSource
+from shared_backend import SharedBackend
+
+# 索引格式版本，结构变化时递增，旧索引会被自动丢弃并重建
+INDEX_VERSION = 1
+LECTURE_EXTENSIONS = ('.qmd', '.md')
+_MAGIC = b"JHLI"
+# 共享后端中的条目保留时间（秒），过期后由首个重新解析的进程写回
+SHARED_ENTRY_TTL = 30 * 24 * 3600
+
+
+def default_index_path(lecture_dir: str) -> str:
+    """索引文件放在教案目录旁边，避免写索引时改变目录的修改时间"""
+    lecture_dir = os.path.abspath(lecture_dir)
+    return os.path.join(os.path.dirname(lecture_dir), f".{os.path.basename(lecture_dir)}.index")
+
+
+class LectureIndex:
+    """教案目录的预编译索引
+
+    - 教案列表以目录的修改时间判断是否过期
+    - 每个教案以 (mtime, size) 判断是否过期，并保存内容哈希；
+      状态变化但内容未变时直接复用索引中的解析树
+    - 使用共享后端时，解析树按内容哈希保存在共享后端中，
+      文件状态、内容哈希和教案列表只保存在进程内（不写本地文件）
+    """
+
+    def __init__(self, lecture_dir: str, index_path: Optional[str] = None,
+                 shared: Optional[SharedBackend] = None):
+        self.lecture_dir = lecture_dir
+        self.index_path = index_path or default_index_path(lecture_dir)
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dir_mtime_ns: Optional[int] = None
+        self._catalog: Optional[List[str]] = None
+        # 每个教案的条目单独序列化，只在加载该教案时才反序列化
+        self._entries: Dict[str, bytes] = {}
+
+    @staticmethod
+    def _shared_entry_key(digest: str) -> str:
+        return f"lecture_index:{INDEX_VERSION}:{marshal.version}:{digest}"
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.shared is not None:
+            return
+        raw = self._read()
+        if raw is None or not raw.startswith(_MAGIC):
+            return
+        try:
+            version, marshal_version, payload = marshal.loads(raw[len(_MAGIC):])
+        except (EOFError, ValueError, TypeError):
+            return
+        if version != INDEX_VERSION or marshal_version != marshal.version:
+            return
+        self._dir_mtime_ns = payload["dir_mtime_ns"]
+        self._catalog = payload["catalog"]
+        self._entries = payload["entries"]
+
+    def _read(self) -> Optional[bytes]:
+        try:
+            with open(self.index_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save(self):
+        """原子地写入索引文件"""
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        if self.shared is not None:
+            # 条目在 update 时逐个写入共享后端，其余内容只在进程内
+            return
+        payload = {
+            "dir_mtime_ns": self._dir_mtime_ns,
+            "catalog": self._catalog,
+            "entries": self._entries,
+        }
+        data = _MAGIC + marshal.dumps((INDEX_VERSION, marshal.version, payload))
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # 索引只是加速手段，目录不可写时直接跳过
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _dir_mtime(self) -> int:
+        return os.stat(self.lecture_dir).st_mtime_ns
+
+    def catalog(self) -> Optional[List[Dict[str, str]]]:
+        """返回索引中的教案列表；目录有变化时返回 None"""
+        with self._lock:
+            self._ensure_loaded()
+            if self._catalog is None or self._dir_mtime_ns != self._dir_mtime():
+                return None
+            return [
+                {
+                    "name": os.path.splitext(filename)[0],
+                    "path": os.path.join(self.lecture_dir, filename)
+                }
+                for filename in self._catalog
+            ]
+
+    def update_catalog(self, lectures: List[Dict[str, str]]):
+        """记录最新的教案列表"""
+        with self._lock:
+            self._ensure_loaded()
+            self._dir_mtime_ns = self._dir_mtime()
+            self._catalog = [os.path.basename(lecture["path"]) for lecture in lectures]
+            self._save()
+
+    def lookup(self, lecture_path: str, stat_key: Tuple[int, int],
+               source: Optional[LectureSource] = None,
+               digest: Optional[str] = None,
+               use_mmap: bool = False) -> Tuple[Optional[GuideParser], Optional[str]]:
+        """从索引恢复解析树，返回 (解析结果, 内容哈希)
+
+        文件状态与索引一致时直接恢复；否则当传入的 digest 与索引一致时，
+        使用传入的 source 恢复并刷新索引中的文件状态。
+        未传入 source 时打开文件，use_mmap 含义同 LectureSource.open。
+        """
+        with self._lock:
+            self._ensure_loaded()
+            filename = os.path.basename(lecture_path)
+            raw_entry = self._entries.get(filename)
+            entry = marshal.loads(raw_entry) if raw_entry is not None else None
+            if (self.shared is not None and digest is not None
+                    and (entry is None or entry["digest"] != digest)):
+                # 其他进程可能已解析过相同内容的教案
+                raw_entry = self.shared.get(self._shared_entry_key(digest))
+                entry = marshal.loads(raw_entry) if raw_entry is not None else None
+            if entry is None:
+                return None, None
+            if (entry["mtime_ns"], entry["size"]) != stat_key:
+                if digest is None or digest != entry["digest"]:
+                    return None, None
+                entry["mtime_ns"], entry["size"] = stat_key
+                self._entries[filename] = marshal.dumps(entry)
+                self._save()
+
+        if source is None:
+            source = LectureSource.open(lecture_path, use_mmap=use_mmap)
+        return self._restore(lecture_path, entry, source), entry["digest"]
+
+    def update(self, lecture_path: str, stat_key: Tuple[int, int], digest: str,
+               parser: GuideParser, save: bool = True):
+        """把新的解析结果写入索引；批量更新时可传 save=False 最后统一写盘"""
+        entry = {
+            "mtime_ns": stat_key[0],
+            "size": stat_key[1],
+            "digest": digest,
+            "spans": parser.source.spans.tobytes(),
+            "tree": [
+                (section.title, section.start_line, section.end_line, section.span_index,
+                 [(child.title, child.start_line, child.end_line, child.span_index)
+                  for child in section.children])
+                for section in parser.root.values()
+            ],
+        }
+        raw_entry = marshal.dumps(entry)
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[os.path.basename(lecture_path)] = raw_entry
+            if save:
+                self._save()
+        if self.shared is not None:
+            self.shared.set(self._shared_entry_key(digest), raw_entry, SHARED_ENTRY_TTL)
+
+    @staticmethod
+    def _node(source: LectureSource, title: str, start_line: int, end_line: int,
+              span_index: int) -> ContentNode:
+        node = ContentNode(title=title, start_line=start_line, end_line=end_line)
+        node.source = source
+        node.span_index = span_index
+        return node
+
+    def _restore(self, lecture_path: str, entry: dict, source: LectureSource) -> GuideParser:
+        spans = array('q')
+        spans.frombytes(entry["spans"])
+        source.spans = spans
+
+        root = {}
+        for title, start_line, end_line, span_index, children in entry["tree"]:
+            section = self._node(source, title, start_line, end_line, span_index)
+            section.children = [self._node(source, *child) for child in children]
+            root[title] = section
+        return GuideParser.from_source(lecture_path, source, root=root)
+
+
+_indexes: Dict[tuple, LectureIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lecture_index(lecture_dir: str, shared: Optional[SharedBackend] = None) -> LectureIndex:
+    """获取教案目录对应的索引（进程内共享）"""
+    key = (os.path.abspath(lecture_dir), shared)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LectureIndex(lecture_dir, shared=shared)
+        return index
+
+
+def build_index(lecture_dir: str, index_path: Optional[str] = None) -> LectureIndex:
+    """解析目录下的全部教案并写入索引"""
+    index = LectureIndex(lecture_dir, index_path)
+    lectures = []
+    for filename in os.listdir(lecture_dir):
+        if filename.endswith(LECTURE_EXTENSIONS):
+            lectures.append({
+                "name": os.path.splitext(filename)[0],
+                "path": os.path.join(lecture_dir, filename)
+            })
+
+    for lecture in lectures:
+        stat = os.stat(lecture["path"])
+        source = LectureSource.open(lecture["path"])
+        parser = GuideParser.from_source(lecture["path"], source)
+        index.update(lecture["path"], (stat.st_mtime_ns, stat.st_size), source.digest(),
+                     parser, save=False)
+    index.update_catalog(lectures)
+    return index
+
+
+if __name__ == "__main__":
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else "lecture"
+    built = build_index(target_dir)
+    print(f"已为 {len(built.catalog() or [])} 个教案生成索引: {built.index_path}")
@@ -1,29 +1,236 @@
 import os
-from typing import List, Dict
-from doc_parser import GuideParser
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+from doc_parser import GuideParser, LectureSource
+from lecture_index import LECTURE_EXTENSIONS, LectureIndex, get_lecture_index
+from lecture_watcher import get_lecture_watcher
+from markdown_renderer import get_renderer
+from shared_backend import SharedBackend
+
+# 进程内最多缓存的教案数量
+DEFAULT_CACHE_SIZE = 16
+
+
+class _CacheEntry:
+    """缓存条目：解析结果及其对应的文件状态"""
+    __slots__ = ("parser", "stat_key", "digest")
+
+    def __init__(self, parser: GuideParser, stat_key: Tuple[int, int], digest: str):
+        self.parser = parser
+        self.stat_key = stat_key
+        self.digest = digest
+
+
+class _PathLock:
+    """一个文件的加载锁及正在使用它的线程数"""
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class LectureCache:
+    """进程级的教案解析缓存
+
+    以文件路径为键，按 (mtime, size) 快速判断文件是否变化；
+    状态变化时再比较内容哈希，只有内容真正改变才重新解析。
+    所有会话共享同一棵冻结后的解析树，超出容量时按 LRU 淘汰。
+    use_mmap 含义同 LectureSource.open，仅用于不会被修改的教案文件。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE, use_mmap: bool = False):
+        self.max_entries = max_entries
+        self.use_mmap = use_mmap
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 正在加载的文件各有一个锁，最后一个使用者释放后删除
+        self._path_locks: Dict[str, _PathLock] = {}
+        self.hits = 0
+        self.index_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(lecture_path: str) -> str:
+        return os.path.abspath(lecture_path)
+
+    @staticmethod
+    def _stat_key(lecture_path: str) -> Tuple[int, int]:
+        stat = os.stat(lecture_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, lecture_path: str, index: Optional[LectureIndex] = None,
+            validate: bool = True) -> GuideParser:
+        """获取解析结果，文件未变化时直接返回缓存
+
+        内存中没有可用结果时，优先从预编译索引恢复，其次才重新解析，
+        并把新的解析结果写回索引。validate 为 False 时（由监视器负责刷新）
+        缓存命中直接返回，不检查文件状态。
+        """
+        key = self._key(lecture_path)
+        if not validate:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.parser
+        if not os.path.exists(key):
+            raise FileNotFoundError(f"找不到文件: {lecture_path}")
+        stat_key = self._stat_key(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stat_key == stat_key:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.parser
+            path_lock = self._path_locks.get(key)
+            if path_lock is None:
+                path_lock = self._path_locks[key] = _PathLock()
+            path_lock.users += 1
+
+        # 同一文件只允许一个线程解析，其余线程等待结果
+        try:
+            with path_lock.lock:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry.stat_key == stat_key:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return entry.parser
+
+                parser, digest = self._load(key, lecture_path, stat_key, entry, index)
+                self._store(key, _CacheEntry(parser, stat_key, digest))
+                return parser
+        finally:
+            with self._lock:
+                path_lock.users -= 1
+                if not path_lock.users:
+                    del self._path_locks[key]
+
+    def _load(self, key: str, lecture_path: str, stat_key: Tuple[int, int],
+              entry: Optional[_CacheEntry], index: Optional[LectureIndex]) -> Tuple[GuideParser, str]:
+        """依次尝试：预编译索引、内存中的旧结果（内容未变）、重新解析"""
+        if index is not None:
+            parser, digest = index.lookup(key, stat_key, use_mmap=self.use_mmap)
+            if parser is not None:
+                self.index_hits += 1
+                return parser.freeze(), digest
+
+        source = LectureSource.open(key, use_mmap=self.use_mmap)
+        digest = source.digest()
+        if entry is not None and entry.digest == digest:
+            # 仅修改时间变化，内容未变
+            self.hits += 1
+            return entry.parser, digest
+        if index is not None:
+            parser, _ = index.lookup(key, stat_key, source=source, digest=digest)
+            if parser is not None:
+                self.index_hits += 1
+                return parser.freeze(), digest
+
+        parser = GuideParser.from_source(lecture_path, source).freeze()
+        self.misses += 1
+        if index is not None:
+            index.update(key, stat_key, digest, parser)
+        return parser, digest
+
+    def _store(self, key: str, entry: _CacheEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, lecture_path: Optional[str] = None):
+        """使缓存失效；不指定路径时清空全部缓存"""
+        with self._lock:
+            if lecture_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(lecture_path), None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, lecture_path: str) -> bool:
+        with self._lock:
+            return self._key(lecture_path) in self._entries
+
+
+# 所有会话共享的缓存实例
+lecture_cache = LectureCache()
+
 
 class LectureManager:
-    def __init__(self, lecture_dir: str = "lecture"):
+    def __init__(self, lecture_dir: str = "lecture", cache: Optional[LectureCache] = None,
+                 use_index: bool = True, prerender: bool = False, watch: bool = False,
+                 watch_backend: str = "auto", poll_interval: float = 1.0,
+                 shared: Optional[SharedBackend] = None):
         self.lecture_dir = lecture_dir
+        self.prerender = prerender
+        self.cache = cache if cache is not None else lecture_cache
+        if watch and self.cache.use_mmap:
+            # 热更新时文件会被原地重写，不能使用内存映射；另建缓存而不修改共享的缓存
+            self.cache = LectureCache(self.cache.max_entries, use_mmap=False)
         self.ensure_lecture_dir()
-        
+        # 多个应用进程时可把预编译索引放在共享后端中
+        self.index = get_lecture_index(lecture_dir, shared=shared) if use_index else None
+        # 监视目录时教案列表和解析结果由后台线程刷新，读取时不再访问文件系统
+        self.watcher = get_lecture_watcher(
+            lecture_dir, self.cache, self.index, backend=watch_backend, poll_interval=poll_interval
+        ) if watch else None
+        if self.watcher is not None:
+            # 同一目录的监视器进程内共享，从它刷新的缓存中读取
+            self.cache = self.watcher.cache
+
+    def healthy(self) -> bool:
+        """教案目录存在，且监视目录时监视线程仍在运行"""
+        if not os.path.isdir(self.lecture_dir):
+            return False
+        return self.watcher is None or self.watcher.running()
+
+    def close(self):
+        """停止目录监视"""
+        if self.watcher is not None:
+            self.watcher.stop()
+
     def ensure_lecture_dir(self):
         """确保教案目录存在"""
         if not os.path.exists(self.lecture_dir):
             os.makedirs(self.lecture_dir)
-            
+
     def get_available_lectures(self) -> List[Dict[str, str]]:
-        """获取所有可用的教案"""
+        """获取所有可用的教案（目录未变化时直接使用索引中的列表）"""
+        if self.watcher is not None:
+            return self.watcher.catalog()
+        if self.index is not None:
+            lectures = self.index.catalog()
+            if lectures is not None:
+                return lectures
+
         lectures = []
         for filename in os.listdir(self.lecture_dir):
-            if filename.endswith(('.qmd', '.md')):
+            if filename.endswith(LECTURE_EXTENSIONS):
                 name = os.path.splitext(filename)[0]
                 lectures.append({
                     "name": name,
                     "path": os.path.join(self.lecture_dir, filename)
                 })
+        if self.index is not None:
+            self.index.update_catalog(lectures)
         return lectures
-    
+
     def load_lecture(self, lecture_path: str) -> GuideParser:
-        """加载指定的教案"""
-        return GuideParser(lecture_path) 
\ No newline at end of file
+        """加载指定的教案（进程内共享缓存，文件未变化时不重新解析）
+
+        prerender 为 True 时在后台预先渲染各章节内容（含代码高亮）；
+        监视目录时直接返回缓存中的最新解析树。
+        """
+        parser = self.cache.get(lecture_path, index=self.index, validate=self.watcher is None)
+        if self.prerender:
+            get_renderer().prerender_async(parser)
+        return parser
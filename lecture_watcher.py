@@ -0,0 +1,206 @@
+"""教案目录的后台监视与热更新
+
+- 在内存中维护教案列表，页面重跑时不再访问文件系统
+- 目录变化由 watchdog（Linux 下为 inotify）通知，未安装 watchdog 或无法监视时退回定时轮询
+- 每次变化后重新扫描目录并按 (mtime, size) 比较，只重新解析真正变化的、
+  且已在缓存中的教案；新解析树写入共享缓存时整体替换，正在使用旧树的会话不受影响
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from lecture_index import LECTURE_EXTENSIONS, LectureIndex
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1.0
+# 编辑器保存文件时往往产生多个事件（写临时文件、改名等），稍等片刻一并处理
+DEFAULT_DEBOUNCE = 0.1
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "LectureWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type not in ("opened", "closed_no_write"):
+            self.watcher.notify()
+
+
+class LectureWatcher:
+    """监视教案目录，在后台线程中刷新教案列表和解析缓存
+
+    backend 为 "auto"（优先 watchdog）、"watchdog" 或 "poll"。
+    """
+
+    def __init__(self, lecture_dir: str, cache, index: Optional[LectureIndex] = None,
+                 backend: str = "auto", poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 debounce: float = DEFAULT_DEBOUNCE):
+        self.lecture_dir = lecture_dir
+        self.cache = cache
+        self.index = index
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.mode: Optional[str] = None
+        self.reloads = 0
+        self.version = 0
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._stopped = False
+        self._catalog: List[Dict[str, str]] = []
+        self._stats: Dict[str, Tuple[int, int]] = {}  # 文件名 -> (mtime, size)
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "LectureWatcher":
+        """同步扫描一次目录，然后启动后台监视"""
+        self._refresh()
+        if self.backend != "poll" and Observer is not None:
+            try:
+                observer = Observer()
+                observer.schedule(_EventHandler(self), self.lecture_dir, recursive=False)
+                observer.daemon = True
+                observer.start()
+                self._observer = observer
+                self.mode = "watchdog"
+            except OSError:
+                # 例如 inotify 监视数量达到上限
+                self._observer = None
+        if self._observer is None:
+            if self.backend == "watchdog":
+                raise RuntimeError("watchdog 不可用，无法监视教案目录")
+            self.mode = "poll"
+        self._thread = threading.Thread(target=self._run, daemon=True, name="lecture-watcher")
+        self._thread.start()
+        return self
+
+    def running(self) -> bool:
+        """后台线程是否仍在运行（未停止）"""
+        return not self._stopped and self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=1)
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def notify(self):
+        """标记目录已变化（由 watchdog 事件调用）"""
+        with self._cond:
+            self._dirty = True
+            self._cond.notify_all()
+
+    def catalog(self) -> List[Dict[str, str]]:
+        """当前的教案列表（内存中的副本）"""
+        with self._cond:
+            return [dict(lecture) for lecture in self._catalog]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self.mode == "watchdog":
+                    while not self._dirty and not self._stopped:
+                        self._cond.wait()
+                else:
+                    self._cond.wait(self.poll_interval)
+                if self._stopped:
+                    return
+            if self.mode == "watchdog":
+                time.sleep(self.debounce)
+            with self._cond:
+                self._dirty = False
+            try:
+                self._refresh()
+            except Exception:
+                # 例如目录被临时移走，下次变化时再处理
+                logger.exception("刷新教案目录失败: %s", self.lecture_dir)
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        for filename in os.listdir(self.lecture_dir):
+            if filename.endswith(LECTURE_EXTENSIONS):
+                try:
+                    stat = os.stat(os.path.join(self.lecture_dir, filename))
+                except FileNotFoundError:
+                    continue
+                stats[filename] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def _refresh(self):
+        """重新扫描目录，更新教案列表，重新解析变化的教案"""
+        stats = self._scan()
+        with self._cond:
+            previous = self._stats
+            self._stats = stats
+            catalog_changed = stats.keys() != previous.keys()
+            if catalog_changed:
+                self._catalog = [
+                    {
+                        "name": os.path.splitext(filename)[0],
+                        "path": os.path.join(self.lecture_dir, filename)
+                    }
+                    for filename in stats
+                ]
+            catalog = self._catalog
+
+        changed = False
+        for filename in previous.keys() - stats.keys():
+            self.cache.invalidate(os.path.join(self.lecture_dir, filename))
+            changed = True
+        for filename, stat_key in stats.items():
+            if filename not in previous or previous[filename] == stat_key:
+                continue
+            changed = True
+            lecture_path = os.path.join(self.lecture_dir, filename)
+            # 未加载过的教案等到使用时再解析
+            if lecture_path in self.cache:
+                try:
+                    self.cache.get(lecture_path, index=self.index)
+                    self.reloads += 1
+                except FileNotFoundError:
+                    self.cache.invalidate(lecture_path)
+                except Exception:
+                    # 文件正写到一半等原因无法解析：丢弃缓存中的旧解析树，
+                    # 之后按需重新读取文件，下次变化时再由监视器加载
+                    logger.exception("重新加载教案失败: %s", lecture_path)
+                    self.cache.invalidate(lecture_path)
+        if catalog_changed and self.index is not None:
+            self.index.update_catalog(catalog)
+        if changed or catalog_changed:
+            self.version += 1
+
+
+_watchers: Dict[str, LectureWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def get_lecture_watcher(lecture_dir: str, cache, index: Optional[LectureIndex] = None,
+                        backend: str = "auto",
+                        poll_interval: float = DEFAULT_POLL_INTERVAL) -> LectureWatcher:
+    """获取教案目录对应的监视器（进程内共享，首次调用时启动）"""
+    key = os.path.abspath(lecture_dir)
+    with _watchers_lock:
+        watcher = _watchers.get(key)
+        if watcher is None or not watcher.running():
+            watcher = _watchers[key] = LectureWatcher(
+                lecture_dir, cache, index, backend=backend, poll_interval=poll_interval
+            ).start()
+            atexit.register(watcher.stop)
+        return watcher
+
@@ -0,0 +1,102 @@
+"""教案内容的 Markdown 渲染
+
+- 每个线程复用一个 Markdown 转换器，每次转换前 reset()，避免重复加载扩展
+- 渲染结果以内容哈希为键缓存在进程内，所有会话和重跑共享
+- 代码块由 codehilite 在服务端高亮（需要 Pygments，未安装时只输出普通代码块）
+- 结果是完整的 HTML，由 utils.show_markdown 通过 st.html 显示，不再经过 st.markdown
+  的 Markdown 解析
+- 加载教案时可在后台预先渲染所有章节，切换章节时直接使用缓存
+"""
+import hashlib
+import threading
+import weakref
+from typing import Optional
+
+import markdown
+
+from response_cache import MemoryCacheBackend
+
+EXTENSIONS = [
+    'markdown.extensions.extra',       # 包含表格、代码块等扩展
+    'markdown.extensions.toc',         # 支持目录
+    'markdown.extensions.codehilite',  # 代码高亮
+]
+EXTENSION_CONFIGS = {
+    'markdown.extensions.codehilite': {
+        'guess_lang': False,
+        # 内联样式，不依赖额外的 CSS
+        'noclasses': True,
+    },
+}
+
+_local = threading.local()
+
+
+def _converter() -> markdown.Markdown:
+    md = getattr(_local, "converter", None)
+    if md is None:
+        md = _local.converter = markdown.Markdown(
+            extensions=EXTENSIONS,
+            extension_configs=EXTENSION_CONFIGS
+        )
+    return md
+
+
+def content_key(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class MarkdownRenderer:
+    """带 HTML 缓存的渲染器"""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024):
+        self.cache = MemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._prerendered = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def render(self, content: str) -> str:
+        """渲染为 HTML，相同内容只渲染一次"""
+        if not content:
+            return ""
+        key = content_key(content)
+        html = self.cache.get(key)
+        if html is not None:
+            self.hits += 1
+            return html
+        self.misses += 1
+        md = _converter()
+        md.reset()
+        html = md.convert(content)
+        self.cache.set(key, html, None)
+        return html
+
+    def prerender(self, parser):
+        """渲染教案所有章节的内容"""
+        for section in parser.root.values():
+            self.render(section.content)
+
+    def prerender_async(self, parser) -> Optional[threading.Thread]:
+        """在后台线程中预先渲染教案，同一份解析结果只处理一次"""
+        with self._lock:
+            if parser in self._prerendered:
+                return None
+            self._prerendered.add(parser)
+        thread = threading.Thread(target=self.prerender, args=(parser,), daemon=True,
+                                  name="markdown-prerender")
+        thread.start()
+        return thread
+
+
+_renderer: Optional[MarkdownRenderer] = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer(max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024) -> MarkdownRenderer:
+    """获取进程内共享的渲染器（首次调用时的参数生效）"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = MarkdownRenderer(max_entries=max_entries, max_bytes=max_bytes)
+        return _renderer
@@ -0,0 +1,346 @@
+"""运行指标
+
+在热点路径上记录耗时直方图和计数器，以 Prometheus 文本格式导出：
+- 默认关闭；关闭时 timed 装饰的函数只多一次布尔判断，timer()/stream_timer()
+  返回共享的空对象，不分配、不加锁
+- start_metrics() 启用后可在本地端口提供 /metrics，或定期原子地写入文件
+  （供 node_exporter 的 textfile collector 读取）
+
+用法:
+    @timed("javahelper_db_seconds", operation="save_chat")
+    def save_chat(...): ...
+
+    with timer("javahelper_lecture_parse_seconds", mode="lazy"):
+        ...
+"""
+import atexit
+import bisect
+import functools
+import http.server
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# 已知指标：名称 -> (类型, 说明, 直方图分桶)
+METRICS = {
+    "javahelper_lecture_parse_seconds": ("histogram", "教案解析耗时", LATENCY_BUCKETS),
+    "javahelper_db_seconds": ("histogram", "数据库操作耗时", LATENCY_BUCKETS),
+    "javahelper_llm_ttft_seconds": ("histogram", "流式回答的首个片段到达时间", LATENCY_BUCKETS),
+    "javahelper_llm_stream_seconds": ("histogram", "流式回答的总耗时", LATENCY_BUCKETS),
+    "javahelper_llm_tokens_per_second": ("histogram", "流式回答每秒输出的片段数（约等于 token 数）", RATE_BUCKETS),
+    "javahelper_llm_stream_errors_total": ("counter", "流式回答失败次数", None),
+    "javahelper_follow_up_seconds": ("histogram", "生成追加提问的耗时", LATENCY_BUCKETS),
+    "javahelper_follow_up_failures_total": ("counter", "生成追加提问失败（使用默认问题）的次数", None),
+    "javahelper_follow_up_prefetch_total": ("counter", "后台预取追加提问的结果（ok、timeout、error）", None),
+    "javahelper_follow_up_take_total": ("counter", "取用追加提问的结果（ready、waited、fallback）", None),
+    "javahelper_rerun_seconds": ("histogram", "Streamlit 页面一次重跑的耗时", LATENCY_BUCKETS),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """累积分桶直方图"""
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _NullTimer:
+    """指标关闭时使用的空计时器"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def chunk(self):
+        pass
+
+    def done(self):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: LabelKey):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.histogram(self.name, self.labels).observe(time.perf_counter() - self.start)
+        return False
+
+
+class StreamTimer:
+    """流式回答计时：首个片段到达时间、总耗时和输出速率"""
+    __slots__ = ("registry", "labels", "start", "first", "chunks")
+
+    def __init__(self, registry: "MetricsRegistry", labels: LabelKey):
+        self.registry = registry
+        self.labels = labels
+        self.start = time.perf_counter()
+        self.first: Optional[float] = None
+        self.chunks = 0
+
+    def chunk(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+            self.registry.histogram("javahelper_llm_ttft_seconds", self.labels).observe(self.first - self.start)
+        self.chunks += 1
+
+    def done(self):
+        elapsed = time.perf_counter() - self.start
+        self.registry.histogram("javahelper_llm_stream_seconds", self.labels).observe(elapsed)
+        if self.first is not None and self.chunks > 1:
+            generating = time.perf_counter() - self.first
+            if generating > 0:
+                self.registry.histogram("javahelper_llm_tokens_per_second", self.labels).observe(
+                    (self.chunks - 1) / generating
+                )
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """按 (指标名, 标签) 保存的指标集合"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], Counter] = {}
+
+    def histogram(self, name: str, labels: LabelKey = ()) -> Histogram:
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    definition = METRICS.get(name)
+                    buckets = definition[2] if definition and definition[2] else LATENCY_BUCKETS
+                    histogram = self._histograms[key] = Histogram(buckets)
+        return histogram
+
+    def counter(self, name: str, labels: LabelKey = ()) -> Counter:
+        key = (name, labels)
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        described = set()
+
+        def describe(name: str, kind: str):
+            if name in described:
+                return
+            described.add(name)
+            definition = METRICS.get(name)
+            if definition:
+                lines.append(f"# HELP {name} {definition[1]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), counter in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(counter.value)}")
+        for (name, labels), histogram in histograms:
+            describe(name, "histogram")
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path: str):
+        """原子地写入指标文件"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+# 进程内共享的指标集合
+registry = MetricsRegistry()
+
+
+def timed(name: str, **labels) -> Callable:
+    """记录被装饰函数耗时的装饰器；指标关闭时直接调用原函数"""
+    label_key = _label_key(labels)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.histogram(name, label_key).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def timer(name: str, **labels):
+    """计时上下文管理器"""
+    if not registry.enabled:
+        return _NULL_TIMER
+    return _Timer(registry, name, _label_key(labels))
+
+
+def stream_timer(**labels):
+    """流式回答计时器：每个片段调用 chunk()，正常结束时调用 done()"""
+    if not registry.enabled:
+        return _NULL_TIMER
+    return StreamTimer(registry, _label_key(labels))
+
+
+def observe(name: str, value: float, **labels):
+    if registry.enabled:
+        registry.histogram(name, _label_key(labels)).observe(value)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    if registry.enabled:
+        registry.counter(name, _label_key(labels)).inc(amount)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[http.server.ThreadingHTTPServer] = None
+_file_thread: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+
+
+def _write_file(path: str):
+    try:
+        registry.write_file(path)
+    except OSError:
+        pass
+
+
+def _write_periodically(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        _write_file(path)
+
+
+def start_metrics(port: int = 0, host: str = "127.0.0.1", path: Optional[str] = None,
+                  interval: float = 15.0):
+    """启用指标（进程内只生效一次）
+
+    port 不为 0 时在 host:port 提供 /metrics；path 不为空时每 interval 秒写入该文件。
+    """
+    global _server, _file_thread
+    with _start_lock:
+        registry.enabled = True
+        if port and _server is None:
+            try:
+                _server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                # 多个进程时只有一个能占用端口，其余进程可改用文件导出
+                _server = None
+            else:
+                _server.daemon_threads = True
+                threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-http").start()
+        if path and _file_thread is None:
+            _file_thread = threading.Thread(target=_write_periodically, args=(path, interval),
+                                            daemon=True, name="metrics-file")
+            _file_thread.start()
+            # 进程退出前再写一次，短时间运行的进程也能留下完整的指标
+            atexit.register(_write_file, path)
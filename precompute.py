@@ -0,0 +1,198 @@
+"""预先生成教案中每个小节AI提示词的首轮回答
+
+离线遍历所有教案的每个带提示词的小节，调用 DeepSeek 生成回答并保存，
+以 (教案内容哈希, 节点, 提示词哈希) 为键。请求与页面上提问时相同（系统提示词
+附加同样的检索片段），提示词哈希也包含这些片段。教案、提示词或检索配置修改后
+键随之变化，旧回答自然失效。任务可以中断后重新运行，已生成的回答会被跳过。
+
+用法: python precompute.py --concurrency 4 --retries 3
+"""
+import argparse
+import hashlib
+import logging
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from retrieval import CHUNK_CHARS, lecture_references
+
+logger = logging.getLogger(__name__)
+
+
+def lecture_topic(lecture_name: str, section: str, subsection: str) -> str:
+    """与页面上提问时使用的主题保持一致，保证系统提示词相同"""
+    return f"{lecture_name} - {section} - {subsection}"
+
+
+def prompt_hash(prompt: str, references: Sequence[str] = ()) -> str:
+    """提示词及附加的检索片段的哈希"""
+    digest = hashlib.sha256(prompt.strip().encode("utf-8"))
+    for reference in references:
+        digest.update(b"\0" + reference.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PrecomputedStore:
+    """预生成回答的存储"""
+
+    def __init__(self, db_path: str = "precomputed_answers.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS precomputed_answers (
+                lecture_hash TEXT,
+                node_key TEXT,
+                prompt_hash TEXT,
+                prompt TEXT,
+                answer TEXT,
+                model TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (lecture_hash, node_key, prompt_hash)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, lecture_hash: str, key: str, prompt: str,
+            references: Sequence[str] = ()) -> Optional[str]:
+        """查找预生成的回答；references 为提问时附加的检索片段"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM precomputed_answers "
+                "WHERE lecture_hash = ? AND node_key = ? AND prompt_hash = ?",
+                (lecture_hash, key, prompt_hash(prompt, references))
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, lecture_hash: str, key: str, prompt: str, answer: str, model: str,
+            references: Sequence[str] = ()):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO precomputed_answers "
+                "(lecture_hash, node_key, prompt_hash, prompt, answer, model) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (lecture_hash, key, prompt_hash(prompt, references), prompt, answer, model)
+            )
+            self._conn.commit()
+
+
+_stores: Dict[str, PrecomputedStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_precomputed_store(db_path: str = "precomputed_answers.db") -> PrecomputedStore:
+    """获取进程内共享的预生成回答存储"""
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = PrecomputedStore(db_path)
+        return store
+
+
+def collect_tasks(lecture_manager, store: PrecomputedStore, top_k: int = 3, max_chars: int = 1500,
+                  chunk_chars: int = CHUNK_CHARS) -> List[Tuple[str, str, str, str, str, str, List[str]]]:
+    """收集尚未生成回答的小节：(教案名, 教案哈希, 节点标识, 章节, 小节, 提示词, 检索片段)
+
+    检索参数需与页面上提问时一致（config 中的 RETRIEVAL_*）
+    """
+    tasks = []
+    for lecture in lecture_manager.get_available_lectures():
+        parser = lecture_manager.load_lecture(lecture["path"])
+        lecture_hash = parser.source.digest()
+        navigation = parser.navigation
+        for section_title in navigation.section_titles:
+            for key in navigation.children(section_title):
+                entry = navigation[key]
+                prompt = entry.node.prompt
+                if not prompt:
+                    continue
+                references = lecture_references(parser, prompt, key, entry.title, k=top_k,
+                                                max_chars=max_chars, chunk_chars=chunk_chars)
+                if store.get(lecture_hash, key, prompt, references) is not None:
+                    continue
+                tasks.append((lecture["name"], lecture_hash, key, section_title, entry.title, prompt,
+                              references))
+    return tasks
+
+
+def generate_answer(client, task, retries: int, backoff: float) -> str:
+    """生成单个回答，失败时按指数退避加随机抖动重试"""
+    lecture_name, _, _, section, subsection, prompt, references = task
+    for attempt in range(retries + 1):
+        try:
+            return client.get_response(
+                messages=[{"role": "user", "content": prompt}],
+                current_topic=lecture_topic(lecture_name, section, subsection),
+                references=references
+            )
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+def precompute(lecture_manager, client, store: PrecomputedStore, concurrency: int = 4,
+               retries: int = 3, backoff: float = 1.0, top_k: int = 3, max_chars: int = 1500,
+               chunk_chars: int = CHUNK_CHARS) -> Dict[str, int]:
+    """并发生成所有缺失的回答，每完成一个立即保存，返回统计信息"""
+    tasks = collect_tasks(lecture_manager, store, top_k, max_chars, chunk_chars)
+    stats = {"total": len(tasks), "done": 0, "failed": 0}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(generate_answer, client, task, retries, backoff): task
+            for task in tasks
+        }
+        for future in as_completed(futures):
+            lecture_name, lecture_hash, key, section, subsection, prompt, references = futures[future]
+            try:
+                answer = future.result()
+            except Exception as e:
+                stats["failed"] += 1
+                logger.error("生成失败 %s - %s - %s: %s", lecture_name, section, subsection, e)
+                continue
+            store.put(lecture_hash, key, prompt, answer, client.model, references)
+            stats["done"] += 1
+            logger.info("已生成 %d/%d: %s - %s - %s", stats["done"], stats["total"],
+                        lecture_name, section, subsection)
+    return stats
+
+
+def main():
+    from config import (DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEEPSEEK_MODEL, PRECOMPUTED_ANSWERS_PATH,
+                        RETRIEVAL_CHUNK_CHARS, RETRIEVAL_MAX_CHARS, RETRIEVAL_TOP_K)
+    from deepseek_client import DeepSeekClient
+    from lecture_manager import LectureManager
+
+    arg_parser = argparse.ArgumentParser(description="预先生成教案小节提示词的首轮回答")
+    arg_parser.add_argument("--lecture-dir", default="lecture")
+    arg_parser.add_argument("--db-path", default=PRECOMPUTED_ANSWERS_PATH)
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="同时进行的请求数")
+    arg_parser.add_argument("--retries", type=int, default=3, help="单个请求的重试次数")
+    args = arg_parser.parse_args()
+
+    if not DEEPSEEK_API_KEY:
+        raise SystemExit("请先设置 DEEPSEEK_API_KEY")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    stats = precompute(
+        LectureManager(args.lecture_dir),
+        DeepSeekClient(api_key=DEEPSEEK_API_KEY, model=DEEPSEEK_MODEL, base_url=DEEPSEEK_BASE_URL),
+        PrecomputedStore(args.db_path),
+        concurrency=args.concurrency,
+        retries=args.retries,
+        top_k=RETRIEVAL_TOP_K,
+        max_chars=RETRIEVAL_MAX_CHARS,
+        chunk_chars=RETRIEVAL_CHUNK_CHARS
+    )
+    print(f"共 {stats['total']} 个待生成，成功 {stats['done']}，失败 {stats['failed']}")
+    if stats["failed"]:
+        print("可重新运行本命令继续生成失败的部分")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""进程级资源：在所有会话和脚本重跑之间共享的客户端、数据库和管理器
+
+Streamlit 每次交互都会从头重跑 app.py，脚本中创建的对象只能活一次重跑。
+这里按名称保存进程内只创建一次的资源，重跑时只是一次字典查找：
+- 首次获取时调用工厂函数创建，同名资源并发获取时只创建一次
+- 每隔 check_interval 秒在获取时做一次健康检查（检查资源自身的状态，如后台线程
+  是否还在运行，不访问外部服务）；检查失败时关闭旧实例并重新创建
+- 资源可以声明依赖的其他资源，被依赖的资源重建或关闭时，依赖它的资源先关闭，
+  下次获取时重新创建
+- 进程退出时按创建的相反顺序关闭（依赖方先于被依赖方），在各模块自己注册的
+  退出处理之前执行；各资源的关闭函数需可重复调用
+
+外部服务暂时不可用（如 Redis 断开）由各客户端的连接池自行重连，不会触发重建。
+"""
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 默认的健康检查间隔（秒）
+DEFAULT_CHECK_INTERVAL = 30.0
+
+
+class Resource:
+    """一个进程级资源及其生命周期信息"""
+    __slots__ = ("name", "value", "health_check", "close", "depends", "created_at",
+                 "checked_at", "healthy", "recreations")
+
+    def __init__(self, name: Hashable, value: Any, health_check: Optional[Callable[[Any], bool]],
+                 close: Optional[Callable[[Any], None]], depends: Iterable[Hashable]):
+        self.name = name
+        self.value = value
+        self.health_check = health_check
+        self.close = close
+        self.depends = tuple(depends)
+        self.created_at = time.time()
+        self.checked_at = time.monotonic()
+        self.healthy = True
+        self.recreations = 0
+
+
+class ResourceRegistry:
+    """按名称管理进程级资源的创建、健康检查和关闭"""
+
+    def __init__(self, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._resources: Dict[Hashable, Resource] = {}
+        self._lock = threading.RLock()
+
+    def get(self, name: Hashable, factory: Callable[[], Any],
+            health_check: Optional[Callable[[Any], bool]] = None,
+            close: Optional[Callable[[Any], None]] = None,
+            depends: Iterable[Hashable] = ()) -> Any:
+        """获取资源，不存在或健康检查失败时调用 factory 创建
+
+        health_check(value) 返回 False 表示实例已不可用；close(value) 释放实例。
+        depends 为所依赖资源的名称（需先于本资源获取）。
+        """
+        resource = self._resources.get(name)
+        if resource is not None:
+            if (resource.health_check is None
+                    or time.monotonic() - resource.checked_at < self.check_interval):
+                return resource.value
+        with self._lock:
+            resource = self._resources.get(name)
+            if resource is not None:
+                if self._check(resource):
+                    return resource.value
+                recreations = resource.recreations + 1
+                self._close(name)
+                metrics.inc("javahelper_resource_recreations_total", resource=str(name))
+            else:
+                recreations = 0
+            resource = Resource(name, factory(), health_check, close, depends)
+            resource.recreations = recreations
+            self._resources[name] = resource
+            # 保持在退出处理函数的最后注册：先于各模块自己注册的关闭函数执行，按依赖顺序关闭
+            atexit.unregister(self.close)
+            atexit.register(self.close)
+            return resource.value
+
+    def _check(self, resource: Resource) -> bool:
+        """健康检查（已持有锁）；距上次检查不足 check_interval 时直接通过"""
+        if resource.health_check is None:
+            return True
+        now = time.monotonic()
+        if now - resource.checked_at < self.check_interval:
+            return resource.healthy
+        try:
+            resource.healthy = bool(resource.health_check(resource.value))
+        except Exception:
+            logger.exception("资源 %s 健康检查出错", resource.name)
+            resource.healthy = False
+        resource.checked_at = now
+        if not resource.healthy:
+            logger.warning("资源 %s 健康检查失败，重新创建", resource.name)
+        return resource.healthy
+
+    def _close(self, name: Hashable):
+        """关闭资源及依赖它的资源（已持有锁）"""
+        resource = self._resources.pop(name, None)
+        if resource is None:
+            return
+        dependents = [other.name for other in self._resources.values() if name in other.depends]
+        for dependent in dependents:
+            self._close(dependent)
+        if resource.close is not None:
+            try:
+                resource.close(resource.value)
+            except Exception:
+                logger.exception("关闭资源 %s 出错", name)
+
+    def close(self, name: Optional[Hashable] = None):
+        """关闭指定资源；不指定时按创建的相反顺序关闭全部资源"""
+        with self._lock:
+            if name is not None:
+                self._close(name)
+                return
+            for resource_name in reversed(list(self._resources)):
+                self._close(resource_name)
+
+    def __contains__(self, name: Hashable) -> bool:
+        return name in self._resources
+
+    def status(self) -> List[Dict[str, Any]]:
+        """各资源的状态（不触发健康检查）"""
+        with self._lock:
+            return [
+                {
+                    "name": str(resource.name),
+                    "type": type(resource.value).__name__,
+                    "created_at": resource.created_at,
+                    "healthy": resource.healthy,
+                    "recreations": resource.recreations,
+                    "depends": [str(name) for name in resource.depends],
+                }
+                for resource in self._resources.values()
+            ]
+
+
+# 应用使用的全局资源表
+registry = ResourceRegistry()
+
+
+def get_resource(name: Hashable, factory: Callable[[], Any],
+                 health_check: Optional[Callable[[Any], bool]] = None,
+                 close: Optional[Callable[[Any], None]] = None,
+                 depends: Iterable[Hashable] = ()) -> Any:
+    """从全局资源表获取资源（参数见 ResourceRegistry.get）"""
+    return registry.get(name, factory, health_check=health_check, close=close, depends=depends)
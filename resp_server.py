@@ -0,0 +1,411 @@
+"""本地的 Redis 兼容服务
+
+没有 Redis 时用于多机部署的开发和测试：实现共享后端用到的 RESP2 命令
+（PING、AUTH、SELECT、GET、SET [NX] [EX|PX]、DEL、EXISTS、EXPIRE、PEXPIRE、INCRBY、RPUSH、LRANGE、LTRIM、
+LLEN、HGET、HSET、HDEL、ZADD、ZRANGE、ZREM、ZCARD、SCAN [MATCH] [COUNT]、DBSIZE、FLUSHDB）。
+有序集合只保存 成员 -> 分数，ZRANGE 时排序，只适合开发测试的数据量。数据只保存在内存中，服务重启后丢失；生产环境请使用 Redis。
+
+用法: python resp_server.py --host 0.0.0.0 --port 6379 [--password 密码]
+"""
+import argparse
+import asyncio
+import bisect
+import logging
+import re
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from shared_backend import _list_range
+
+logger = logging.getLogger(__name__)
+
+_WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+
+def _glob_to_regex(pattern: bytes) -> "re.Pattern[bytes]":
+    """Redis 风格的通配符（* ? [...] [^...] 和反斜杠转义）转换为正则表达式"""
+    parts = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index:index + 1]
+        if char == b"\\" and index + 1 < len(pattern):
+            index += 1
+            parts.append(re.escape(pattern[index:index + 1]))
+        elif char == b"*":
+            parts.append(b".*")
+        elif char == b"?":
+            parts.append(b".")
+        elif char == b"[":
+            end = pattern.find(b"]", index + 1)
+            if end < 0:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[index + 1:end]
+                negate = body.startswith(b"^")
+                if negate:
+                    body = body[1:]
+                parts.append(b"[" + (b"^" if negate else b"") + body.replace(b"\\", b"\\\\") + b"]")
+                index = end
+        else:
+            parts.append(re.escape(char))
+        index += 1
+    return re.compile(b"".join(parts) + b"\\Z", re.DOTALL)
+
+
+class _Reply:
+    """RESP2 响应编码"""
+
+    @staticmethod
+    def simple(text: str) -> bytes:
+        return b"+%s\r\n" % text.encode("utf-8")
+
+    @staticmethod
+    def error(text: str) -> bytes:
+        return b"-%s\r\n" % text.encode("utf-8")
+
+    @staticmethod
+    def integer(value: int) -> bytes:
+        return b":%d\r\n" % value
+
+    @staticmethod
+    def bulk(value: Optional[bytes]) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    @classmethod
+    def array(cls, values: List[bytes]) -> bytes:
+        return b"*%d\r\n" % len(values) + b"".join(cls.bulk(value) for value in values)
+
+
+class _SortedSet(dict):
+    """有序集合：成员 -> 分数"""
+
+
+class RespStore:
+    """按库号划分的内存数据：键 -> (值, 过期时间)，值为 bytes、list、dict（哈希）或 _SortedSet"""
+
+    def __init__(self):
+        self.databases: Dict[int, Dict[bytes, Tuple[object, Optional[float]]]] = {}
+
+    def db(self, index: int) -> Dict[bytes, Tuple[object, Optional[float]]]:
+        return self.databases.setdefault(index, {})
+
+    @staticmethod
+    def lookup(data: dict, key: bytes):
+        entry = data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del data[key]
+            return None
+        return value
+
+
+class RespServer:
+    def __init__(self, password: Optional[str] = None):
+        self.password = password.encode("utf-8") if password else None
+        self.store = RespStore()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = {"db": 0, "authenticated": self.password is None}
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                name = args[0].upper()
+                if name == b"QUIT":
+                    writer.write(_Reply.simple("OK"))
+                    break
+                writer.write(self.execute(session, name, args[1:]))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # 内联命令（如 telnet 中直接输入）
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = await reader.readline()
+            length = int(header[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def execute(self, session: dict, name: bytes, args: List[bytes]) -> bytes:
+        if name == b"AUTH":
+            if self.password is None or args[-1:] == [self.password]:
+                session["authenticated"] = True
+                return _Reply.simple("OK")
+            return _Reply.error("WRONGPASS invalid password")
+        if not session["authenticated"]:
+            return _Reply.error("NOAUTH Authentication required.")
+        handler = getattr(self, f"_cmd_{name.decode('ascii', 'replace').lower()}", None)
+        if handler is None:
+            return _Reply.error(f"ERR unknown command '{name.decode('utf-8', 'replace')}'")
+        try:
+            return handler(session, self.store.db(session["db"]), args)
+        except (IndexError, ValueError):
+            return _Reply.error(f"ERR wrong arguments for '{name.decode('utf-8', 'replace')}' command")
+
+    def _cmd_ping(self, session, data, args):
+        return _Reply.bulk(args[0]) if args else _Reply.simple("PONG")
+
+    def _cmd_select(self, session, data, args):
+        session["db"] = int(args[0])
+        return _Reply.simple("OK")
+
+    def _cmd_get(self, session, data, args):
+        value = RespStore.lookup(data, args[0])
+        if value is not None and not isinstance(value, bytes):
+            return _Reply.error(_WRONGTYPE)
+        return _Reply.bulk(value)
+
+    def _cmd_set(self, session, data, args):
+        key, value = args[0], args[1]
+        expires_at = None
+        only_if_absent = False
+        options = [option.upper() for option in args[2:]]
+        index = 0
+        while index < len(options):
+            option = options[index]
+            if option == b"NX":
+                only_if_absent = True
+            elif option in (b"EX", b"PX"):
+                amount = float(args[2 + index + 1])
+                expires_at = time.time() + (amount if option == b"EX" else amount / 1000)
+                index += 1
+            else:
+                raise ValueError(option)
+            index += 1
+        if only_if_absent and RespStore.lookup(data, key) is not None:
+            return _Reply.bulk(None)
+        data[key] = (value, expires_at)
+        return _Reply.simple("OK")
+
+    def _cmd_del(self, session, data, args):
+        return _Reply.integer(sum(1 for key in args if data.pop(key, None) is not None))
+
+    def _cmd_exists(self, session, data, args):
+        return _Reply.integer(sum(1 for key in args if RespStore.lookup(data, key) is not None))
+
+    def _cmd_expire(self, session, data, args):
+        return self._set_expiry(data, args[0], float(args[1]))
+
+    def _cmd_pexpire(self, session, data, args):
+        return self._set_expiry(data, args[0], float(args[1]) / 1000)
+
+    @staticmethod
+    def _set_expiry(data, key: bytes, seconds: float) -> bytes:
+        value = RespStore.lookup(data, key)
+        if value is None:
+            return _Reply.integer(0)
+        data[key] = (value, time.time() + seconds)
+        return _Reply.integer(1)
+
+    def _cmd_incrby(self, session, data, args):
+        key = args[0]
+        entry = data.get(key)
+        value = RespStore.lookup(data, key)
+        if value is not None and not isinstance(value, bytes):
+            return _Reply.error(_WRONGTYPE)
+        try:
+            number = int(value or b"0") + int(args[1])
+        except ValueError:
+            return _Reply.error("ERR value is not an integer or out of range")
+        # 与 Redis 相同，保留原有的过期时间
+        data[key] = (str(number).encode("ascii"), entry[1] if value is not None else None)
+        return _Reply.integer(number)
+
+    def _typed(self, data, key: bytes, kind: type, create: bool = False):
+        """取出指定类型的值；类型不符时抛出 TypeError"""
+        value = RespStore.lookup(data, key)
+        if value is None and create:
+            value = kind()
+            data[key] = (value, None)
+        if value is not None and type(value) is not kind:
+            raise TypeError
+        return value
+
+    def _list(self, data, key: bytes, create: bool = False) -> Optional[list]:
+        return self._typed(data, key, list, create)
+
+    def _cmd_rpush(self, session, data, args):
+        try:
+            items = self._list(data, args[0], create=True)
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        items.extend(args[1:])
+        return _Reply.integer(len(items))
+
+    def _cmd_lrange(self, session, data, args):
+        try:
+            items = self._list(data, args[0]) or []
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        span = _list_range(len(items), int(args[1]), int(args[2]))
+        return _Reply.array(items[span.start:span.stop] if span else [])
+
+    def _cmd_ltrim(self, session, data, args):
+        try:
+            items = self._list(data, args[0])
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        if items is not None:
+            span = _list_range(len(items), int(args[1]), int(args[2]))
+            if span is None:
+                del data[args[0]]
+            else:
+                items[:] = items[span.start:span.stop]
+        return _Reply.simple("OK")
+
+    def _cmd_llen(self, session, data, args):
+        try:
+            return _Reply.integer(len(self._list(data, args[0]) or []))
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+
+    def _cmd_hget(self, session, data, args):
+        try:
+            fields = self._typed(data, args[0], dict) or {}
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        return _Reply.bulk(fields.get(args[1]))
+
+    def _cmd_hset(self, session, data, args):
+        if len(args) < 3 or len(args) % 2 == 0:
+            raise ValueError
+        try:
+            fields = self._typed(data, args[0], dict, create=True)
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        added = 0
+        for index in range(1, len(args), 2):
+            added += args[index] not in fields
+            fields[args[index]] = args[index + 1]
+        return _Reply.integer(added)
+
+    def _cmd_hdel(self, session, data, args):
+        try:
+            fields = self._typed(data, args[0], dict)
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        if fields is None:
+            return _Reply.integer(0)
+        removed = sum(1 for field in args[1:] if fields.pop(field, None) is not None)
+        if not fields:
+            del data[args[0]]
+        return _Reply.integer(removed)
+
+    def _cmd_zadd(self, session, data, args):
+        if len(args) < 3 or len(args) % 2 == 0:
+            raise ValueError
+        pairs = [(float(args[index]), args[index + 1]) for index in range(1, len(args), 2)]
+        try:
+            members = self._typed(data, args[0], _SortedSet, create=True)
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        added = 0
+        for score, member in pairs:
+            added += member not in members
+            members[member] = score
+        return _Reply.integer(added)
+
+    def _cmd_zrange(self, session, data, args):
+        try:
+            members = self._typed(data, args[0], _SortedSet) or {}
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        span = _list_range(len(members), int(args[1]), int(args[2]))
+        if span is None:
+            return _Reply.array([])
+        ranked = sorted(members, key=lambda member: (members[member], member))
+        return _Reply.array(ranked[span.start:span.stop])
+
+    def _cmd_zrem(self, session, data, args):
+        try:
+            members = self._typed(data, args[0], _SortedSet)
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+        if members is None:
+            return _Reply.integer(0)
+        removed = sum(1 for member in args[1:] if members.pop(member, None) is not None)
+        if not members:
+            del data[args[0]]
+        return _Reply.integer(removed)
+
+    def _cmd_zcard(self, session, data, args):
+        try:
+            return _Reply.integer(len(self._typed(data, args[0], _SortedSet) or {}))
+        except TypeError:
+            return _Reply.error(_WRONGTYPE)
+
+    def _cmd_scan(self, session, data, args):
+        """键按 CRC32 排序，游标为下一个要返回的 CRC32 值：扫描期间删除键不会跳过其他键，
+        扫描期间新增的键可能不返回（与 Redis 的保证相同）"""
+        cursor = int(args[0])
+        pattern, count = None, 10
+        options = args[1:]
+        for index in range(0, len(options) - 1, 2):
+            option = options[index].upper()
+            if option == b"MATCH":
+                pattern = _glob_to_regex(options[index + 1])
+            elif option == b"COUNT":
+                count = max(int(options[index + 1]), 1)
+            else:
+                raise ValueError(option)
+        keys = sorted((zlib.crc32(key), key) for key in data)
+        start = bisect.bisect_left(keys, (cursor, b""))
+        end = min(start + count, len(keys))
+        # 同一个 CRC32 的键在同一批中返回
+        while 0 < end < len(keys) and keys[end][0] == keys[end - 1][0]:
+            end += 1
+        batch = [key for _, key in keys[start:end]]
+        next_cursor = keys[end - 1][0] + 1 if end < len(keys) else 0
+        matched = [key for key in batch
+                   if (pattern is None or pattern.match(key)) and RespStore.lookup(data, key) is not None]
+        return b"*2\r\n" + _Reply.bulk(str(next_cursor).encode("ascii")) + _Reply.array(matched)
+
+    def _cmd_dbsize(self, session, data, args):
+        return _Reply.integer(len(data))
+
+    def _cmd_flushdb(self, session, data, args):
+        data.clear()
+        return _Reply.simple("OK")
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6379, password: Optional[str] = None):
+    server = await asyncio.start_server(RespServer(password).handle, host, port)
+    logger.info("Redis 兼容服务已启动: %s:%d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="本地的 Redis 兼容服务（内存存储）")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=6379)
+    arg_parser.add_argument("--password")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.password))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
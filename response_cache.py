@@ -0,0 +1,333 @@
+"""DeepSeek 响应缓存
+
+以规范化后的消息列表、模型和系统提示词为键缓存完整回答。
+命中时把缓存的文本按小块重新产出，界面上仍然是流式显示，但没有网络延迟和 token 消耗。
+后端可选进程内 LRU（MemoryCacheBackend）或磁盘上的 SQLite（SQLiteCacheBackend），
+均支持过期时间和按条数/字节数淘汰；多个应用进程共享缓存时使用共享后端
+（SharedCacheBackend，按写入先后淘汰超出条数/字节数的条目）。
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Generator, List, Optional, Tuple
+from shared_backend import SharedBackend
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class CacheBackend:
+    """缓存后端接口"""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[float]):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, Optional[float], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float]):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """磁盘上的 SQLite 缓存，进程重启后依然有效，多个进程可共享"""
+
+    def __init__(self, db_path: str = "response_cache.db", max_entries: int = 100000,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                size INTEGER,
+                expires_at REAL,
+                accessed_at REAL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float]):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires_at, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """删除过期条目，再按最近访问时间淘汰超出容量的条目"""
+        self._conn.execute(
+            "DELETE FROM response_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        )
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM response_cache ORDER BY accessed_at"
+        ).fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+
+class SharedCacheBackend(CacheBackend):
+    """保存在共享后端中的缓存，所有应用进程（可在不同机器上）共用
+
+    INDEX_KEY 有序集合按写入时间记录各缓存键，SIZES_KEY 哈希记录各条目的字节数，
+    BYTES_KEY 计数器记录总字节数；重复写入同一个键时替换原记录，每次写入的开销
+    与条目总数无关。超出条数或字节数时从最早写入的条目开始删除；多个进程同时写入
+    同一个键时统计可能略有偏差，过期时间照常生效。
+    """
+
+    PREFIX = "response:"
+    INDEX_KEY = PREFIX + "index"
+    SIZES_KEY = PREFIX + "sizes"
+    BYTES_KEY = PREFIX + "bytes"
+    # 每次淘汰最多取出的条目数
+    EVICT_BATCH = 32
+
+    def __init__(self, shared: SharedBackend, max_entries: int = 1000,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.shared = shared
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.shared.get(self.PREFIX + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str, ttl: Optional[float]):
+        data = value.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        self.shared.set(self.PREFIX + key, data, ttl)
+        previous = self.shared.hget(self.SIZES_KEY, key)
+        self.shared.hset(self.SIZES_KEY, key, str(len(data)).encode("ascii"))
+        self.shared.zadd(self.INDEX_KEY, time.time(), key)
+        total = self.shared.incrby(self.BYTES_KEY, len(data) - int(previous or 0))
+        self._evict(total)
+
+    def _forget(self, key: str) -> int:
+        """从索引中移除一个键并扣除其字节数，返回新的总字节数；其他进程已移除时返回 -1"""
+        if not self.shared.zrem(self.INDEX_KEY, key):
+            return -1
+        size = self.shared.hget(self.SIZES_KEY, key)
+        self.shared.hdel(self.SIZES_KEY, key)
+        return self.shared.incrby(self.BYTES_KEY, -int(size or 0))
+
+    def _evict(self, total: int):
+        """按写入先后删除超出容量的条目"""
+        count = self.shared.zcard(self.INDEX_KEY)
+        while count > self.max_entries or total > self.max_bytes:
+            batch = min(max(count - self.max_entries, 1), self.EVICT_BATCH)
+            oldest = self.shared.zrange(self.INDEX_KEY, 0, batch - 1)
+            if not oldest:
+                break
+            for member in oldest:
+                if count <= self.max_entries and total <= self.max_bytes:
+                    return
+                key = member.decode("ascii")
+                self.shared.delete(self.PREFIX + key)
+                remaining = self._forget(key)
+                if remaining >= 0:
+                    total = remaining
+                count -= 1
+
+    def delete(self, key: str):
+        self.shared.delete(self.PREFIX + key)
+        self._forget(key)
+
+    def clear(self):
+        self.shared.delete_prefix(self.PREFIX)
+
+
+class ResponseCache:
+    """带命中统计的响应缓存"""
+
+    def __init__(self, backend: CacheBackend, ttl: Optional[float] = 7 * 24 * 3600,
+                 replay_chunk_size: int = 16):
+        self.backend = backend
+        self.ttl = ttl
+        self.replay_chunk_size = replay_chunk_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(messages: List[Dict[str, str]], model: str, system_prompt: str) -> str:
+        """规范化消息（去除首尾空白、合并连续空白）后计算缓存键"""
+        def normalize(text: str) -> str:
+            return _WHITESPACE.sub(" ", (text or "").strip())
+
+        payload = {
+            "model": model,
+            "system": normalize(system_prompt),
+            "messages": [
+                [message["role"], normalize(message["content"])] for message in messages
+            ],
+        }
+        raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        self.backend.set(key, value, self.ttl)
+
+    def replay(self, text: str) -> Generator[str, None, None]:
+        """把缓存的完整回答按小块产出，保持与流式响应相同的用法"""
+        for start in range(0, len(text), self.replay_chunk_size):
+            yield text[start:start + self.replay_chunk_size]
+
+    def stats(self) -> Dict[str, float]:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_caches: Dict[tuple, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(backend: str = "memory", ttl: Optional[float] = 7 * 24 * 3600,
+                       max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                       db_path: str = "response_cache.db",
+                       shared: Optional[SharedBackend] = None) -> Optional[ResponseCache]:
+    """获取进程内共享的响应缓存；backend 为 none 时返回 None（不缓存），
+    为 shared 时使用传入的共享后端"""
+    backend = backend.lower()
+    if backend == "none":
+        return None
+
+    key = (backend, ttl, max_entries, max_bytes, db_path, shared)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            if backend == "memory":
+                store = MemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
+            elif backend == "sqlite":
+                store = SQLiteCacheBackend(db_path, max_entries=max_entries, max_bytes=max_bytes)
+            elif backend == "shared":
+                if shared is None:
+                    raise ValueError("使用 shared 缓存后端时需要配置 SHARED_BACKEND")
+                store = SharedCacheBackend(shared, max_entries=max_entries, max_bytes=max_bytes)
+            else:
+                raise ValueError(f"不支持的缓存后端: {backend}")
+            cache = _caches[key] = ResponseCache(store, ttl=ttl)
+        return cache
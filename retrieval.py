@@ -0,0 +1,193 @@
+"""教案内容的本地检索（BM25）
+
+把教案每个节点的正文和AI提示词切分为若干片段，建立 BM25 索引。
+提问时只检索与问题最相关的前 k 个片段附加到系统提示词中，
+不再需要把整节内容粘贴进提问，请求更小，首 token 更快。
+
+每个词的 BM25 权重在建索引时预先算好（按片段存成 NumPy 数组），
+查询时只需把各查询词的权重向量累加到得分数组上，再用 argpartition 取前 k。
+"""
+import threading
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from doc_parser import CODE_FENCE
+from search_index import tokenize
+
+CHUNK_CHARS = 600
+# 与最相关片段的得分之比低于该值的片段不附加
+MIN_SCORE_RATIO = 0.5
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """按段落切分并合并到不超过 max_chars 的片段；代码块不从中间断开（超长时除外）"""
+    paragraphs = []
+    buffer = []
+    in_fence = False
+    for line in text.split("\n"):
+        if line.lstrip().startswith(CODE_FENCE):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if buffer:
+                paragraphs.append("\n".join(buffer))
+                buffer = []
+            continue
+        buffer.append(line)
+    if buffer:
+        paragraphs.append("\n".join(buffer))
+
+    chunks = []
+    current = ""
+    for paragraph in paragraphs:
+        while len(paragraph) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    """向量化的 BM25 打分器"""
+
+    def __init__(self, documents: List[str], k1: float = 1.2, b: float = 0.75):
+        self.size = len(documents)
+        doc_tokens = [tokenize(document) for document in documents]
+        lengths = np.array([len(tokens) for tokens in doc_tokens], dtype=np.float32)
+        average = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+        norms = k1 * (1 - b + b * lengths / average)
+
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for doc, tokens in enumerate(doc_tokens):
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                docs, tfs = postings.setdefault(token, ([], []))
+                docs.append(doc)
+                tfs.append(tf)
+
+        # 词 -> (片段编号数组, 该词在各片段上的 BM25 权重)
+        self._terms: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for token, (docs, tfs) in postings.items():
+            docs = np.array(docs, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = np.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            self._terms[token] = (docs, (idf * tfs * (k1 + 1) / (tfs + norms[docs])).astype(np.float32))
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term = self._terms.get(token)
+            if term is not None:
+                # 同一个词在每个片段中只出现一次，可以直接按下标累加
+                scores[term[0]] += term[1]
+        return scores
+
+    def top_k(self, query: str, k: int, boost: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """返回得分最高的 k 个片段 (编号, 得分)，不含得分为 0 的片段"""
+        if not self.size or k <= 0:
+            return []
+        scores = self.scores(query)
+        if boost is not None:
+            scores *= boost
+        k = min(k, self.size)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in ranked if scores[i] > 0]
+
+
+class LectureRetriever:
+    """一个教案的片段检索"""
+
+    def __init__(self, parser, chunk_chars: int = CHUNK_CHARS):
+        self.chunks: List[Tuple[str, str, str]] = []  # (节点标识, 标题, 片段文本)
+        navigation = parser.navigation
+        for key, entry in navigation.entries.items():
+            node = entry.node
+            content = node.content
+            # 正文第一行是节点自身的标题
+            if content.startswith("#"):
+                content = content.split("\n", 1)[1] if "\n" in content else ""
+            for text in (content, node.prompt or ""):
+                for chunk in chunk_text(text.strip(), chunk_chars):
+                    self.chunks.append((key, entry.title, chunk))
+        self._node_ids = np.array([chunk[0] for chunk in self.chunks], dtype=object)
+        # 标题参与打分
+        self.index = BM25Index([f"{title}\n{text}" for _, title, text in self.chunks])
+
+    def retrieve(self, query: str, k: int = 3, node_id: Optional[str] = None,
+                 node_boost: float = 1.5, min_ratio: float = MIN_SCORE_RATIO) -> List[Tuple[str, str, str]]:
+        """检索最相关的 k 个片段
+
+        node_id 所在节点（当前页面）的片段得分乘以 node_boost；
+        得分低于最高分 min_ratio 倍的片段相关性太弱，不返回
+        """
+        boost = None
+        if node_id is not None and self.chunks:
+            boost = np.where(self._node_ids == node_id, node_boost, 1.0).astype(np.float32)
+        ranked = self.index.top_k(query, k, boost)
+        if not ranked:
+            return []
+        floor = ranked[0][1] * min_ratio
+        return [self.chunks[i] for i, score in ranked if score >= floor]
+
+    def references(self, query: str, k: int = 3, node_id: Optional[str] = None,
+                   max_chars: int = 1500) -> List[str]:
+        """检索结果格式化为附加到系统提示词中的参考片段，总长度不超过 max_chars
+
+        提问本身已包含的片段（例如原样提交的教案提示词）不再重复附加
+        """
+        references = []
+        total = 0
+        for _, title, text in self.retrieve(query, k + 1, node_id):
+            if text in query:
+                continue
+            if len(references) == k:
+                break
+            reference = f"【{title}】\n{text}"
+            if total + len(reference) > max_chars:
+                remaining = max_chars - total
+                if remaining > 100:
+                    references.append(reference[:remaining] + "…")
+                break
+            references.append(reference)
+            total += len(reference)
+        return references
+
+
+_retrievers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_retrievers_lock = threading.Lock()
+
+
+def get_retriever(parser, chunk_chars: int = CHUNK_CHARS) -> LectureRetriever:
+    """获取解析结果对应的检索器；同一份（冻结的）解析结果按每种片段长度只建一次索引，
+    教案更新后随之重建"""
+    with _retrievers_lock:
+        # 解析结果 -> {片段长度: 检索器}
+        by_chunk = _retrievers.get(parser)
+        if by_chunk is None:
+            by_chunk = _retrievers[parser] = {}
+        retriever = by_chunk.get(chunk_chars)
+        if retriever is None:
+            retriever = by_chunk[chunk_chars] = LectureRetriever(parser, chunk_chars)
+        return retriever
+
+
+def lecture_references(parser, question: str, node_id: str, sub_section: str, k: int = 3,
+                       max_chars: int = 1500, chunk_chars: int = CHUNK_CHARS) -> List[str]:
+    """提问时附加到系统提示词中的教案片段（页面提问和预生成回答共用，保证请求相同）"""
+    if k <= 0:
+        return []
+    return get_retriever(parser, chunk_chars).references(
+        f"{sub_section} {question}", k=k, node_id=node_id, max_chars=max_chars
+    )
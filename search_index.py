@@ -0,0 +1,253 @@
+"""教案全文检索
+
+进程内的倒排索引，覆盖所有教案每个节点的标题、正文和AI提示词：
+- 英文/数字按单词切分（转小写），中文按相邻两字（bigram）切分，
+  单字查询展开为包含该字的所有 bigram
+- 标题权重高于正文；词频做饱和处理，按 idf 加权求和排序
+- 以教案为单位增量更新：解析结果或内容哈希未变的教案直接跳过，
+  变化的教案先删除旧文档再重新加入
+"""
+import math
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Set
+
+_CJK_RANGES = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN = re.compile(f"[0-9a-z_]+|[{_CJK_RANGES}]+")
+_CJK = re.compile(f"[{_CJK_RANGES}]")
+
+# 各字段的权重
+FIELD_WEIGHTS = (("title", 3.0), ("prompt", 1.0), ("content", 1.0))
+# 词频饱和参数，与 BM25 的 k1 相同
+TF_SATURATION = 1.2
+SNIPPET_RADIUS = 40
+
+
+def tokenize(text: str) -> List[str]:
+    """切分为检索词：英文单词、中文 bigram（单个汉字成词时保留单字）"""
+    tokens = []
+    for run in _TOKEN.findall(text.lower()):
+        if _CJK.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class SearchDocument:
+    """一个可检索的节点"""
+    __slots__ = ('lecture_path', 'lecture_name', 'node_id', 'section', 'title', 'node')
+
+    def __init__(self, lecture_path: str, lecture_name: str, entry):
+        self.lecture_path = lecture_path
+        self.lecture_name = lecture_name
+        self.node_id = entry.node_id
+        self.section = entry.section
+        self.title = entry.title
+        self.node = entry.node
+
+
+class SearchResult:
+    __slots__ = ('document', 'score', 'snippet')
+
+    def __init__(self, document: SearchDocument, score: float, snippet: str):
+        self.document = document
+        self.score = score
+        self.snippet = snippet
+
+    def __getattr__(self, name):
+        return getattr(self.document, name)
+
+    def __repr__(self) -> str:
+        return f"SearchResult(node_id={self.document.node_id!r}, score={self.score:.3f})"
+
+
+class SearchIndex:
+    """所有教案节点的倒排索引"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._documents: Dict[int, SearchDocument] = {}
+        self._doc_tokens: Dict[int, List[str]] = {}
+        # 检索词 -> {文档编号: 加权后的词频得分}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # 汉字 -> 包含它的 bigram，用于单字查询
+        self._char_tokens: Dict[str, Set[str]] = {}
+        self._lectures: Dict[str, tuple] = {}  # 教案路径 -> (解析结果, 内容哈希, 文档编号列表)
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _add_document(self, document: SearchDocument) -> int:
+        node = document.node
+        fields = {"title": document.title, "prompt": node.prompt or "", "content": node.content}
+        weights: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS:
+            counts: Dict[str, int] = {}
+            for token in tokenize(fields[field]):
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                weights[token] = weights.get(token, 0.0) + weight * tf / (tf + TF_SATURATION)
+
+        doc_id = self._next_id
+        self._next_id += 1
+        self._documents[doc_id] = document
+        self._doc_tokens[doc_id] = list(weights)
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[doc_id] = weight
+            if len(token) == 2 and _CJK.match(token):
+                for char in token:
+                    self._char_tokens.setdefault(char, set()).add(token)
+        return doc_id
+
+    def _remove_document(self, doc_id: int):
+        self._documents.pop(doc_id, None)
+        for token in self._doc_tokens.pop(doc_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                if len(token) == 2 and _CJK.match(token):
+                    for char in token:
+                        tokens = self._char_tokens.get(char)
+                        if tokens is not None:
+                            tokens.discard(token)
+                            if not tokens:
+                                del self._char_tokens[char]
+
+    def index_lecture(self, lecture_path: str, lecture_name: str, parser) -> bool:
+        """加入或更新一个教案的全部节点；内容未变时跳过，返回是否重建了索引"""
+        with self._lock:
+            current = self._lectures.get(lecture_path)
+            if current is not None:
+                if current[0] is parser:
+                    return False
+                digest = parser.source.digest() if parser.source is not None else None
+                if digest is not None and digest == current[1]:
+                    self._lectures[lecture_path] = (parser, digest, current[2])
+                    return False
+                self.remove_lecture(lecture_path)
+            else:
+                digest = parser.source.digest() if parser.source is not None else None
+
+            navigation = parser.navigation
+            doc_ids = [
+                self._add_document(SearchDocument(lecture_path, lecture_name, navigation[key]))
+                for key in navigation.entries
+            ]
+            self._lectures[lecture_path] = (parser, digest, doc_ids)
+            return True
+
+    def remove_lecture(self, lecture_path: str):
+        with self._lock:
+            lecture = self._lectures.pop(lecture_path, None)
+            if lecture is not None:
+                for doc_id in lecture[2]:
+                    self._remove_document(doc_id)
+
+    def sync(self, lecture_manager) -> int:
+        """与教案目录同步：加入新的、更新变化的、删除已移除的教案，返回重建的教案数"""
+        lectures = lecture_manager.get_available_lectures()
+        changed = 0
+        for lecture in lectures:
+            parser = lecture_manager.load_lecture(lecture["path"])
+            if self.index_lecture(lecture["path"], lecture["name"], parser):
+                changed += 1
+        with self._lock:
+            current = {lecture["path"] for lecture in lectures}
+            for lecture_path in [path for path in self._lectures if path not in current]:
+                self.remove_lecture(lecture_path)
+                changed += 1
+        return changed
+
+    def _expand(self, token: str) -> Iterable[str]:
+        """单个汉字展开为包含它的所有 bigram"""
+        if len(token) == 1 and _CJK.match(token):
+            return [token] + sorted(self._char_tokens.get(token, ()))
+        return [token]
+
+    def search(self, query: str, limit: int = 10) -> List[SearchResult]:
+        """检索并按相关度排序；优先返回包含全部检索词的节点，没有时放宽为包含任一检索词"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            total = len(self._documents) or 1
+            term_postings = []
+            for term in terms:
+                merged: Dict[int, float] = {}
+                for token in self._expand(term):
+                    postings = self._postings.get(token)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + total / len(postings))
+                    for doc_id, weight in postings.items():
+                        score = idf * weight
+                        if score > merged.get(doc_id, 0.0):
+                            merged[doc_id] = score
+                term_postings.append(merged)
+
+            matched = [postings for postings in term_postings if postings]
+            if not matched:
+                return []
+            candidates = set(min(matched, key=len))
+            for postings in matched:
+                candidates.intersection_update(postings)
+            if not candidates or len(matched) < len(term_postings):
+                candidates = set().union(*matched)
+
+            scores = {
+                doc_id: sum(postings.get(doc_id, 0.0) for postings in matched)
+                for doc_id in candidates
+            }
+            query_text = query.strip().lower()
+            for doc_id in scores:
+                # 标题包含完整查询时额外加分
+                if query_text and query_text in self._documents[doc_id].title.lower():
+                    scores[doc_id] *= 1.5
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            return [
+                SearchResult(self._documents[doc_id], score,
+                             self._snippet(self._documents[doc_id], query_text, terms))
+                for doc_id, score in ranked
+            ]
+
+    @staticmethod
+    def _snippet(document: SearchDocument, query: str, terms: List[str]) -> str:
+        """截取命中位置附近的文字：优先完整查询，其次最早出现的检索词"""
+        content = document.node.content
+        # 正文第一行是节点自身的标题，不作为摘要
+        if content.startswith("#"):
+            content = content.split("\n", 1)[1] if "\n" in content else ""
+        # 小节的正文大多在AI提示词中，正文未命中时从提示词截取
+        content = "\n".join(part for part in (content.strip(), document.node.prompt or "") if part)
+        lowered = content.lower()
+        position = lowered.find(query)
+        if position == -1:
+            positions = [p for p in (lowered.find(term) for term in terms) if p != -1]
+            position = min(positions) if positions else 0
+        start = max(position - SNIPPET_RADIUS, 0)
+        end = position + SNIPPET_RADIUS
+        snippet = content[start:end].replace("\n", " ").strip()
+        return ("…" if start else "") + snippet + ("…" if end < len(content) else "")
+
+
+_indexes: Dict[str, SearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(lecture_dir: str = "lecture") -> SearchIndex:
+    """获取教案目录对应的检索索引（进程内共享）"""
+    key = os.path.abspath(lecture_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = SearchIndex()
+        return index
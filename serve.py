@@ -0,0 +1,374 @@
+"""多进程部署：启动多个应用进程，前面运行一个 TCP 负载均衡
+
+一个 Python 进程受 GIL 限制只能用满一个 CPU 核，教室里的所有学生都挤在同一个进程中。
+这里启动 N 个 Streamlit 进程（每个监听本机的一个端口），负载均衡按浏览器固定后端：
+- 浏览器的第一个请求交给当前连接数最少的健康进程，响应中附加 STICKY_COOKIE，
+  之后带着该 cookie 的连接（页面、静态资源、WebSocket、/media 文件、上传和健康检查）
+  都转发到同一个进程；会话的媒体文件和上传内容只保存在该进程的内存中
+- 进程意外退出后自动重启；浏览器重连到其他进程时，按地址栏中的会话标识恢复对话
+  （各进程需要共用对话记录：单机使用同一个 DB_PATH，多机使用 CHAT_BACKEND=shared）
+- 所有进程使用相同的 cookie 密钥
+
+用法:
+    # 单机 4 个进程，响应缓存和教案索引放在共享的 SQLite 文件中
+    SHARED_BACKEND=sqlite:///shared_state.db RESPONSE_CACHE_BACKEND=shared \\
+        python serve.py --workers 4 --port 8501
+
+    # 多机：各机器只启动应用进程，在其中一台上运行负载均衡
+    SHARED_BACKEND=redis://共享主机:6379/0 RESPONSE_CACHE_BACKEND=shared CHAT_BACKEND=shared \\
+        python serve.py --workers 4 --worker-host 0.0.0.0 --no-balancer
+    python serve.py --workers 0 --port 8501 --backend 机器A:8601 --backend 机器B:8601
+"""
+import argparse
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+_COPY_BUFFER = 64 * 1024
+# 记录浏览器所固定的后端编号的 cookie
+STICKY_COOKIE = "javahelper_backend"
+
+
+class Worker:
+    """一个 Streamlit 应用进程"""
+
+    def __init__(self, port: int, host: str = "127.0.0.1", cookie_secret: str = "",
+                 env: Optional[Dict[str, str]] = None, extra_args: Optional[List[str]] = None):
+        self.port = port
+        self.host = host
+        self.cookie_secret = cookie_secret
+        self.env = env
+        self.extra_args = extra_args or []
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+
+    def command(self) -> List[str]:
+        command = [
+            sys.executable, "-m", "streamlit", "run", APP_PATH,
+            "--server.address", self.host,
+            "--server.port", str(self.port),
+            "--server.headless", "true",
+            "--browser.gatherUsageStats", "false",
+        ]
+        return command + self.extra_args
+
+    def start(self):
+        env = dict(self.env if self.env is not None else os.environ)
+        if self.cookie_secret:
+            # streamlit 不允许在命令行中设置 cookie 密钥
+            env["STREAMLIT_SERVER_COOKIE_SECRET"] = self.cookie_secret
+        self.process = subprocess.Popen(self.command(), env=env)
+
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout: float = 10.0):
+        if not self.running():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def wait_ready(host: str, port: int, timeout: float = 60.0,
+               process: Optional[subprocess.Popen] = None) -> bool:
+    """等待 Streamlit 的健康检查接口可用；process 提前退出时返回 False"""
+    if host in ("0.0.0.0", "::"):
+        host = "127.0.0.1"
+    url = f"http://{host}:{port}/_stcore/health"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def start_workers(count: int, base_port: int, host: str = "127.0.0.1",
+                  extra_args: Optional[List[str]] = None, timeout: float = 60.0) -> List[Worker]:
+    """启动 count 个应用进程，等待全部就绪后返回"""
+    cookie_secret = secrets.token_hex(32)
+    workers = []
+    for index in range(count):
+        env = dict(os.environ)
+        # 各进程的指标端口依次加 1，避免争用同一个端口
+        metrics_port = int(env.get("METRICS_PORT", "0") or 0)
+        if metrics_port:
+            env["METRICS_PORT"] = str(metrics_port + index)
+        worker = Worker(base_port + index, host, cookie_secret, env, extra_args)
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        if not wait_ready(worker.host, worker.port, timeout, worker.process):
+            for started in workers:
+                started.stop()
+            raise RuntimeError(f"应用进程启动失败（端口 {worker.port}）")
+    return workers
+
+
+class Backend:
+    """负载均衡后面的一个应用进程"""
+    __slots__ = ("host", "port", "active", "healthy", "total")
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.active = 0
+        self.healthy = True
+        self.total = 0
+
+    def __repr__(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            data = await reader.read(_COPY_BUFFER)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        try:
+            writer.close()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """读取 HTTP 报文头（含结尾的空行）；头部过长时返回 None，数据仍留在 reader 中"""
+    try:
+        return await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError:
+        return None
+
+
+def _sticky_index(head: bytes) -> Optional[int]:
+    """从请求头的 Cookie 中取出固定的后端编号"""
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() != b"cookie":
+            continue
+        for pair in value.split(b";"):
+            key, _, number = pair.strip().partition(b"=")
+            if key == STICKY_COOKIE.encode("ascii") and number.isdigit():
+                return int(number)
+    return None
+
+
+class LoadBalancer:
+    """按浏览器固定后端的 TCP 负载均衡
+
+    请求头中的 STICKY_COOKIE 指向健康的后端时转发到该后端；否则选择连接数最少的
+    健康后端，并在该连接的第一个响应中设置 cookie。定期检查后端是否可连接，
+    固定的后端不可用时改派其他后端（浏览器重连后按会话标识恢复对话）。
+    """
+
+    def __init__(self, backends: List[Tuple[str, int]], health_interval: float = 2.0,
+                 connect_timeout: float = 2.0):
+        self.backends = [Backend(host, port) for host, port in backends]
+        self.health_interval = health_interval
+        self.connect_timeout = connect_timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def _candidates(self) -> List[Backend]:
+        healthy = [backend for backend in self.backends if backend.healthy]
+        # 全部不健康时仍然逐个尝试，避免检查失误导致整体不可用
+        return sorted(healthy or self.backends, key=lambda backend: backend.active)
+
+    async def _open(self, preferred: Optional[Backend] = None) -> Tuple[Optional[Backend], Optional[tuple]]:
+        candidates = self._candidates()
+        if preferred is not None and preferred.healthy:
+            candidates.remove(preferred)
+            candidates.insert(0, preferred)
+        for backend in candidates:
+            try:
+                streams = await asyncio.wait_for(
+                    asyncio.open_connection(backend.host, backend.port), self.connect_timeout
+                )
+            except (OSError, asyncio.TimeoutError):
+                backend.healthy = False
+                logger.warning("后端 %s 无法连接，暂时停止转发", backend)
+                continue
+            return backend, streams
+        return None, None
+
+    async def _handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        try:
+            head = await _read_head(client_reader)
+        except (ConnectionError, OSError):
+            head = b""
+        if head == b"":
+            client_writer.close()
+            return
+        # 不是 HTTP 请求或头部过长时按连接转发，不固定后端
+        is_http = head is not None and b" HTTP/1." in head.split(b"\r\n", 1)[0]
+        preferred = None
+        if is_http:
+            index = _sticky_index(head)
+            if index is not None and index < len(self.backends):
+                preferred = self.backends[index]
+
+        backend, streams = await self._open(preferred)
+        if backend is None:
+            client_writer.close()
+            return
+        backend_reader, backend_writer = streams
+        backend.active += 1
+        backend.total += 1
+        try:
+            if head is not None:
+                backend_writer.write(head)
+            if is_http and backend is not preferred:
+                await self._set_cookie(backend, backend_reader, client_writer)
+            await asyncio.gather(
+                _pipe(client_reader, backend_writer),
+                _pipe(backend_reader, client_writer)
+            )
+        except (ConnectionError, OSError):
+            backend_writer.close()
+            client_writer.close()
+        finally:
+            backend.active -= 1
+
+    async def _set_cookie(self, backend: Backend, backend_reader: asyncio.StreamReader,
+                          client_writer: asyncio.StreamWriter):
+        """转发第一个响应的报文头，并附加固定后端的 cookie"""
+        head = await _read_head(backend_reader)
+        if not head or not head.endswith(b"\r\n\r\n"):
+            # 头部过长或后端已断开时原样转发，剩余数据由 _pipe 继续复制
+            if head:
+                client_writer.write(head)
+            return
+        cookie = (f"Set-Cookie: {STICKY_COOKIE}={self.backends.index(backend)}; "
+                  f"Path=/; HttpOnly; SameSite=Lax\r\n").encode("ascii")
+        client_writer.write(head[:-2] + cookie + b"\r\n")
+
+    async def _check_health(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for backend in self.backends:
+                try:
+                    _, writer = await asyncio.wait_for(
+                        asyncio.open_connection(backend.host, backend.port), self.connect_timeout
+                    )
+                    writer.close()
+                    healthy = True
+                except (OSError, asyncio.TimeoutError):
+                    healthy = False
+                if healthy != backend.healthy:
+                    logger.info("后端 %s %s", backend, "恢复" if healthy else "不可用")
+                backend.healthy = healthy
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        asyncio.get_running_loop().create_task(self._check_health())
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    def stats(self) -> List[Dict]:
+        return [
+            {"backend": repr(backend), "active": backend.active, "total": backend.total,
+             "healthy": backend.healthy}
+            for backend in self.backends
+        ]
+
+
+async def _supervise(workers: List[Worker], interval: float = 1.0):
+    """应用进程退出后自动重启"""
+    while True:
+        await asyncio.sleep(interval)
+        for worker in workers:
+            if not worker.running():
+                worker.restarts += 1
+                logger.warning("端口 %d 的应用进程已退出（返回码 %s），重新启动",
+                               worker.port, worker.process.returncode if worker.process else None)
+                worker.start()
+
+
+async def run(args, extra_args: List[str]):
+    workers = start_workers(args.workers, args.worker_port, args.worker_host, extra_args)
+    logger.info("已启动 %d 个应用进程: %s", len(workers),
+                ", ".join(str(worker.port) for worker in workers))
+
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    balancer = None
+    if not args.no_balancer:
+        targets = [(args.worker_host if args.worker_host not in ("0.0.0.0", "::") else "127.0.0.1",
+                    worker.port) for worker in workers]
+        for backend in args.backend:
+            host, _, port = backend.rpartition(":")
+            targets.append((host or "127.0.0.1", int(port)))
+        if not targets:
+            raise SystemExit("没有可转发的应用进程")
+        balancer = LoadBalancer(targets)
+        await balancer.start(args.host, args.port)
+        logger.info("负载均衡监听 http://%s:%d", args.host, args.port)
+
+    supervisor = loop.create_task(_supervise(workers)) if workers else None
+    await stopped.wait()
+
+    if supervisor is not None:
+        supervisor.cancel()
+    if balancer is not None:
+        balancer.close()
+    for worker in workers:
+        worker.stop()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="启动多个应用进程和负载均衡",
+        epilog="-- 之后的参数原样传给 streamlit run"
+    )
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="本机应用进程数")
+    arg_parser.add_argument("--host", default="0.0.0.0", help="负载均衡监听地址")
+    arg_parser.add_argument("--port", type=int, default=8501, help="负载均衡监听端口")
+    arg_parser.add_argument("--worker-host", default="127.0.0.1", help="应用进程监听地址")
+    arg_parser.add_argument("--worker-port", type=int, default=8601, help="第一个应用进程的端口")
+    arg_parser.add_argument("--backend", action="append", default=[],
+                            help="其他机器上的应用进程（主机:端口），可重复")
+    arg_parser.add_argument("--no-balancer", action="store_true", help="只启动应用进程")
+    argv = sys.argv[1:]
+    extra_args = []
+    if "--" in argv:
+        extra_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(run(args, extra_args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""会话对话历史存储
+
+对话历史以数据库为准，内存中只保留每个会话最近访问的若干页面：
+- 打开页面时才从数据库加载该页面的历史（按 id 游标分页读取）
+- 最近访问的 max_pages 个页面保存在 LRU 中，超出时丢弃最久未访问的页面，
+  再次访问时重新从数据库加载，会话学习多久内存占用都保持不变
+- 新的问答同时追加到内存和数据库（写入由数据库的后台线程批量提交）
+- 学习历史直接从数据库读取最近的记录，浏览器刷新或服务重启后可按会话标识恢复
+
+应用进程部署在多台机器上时，对话记录改为保存在共享后端中（SharedChatStore），
+接口与 Database 中会话相关的部分相同。
+"""
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from db import Database
+from shared_backend import SharedBackend
+
+PageKey = Tuple[str, str]
+
+# 共享后端中每个会话保留的最近记录条数（用于学习历史）
+RECENT_LIMIT = 1000
+# 共享后端中会话和对话记录的保留时间（秒），每次写入时重新计时
+SHARED_CHAT_TTL = 30 * 24 * 3600
+
+
+class SharedChatStore:
+    """保存在共享后端中的会话和对话记录
+
+    - session:<会话标识>：会话信息（JSON）
+    - chat:[会话, 教案, 页面]：该页面的对话列表，每个元素为一条消息（JSON）
+    - recent:<会话标识>：会话最近的 RECENT_LIMIT 条记录，带章节信息
+    各键在最后一次写入 SHARED_CHAT_TTL 秒后过期，不再访问的会话不会一直占用共享后端。
+    学习记录统计（analytics.py）只读取 SQLite 数据库，不包含这里的记录。
+    """
+
+    def __init__(self, shared: SharedBackend, page_size: int = 500):
+        self.shared = shared
+        self.page_size = page_size
+
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    @staticmethod
+    def _page_key(session_id: str, lecture: Optional[str], page: Optional[str]) -> str:
+        return "chat:" + json.dumps([session_id, lecture, page], ensure_ascii=False)
+
+    def ensure_session(self, session_id: str):
+        created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.shared.add(
+            self._session_key(session_id),
+            json.dumps({"created_at": created_at, "lecture": None, "page": None}).encode("utf-8"),
+            SHARED_CHAT_TTL
+        )
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        raw = self.shared.get(self._session_key(session_id))
+        if raw is None:
+            return None
+        return {"session_id": session_id, **json.loads(raw)}
+
+    def update_session_position(self, session_id: str, lecture: str, page: str):
+        session = self.get_session(session_id) or {"created_at": None}
+        session.pop("session_id", None)
+        session.update(lecture=lecture, page=page)
+        self.shared.set(self._session_key(session_id), json.dumps(session).encode("utf-8"),
+                        SHARED_CHAT_TTL)
+
+    def save_chat(self, session_id: str, section: str, subsection: str,
+                  role: str, content: str, lecture: Optional[str] = None,
+                  page: Optional[str] = None):
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        page_key = self._page_key(session_id, lecture, page)
+        self.shared.rpush(
+            page_key,
+            json.dumps({"role": role, "content": content, "timestamp": timestamp},
+                       ensure_ascii=False).encode("utf-8")
+        )
+        self.shared.expire(page_key, SHARED_CHAT_TTL)
+        recent_key = f"recent:{session_id}"
+        length = self.shared.rpush(recent_key, json.dumps({
+            "section": section, "subsection": subsection, "role": role,
+            "content": content, "timestamp": timestamp
+        }, ensure_ascii=False).encode("utf-8"))
+        if length > RECENT_LIMIT:
+            self.shared.ltrim(recent_key, -RECENT_LIMIT, -1)
+        self.shared.expire(recent_key, SHARED_CHAT_TTL)
+        self.shared.expire(self._session_key(session_id), SHARED_CHAT_TTL)
+
+    def iter_chat_history(self, session_id: str, lecture: Optional[str] = None,
+                          page: Optional[str] = None) -> Iterator[Dict]:
+        """逐条产出页面的对话记录，按页读取"""
+        key = self._page_key(session_id, lecture, page)
+        start = 0
+        while True:
+            values = self.shared.lrange(key, start, start + self.page_size - 1)
+            for value in values:
+                yield json.loads(value)
+            if len(values) < self.page_size:
+                break
+            start += self.page_size
+
+    def get_recent_chat(self, session_id: str, limit: int = 50) -> List[Dict]:
+        return [json.loads(value) for value in self.shared.lrange(f"recent:{session_id}", -limit, -1)]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+
+ChatStore = Union[Database, SharedChatStore]
+
+
+class SessionStore:
+    """单个会话的对话历史：数据库持久化 + 最近访问页面的内存 LRU"""
+
+    def __init__(self, db: ChatStore, session_id: str, max_pages: int = 8):
+        self.db = db
+        self.session_id = session_id
+        self.max_pages = max(1, max_pages)
+        self._pages: "OrderedDict[PageKey, List[Dict[str, str]]]" = OrderedDict()
+        self.loads = 0
+
+    def _load(self, lecture: str, page: str) -> List[Dict[str, str]]:
+        self.loads += 1
+        return [
+            {"role": record["role"], "content": record["content"]}
+            for record in self.db.iter_chat_history(self.session_id, lecture=lecture, page=page)
+        ]
+
+    def history(self, lecture: str, page: str) -> List[Dict[str, str]]:
+        """获取页面的对话历史（不在内存中时从数据库加载）"""
+        key = (lecture, page)
+        messages = self._pages.get(key)
+        if messages is None:
+            messages = self._pages[key] = self._load(lecture, page)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(key)
+        return messages
+
+    def append(self, lecture: str, page: str, section: str, subsection: str,
+               prompt: str, response: str):
+        """追加一轮问答，并写入数据库（由后台线程批量提交，不阻塞页面）"""
+        self.history(lecture, page).extend([
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": response}
+        ])
+        self.db.save_chat(self.session_id, section, subsection, "user", prompt,
+                          lecture=lecture, page=page)
+        self.db.save_chat(self.session_id, section, subsection, "assistant", response,
+                          lecture=lecture, page=page)
+
+    def learning_history(self, limit: int = 50) -> List[Dict[str, str]]:
+        """最近的 limit 轮问答（按时间先后排列）"""
+        records = self.db.get_recent_chat(self.session_id, limit * 2)
+        items = []
+        prompt = None
+        for record in records:
+            if record["role"] == "user":
+                prompt = record
+            elif prompt is not None:
+                items.append({
+                    "section": prompt["section"],
+                    "subsection": prompt["subsection"],
+                    "prompt": prompt["content"],
+                    "response": record["content"]
+                })
+                prompt = None
+        return items[-limit:]
+
+    def cached_pages(self) -> int:
+        return len(self._pages)
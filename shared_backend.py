@@ -0,0 +1,681 @@
+"""进程间共享的状态后端
+
+多个应用进程通过共享后端使用同一份响应缓存、教案索引和对话记录：
+- SQLiteSharedBackend：单机多进程，数据保存在本地 SQLite 文件（WAL）中；
+  Linux 下可把文件放在 /dev/shm，即数据只在共享内存中
+- RedisSharedBackend：多机部署，使用 Redis 协议（RESP2），可以连接 Redis，
+  也可以连接 resp_server.py 提供的本地替代服务
+
+接口有键值、计数器、列表、哈希和有序集合几类操作，值均为 bytes，各类键都可以设置过期时间。
+后端由 URL 指定：sqlite:///shared_state.db、redis://[:密码@]主机:端口/库号
+"""
+import atexit
+import queue
+import re
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+# Redis 通配符中的特殊字符（SCAN MATCH 时需要转义）
+_GLOB_SPECIAL = re.compile(r"[*?\[\]\\]")
+
+
+class SharedBackend:
+    """共享后端接口（语义与同名 Redis 命令一致）"""
+    _closed = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """键不存在时写入，返回是否写入（SET NX）"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def rpush(self, key: str, *values: bytes) -> int:
+        raise NotImplementedError
+
+    def lrange(self, key: str, start: int, stop: int) -> List[bytes]:
+        """返回列表中 [start, stop] 的元素，负数表示从末尾数"""
+        raise NotImplementedError
+
+    def ltrim(self, key: str, start: int, stop: int):
+        """只保留列表中 [start, stop] 的元素"""
+        raise NotImplementedError
+
+    def incrby(self, key: str, amount: int) -> int:
+        """把键的整数值加上 amount（不存在时视为 0），返回新值"""
+        raise NotImplementedError
+
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def hset(self, key: str, field: str, value: bytes) -> int:
+        """返回新增的字段数（字段已存在时为 0）"""
+        raise NotImplementedError
+
+    def hdel(self, key: str, field: str) -> int:
+        raise NotImplementedError
+
+    def zadd(self, key: str, score: float, member: str) -> int:
+        """写入或更新成员的分数，返回新增的成员数"""
+        raise NotImplementedError
+
+    def zrange(self, key: str, start: int, stop: int) -> List[bytes]:
+        """按分数从小到大返回 [start, stop] 的成员"""
+        raise NotImplementedError
+
+    def zrem(self, key: str, member: str) -> int:
+        raise NotImplementedError
+
+    def zcard(self, key: str) -> int:
+        raise NotImplementedError
+
+    def expire(self, key: str, ttl: float) -> bool:
+        """设置键（各种类型）在 ttl 秒后过期，返回键是否存在"""
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str) -> int:
+        """删除以 prefix 开头的全部键（各种类型），返回删除的键数"""
+        raise NotImplementedError
+
+    def ping(self) -> bool:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def _list_range(length: int, start: int, stop: int) -> Optional[range]:
+    """把 Redis 风格的 [start, stop]（含两端，可为负数）换算为下标范围"""
+    if start < 0:
+        start = max(length + start, 0)
+    if stop < 0:
+        stop = length + stop
+    stop = min(stop, length - 1)
+    if start > stop:
+        return None
+    return range(start, stop + 1)
+
+
+class SQLiteSharedBackend(SharedBackend):
+    """单机多进程共享：所有进程打开同一个 SQLite 文件
+
+    读到已过期的键时顺带删除；写入时每隔 sweep_interval 秒清理一次全部过期的键，
+    文件大小不会因过期数据无限增长。列表、哈希和有序集合的过期时间保存在
+    shared_expires 表中。
+    """
+
+    def __init__(self, db_path: str = "shared_state.db", busy_timeout_ms: int = 5000,
+                 sweep_interval: float = 60.0):
+        self.db_path = db_path
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False,
+                                     timeout=busy_timeout_ms / 1000)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shared_kv (
+                key TEXT PRIMARY KEY,
+                value BLOB,
+                expires_at REAL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shared_list (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                value BLOB
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_shared_list_key ON shared_list (key, seq)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shared_hash (
+                key TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value BLOB,
+                PRIMARY KEY (key, field)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shared_zset (
+                key TEXT NOT NULL,
+                member TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (key, member)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_shared_zset_score ON shared_zset (key, score, member)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_shared_kv_expires ON shared_kv (expires_at) "
+            "WHERE expires_at IS NOT NULL"
+        )
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shared_expires (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_shared_expires_at ON shared_expires (expires_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM shared_kv WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                self._conn.execute(
+                    "DELETE FROM shared_kv WHERE key = ? AND expires_at <= ?", (key, now)
+                )
+                self._conn.commit()
+                return None
+        return row[0]
+
+    def _sweep(self):
+        """删除全部过期的键（已持有锁，由调用方提交）"""
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        now = time.time()
+        self._conn.execute(
+            "DELETE FROM shared_kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        )
+        for table in self._COLLECTIONS:
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE key IN "
+                "(SELECT key FROM shared_expires WHERE expires_at <= ?)", (now,)
+            )
+        self._conn.execute("DELETE FROM shared_expires WHERE expires_at <= ?", (now,))
+
+    def _purge(self, key: str):
+        """列表、哈希或有序集合已过期时删除（已持有锁）"""
+        row = self._conn.execute(
+            "SELECT expires_at FROM shared_expires WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] > time.time():
+            return
+        for table in self._COLLECTIONS + ("shared_expires",):
+            self._conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def expire(self, key: str, ttl: float) -> bool:
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._purge(key)
+            cursor = self._conn.execute(
+                "UPDATE shared_kv SET expires_at = ? WHERE key = ?", (expires_at, key)
+            )
+            if cursor.rowcount:
+                self._conn.commit()
+                return True
+            exists = self._conn.execute(
+                " UNION ALL ".join(f"SELECT 1 FROM {table} WHERE key = ?" for table in self._COLLECTIONS)
+                + " LIMIT 1", (key,) * len(self._COLLECTIONS)
+            ).fetchone()
+            if exists is None:
+                return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shared_expires (key, expires_at) VALUES (?, ?)", (key, expires_at)
+            )
+            self._conn.commit()
+            return True
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shared_kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._sweep()
+            self._conn.commit()
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            # 已过期的旧值视为不存在
+            self._conn.execute(
+                "DELETE FROM shared_kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (key, now)
+            )
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO shared_kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._sweep()
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    # 各类型数据所在的表，删除键时逐表删除
+    _COLLECTIONS = ("shared_list", "shared_hash", "shared_zset")
+    _TABLES = ("shared_kv",) + _COLLECTIONS + ("shared_expires",)
+
+    def delete(self, key: str):
+        with self._lock:
+            for table in self._TABLES:
+                self._conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def incrby(self, key: str, amount: int) -> int:
+        now = time.time()
+        with self._lock:
+            # 写入语句开启的事务持有写锁，读到的是本进程刚写入的值
+            self._conn.execute(
+                "DELETE FROM shared_kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (key, now)
+            )
+            self._conn.execute(
+                "INSERT INTO shared_kv (key, value, expires_at) VALUES (?, CAST(? AS BLOB), NULL) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "value = CAST(CAST(CAST(value AS INTEGER) + ? AS TEXT) AS BLOB)",
+                (key, str(amount), amount)
+            )
+            value = self._conn.execute(
+                "SELECT value FROM shared_kv WHERE key = ?", (key,)
+            ).fetchone()[0]
+            self._conn.commit()
+        return int(value)
+
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            self._purge(key)
+            row = self._conn.execute(
+                "SELECT value FROM shared_hash WHERE key = ? AND field = ?", (key, field)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def hset(self, key: str, field: str, value: bytes) -> int:
+        with self._lock:
+            self._purge(key)
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO shared_hash (key, field, value) VALUES (?, ?, ?)",
+                (key, field, value)
+            )
+            added = cursor.rowcount
+            if not added:
+                self._conn.execute(
+                    "UPDATE shared_hash SET value = ? WHERE key = ? AND field = ?", (value, key, field)
+                )
+            self._conn.commit()
+        return added
+
+    def hdel(self, key: str, field: str) -> int:
+        with self._lock:
+            self._purge(key)
+            cursor = self._conn.execute(
+                "DELETE FROM shared_hash WHERE key = ? AND field = ?", (key, field)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def zadd(self, key: str, score: float, member: str) -> int:
+        with self._lock:
+            self._purge(key)
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO shared_zset (key, member, score) VALUES (?, ?, ?)",
+                (key, member, score)
+            )
+            added = cursor.rowcount
+            if not added:
+                self._conn.execute(
+                    "UPDATE shared_zset SET score = ? WHERE key = ? AND member = ?", (score, key, member)
+                )
+            self._conn.commit()
+        return added
+
+    def zrange(self, key: str, start: int, stop: int) -> List[bytes]:
+        with self._lock:
+            self._purge(key)
+            length = self._conn.execute(
+                "SELECT COUNT(*) FROM shared_zset WHERE key = ?", (key,)
+            ).fetchone()[0]
+            span = _list_range(length, start, stop)
+            if span is None:
+                return []
+            rows = self._conn.execute(
+                "SELECT member FROM shared_zset WHERE key = ? ORDER BY score, member LIMIT ? OFFSET ?",
+                (key, len(span), span.start)
+            ).fetchall()
+        return [row[0].encode("utf-8") for row in rows]
+
+    def zrem(self, key: str, member: str) -> int:
+        with self._lock:
+            self._purge(key)
+            cursor = self._conn.execute(
+                "DELETE FROM shared_zset WHERE key = ? AND member = ?", (key, member)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            self._purge(key)
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM shared_zset WHERE key = ?", (key,)
+            ).fetchone()[0]
+
+    def rpush(self, key: str, *values: bytes) -> int:
+        with self._lock:
+            self._purge(key)
+            self._conn.executemany(
+                "INSERT INTO shared_list (key, value) VALUES (?, ?)",
+                [(key, value) for value in values]
+            )
+            length = self._conn.execute(
+                "SELECT COUNT(*) FROM shared_list WHERE key = ?", (key,)
+            ).fetchone()[0]
+            self._sweep()
+            self._conn.commit()
+        return length
+
+    def _range(self, key: str, start: int, stop: int) -> Optional[range]:
+        length = self._conn.execute(
+            "SELECT COUNT(*) FROM shared_list WHERE key = ?", (key,)
+        ).fetchone()[0]
+        return _list_range(length, start, stop)
+
+    def lrange(self, key: str, start: int, stop: int) -> List[bytes]:
+        with self._lock:
+            self._purge(key)
+            span = self._range(key, start, stop)
+            if span is None:
+                return []
+            rows = self._conn.execute(
+                "SELECT value FROM shared_list WHERE key = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (key, len(span), span.start)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def ltrim(self, key: str, start: int, stop: int):
+        with self._lock:
+            self._purge(key)
+            span = self._range(key, start, stop)
+            if span is None:
+                self._conn.execute("DELETE FROM shared_list WHERE key = ?", (key,))
+            else:
+                self._conn.execute(
+                    """
+                    DELETE FROM shared_list WHERE key = ? AND seq NOT IN (
+                        SELECT seq FROM shared_list WHERE key = ? ORDER BY seq LIMIT ? OFFSET ?
+                    )
+                    """,
+                    (key, key, len(span), span.start)
+                )
+            self._conn.commit()
+
+    def delete_prefix(self, prefix: str) -> int:
+        length = len(prefix)
+        keys = set()
+        with self._lock:
+            for table in self._TABLES:
+                keys.update(row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT key FROM {table} WHERE substr(key, 1, ?) = ?", (length, prefix)
+                ))
+                self._conn.execute(f"DELETE FROM {table} WHERE substr(key, 1, ?) = ?", (length, prefix))
+            self._conn.commit()
+        return len(keys)
+
+    def ping(self) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._conn.close()
+
+
+class RespError(Exception):
+    """服务端返回的错误"""
+
+
+def _encode_command(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class RespConnection:
+    """一个 RESP2 协议连接"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None,
+                 timeout: float = 5.0):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    def execute(self, *args):
+        self._sock.sendall(_encode_command(args))
+        return self._read()
+
+    def _read(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("连接已断开")
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b"+":
+            return rest.decode("utf-8")
+        if prefix == b"-":
+            raise RespError(rest.decode("utf-8"))
+        if prefix == b":":
+            return int(rest)
+        if prefix == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("连接已断开")
+            return data[:-2]
+        if prefix == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [self._read() for _ in range(count)]
+        raise RespError(f"无法识别的响应: {line!r}")
+
+    def close(self):
+        try:
+            self._reader.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class RedisSharedBackend(SharedBackend):
+    """多机共享：通过 RESP2 协议访问 Redis 或兼容服务，连接放在连接池中复用"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 5.0, pool_size: int = 8):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[RespConnection]" = queue.LifoQueue(maxsize=max(pool_size, 0))
+        self._closed = False
+
+    @classmethod
+    def from_url(cls, url: str, **options) -> "RedisSharedBackend":
+        parsed = urlparse(url)
+        db = parsed.path.lstrip("/")
+        return cls(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or 6379,
+            db=int(db) if db else 0,
+            password=unquote(parsed.password) if parsed.password else None,
+            **options
+        )
+
+    def _connect(self) -> RespConnection:
+        return RespConnection(self.host, self.port, self.db, self.password, self.timeout)
+
+    def execute(self, *args, retry: bool = True):
+        """执行一条命令；连接失效时换新连接重试一次
+
+        连接在发出命令后断开时无法知道服务端是否已执行，非幂等的命令
+        （RPUSH、INCRBY、SET NX）传 retry=False：关闭失效的连接后直接抛出异常。
+        """
+        for attempt in range(2 if retry else 1):
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                result = conn.execute(*args)
+            except (ConnectionError, OSError):
+                conn.close()
+                if attempt == 1 or not retry:
+                    raise
+                continue
+            except RespError:
+                self._release(conn)
+                raise
+            self._release(conn)
+            return result
+
+    def _release(self, conn: RespConnection):
+        if self._closed:
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            self.execute("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self.execute("SET", key, value)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        if ttl:
+            return self.execute("SET", key, value, "NX", "PX", int(ttl * 1000), retry=False) is not None
+        return self.execute("SET", key, value, "NX", retry=False) is not None
+
+    def delete(self, key: str):
+        self.execute("DEL", key)
+
+    def rpush(self, key: str, *values: bytes) -> int:
+        return self.execute("RPUSH", key, *values, retry=False)
+
+    def lrange(self, key: str, start: int, stop: int) -> List[bytes]:
+        return self.execute("LRANGE", key, start, stop)
+
+    def ltrim(self, key: str, start: int, stop: int):
+        self.execute("LTRIM", key, start, stop)
+
+    def incrby(self, key: str, amount: int) -> int:
+        return self.execute("INCRBY", key, amount, retry=False)
+
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        return self.execute("HGET", key, field)
+
+    def hset(self, key: str, field: str, value: bytes) -> int:
+        return self.execute("HSET", key, field, value)
+
+    def hdel(self, key: str, field: str) -> int:
+        return self.execute("HDEL", key, field)
+
+    def zadd(self, key: str, score: float, member: str) -> int:
+        return self.execute("ZADD", key, repr(float(score)), member)
+
+    def zrange(self, key: str, start: int, stop: int) -> List[bytes]:
+        return self.execute("ZRANGE", key, start, stop)
+
+    def zrem(self, key: str, member: str) -> int:
+        return self.execute("ZREM", key, member)
+
+    def zcard(self, key: str) -> int:
+        return self.execute("ZCARD", key)
+
+    def expire(self, key: str, ttl: float) -> bool:
+        return self.execute("PEXPIRE", key, int(ttl * 1000)) == 1
+
+    def delete_prefix(self, prefix: str) -> int:
+        """用 SCAN 逐批找出匹配的键再删除，不阻塞服务端"""
+        pattern = _GLOB_SPECIAL.sub(r"\\\g<0>", prefix) + "*"
+        deleted = 0
+        cursor = b"0"
+        while True:
+            cursor, keys = self.execute("SCAN", cursor, "MATCH", pattern, "COUNT", 1000)
+            if keys:
+                deleted += self.execute("DEL", *keys)
+            if cursor == b"0":
+                return deleted
+
+    def ping(self) -> bool:
+        try:
+            return self.execute("PING") == "PONG"
+        except (RespError, OSError):
+            return False
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def open_shared_backend(url: str) -> SharedBackend:
+    """按 URL 创建共享后端"""
+    scheme = urlparse(url).scheme
+    if scheme == "sqlite":
+        # sqlite:///相对路径 或 sqlite:////绝对路径
+        return SQLiteSharedBackend(url[len("sqlite:///"):])
+    if scheme == "redis":
+        return RedisSharedBackend.from_url(url)
+    raise ValueError(f"不支持的共享后端: {url}")
+
+
+_backends: Dict[str, SharedBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_shared_backend(url: str) -> SharedBackend:
+    """获取进程内共享的后端实例"""
+    with _backends_lock:
+        backend = _backends.get(url)
+        if backend is None or backend._closed:
+            backend = _backends[url] = open_shared_backend(url)
+            atexit.register(backend.close)
+        return backend
@@ -0,0 +1,257 @@
+"""DeepSeek 上游请求的限流与合并
+
+所有会话的请求都在同一个后台事件循环中执行（见 deepseek_client.AsyncRunner），
+因此可以在进程内统一：
+- 令牌桶限制每秒发出的请求数，信号量限制同时进行的请求数
+- 相同的请求（相同的消息和系统提示词）正在进行时不再重复发送，
+  后来者订阅同一个上游流，先收到已产生的内容，再随上游继续接收
+- 限流（429）、连接错误和服务端错误按指数退避加随机抖动重试；
+  流式响应只在尚未产出任何内容时重试
+- 统计排队等待时间、合并次数和重试次数
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """异步令牌桶；rate <= 0 表示不限流"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # 持锁等待，保证先到先得
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class UpstreamStats:
+    """上游请求统计；排队等待时间保留最近 window 次用于计算分位数"""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent_waits = deque(maxlen=window)
+
+    def record_wait(self, seconds: float):
+        self.wait_count += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        self._recent_waits.append(seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        waits = sorted(self._recent_waits)
+
+        def percentile(p: float) -> float:
+            return waits[min(int(len(waits) * p), len(waits) - 1)] if waits else 0.0
+
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failures": self.failures,
+            "queue_wait_avg": self.wait_total / self.wait_count if self.wait_count else 0.0,
+            "queue_wait_p50": percentile(0.5),
+            "queue_wait_p95": percentile(0.95),
+            "queue_wait_max": self.wait_max,
+        }
+
+
+def is_retryable(error: Exception) -> bool:
+    """限流、连接/超时错误和服务端错误可以重试；参数或鉴权错误不重试"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Flight:
+    """一个正在进行的上游流，可被多个会话同时订阅"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    async def publish(self, chunk: Optional[str] = None, error: Optional[BaseException] = None,
+                      done: bool = False):
+        async with self.changed:
+            if chunk is not None:
+                self.chunks.append(chunk)
+            if error is not None:
+                self.error = error
+            self.done = self.done or done
+            self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.chunks) or self.done)
+                pending = self.chunks[position:]
+                finished, error = self.done, self.error
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class Upstream:
+    """限流、并发控制、重试与相同请求合并"""
+
+    def __init__(self, rate: float = 0, burst: int = 10, max_concurrency: int = 8,
+                 max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 8.0,
+                 coalesce: bool = True):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.coalesce = coalesce
+        self.stats = UpstreamStats()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._streams: Dict[str, _Flight] = {}
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def _delay(self, attempt: int, error: Exception):
+        """指数退避加随机抖动；服务端给出 Retry-After 时以其为准"""
+        self.stats.retries += 1
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(self.max_backoff, self.backoff * (2 ** attempt)) * (0.5 + random.random())
+        await asyncio.sleep(delay)
+
+    async def _admit(self, queued_at: float):
+        """通过令牌桶并占用一个并发名额，记录排队时间"""
+        await self.bucket.acquire()
+        await self._semaphore.acquire()
+        self.stats.record_wait(time.monotonic() - queued_at)
+        self.stats.requests += 1
+
+    async def _call(self, request: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(self.max_retries + 1):
+            await self._admit(time.monotonic())
+            try:
+                return await request()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    self.stats.failures += 1
+                    raise
+                error = e
+            finally:
+                self._semaphore.release()
+            await self._delay(attempt, error)
+
+    async def call(self, key: Optional[str], request: Callable[[], Awaitable[T]]) -> T:
+        """执行一个非流式请求；key 相同的请求进行中时直接等待其结果
+
+        请求在独立的任务中执行，与发起者的生命周期无关：某个等待者被取消
+        （如预取超时）时只有它自己退出等待，其他等待者照常拿到结果。
+        """
+        if not self.coalesce or key is None:
+            return await self._call(request)
+
+        task = self._calls.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            task = self._calls[key] = asyncio.ensure_future(self._call(request))
+            task.add_done_callback(lambda done: self._finish_call(key, done))
+        return await asyncio.shield(task)
+
+    def _finish_call(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    async def _pump(self, key: Optional[str], flight: _Flight,
+                    open_stream: Callable[[], AsyncIterator[str]],
+                    on_complete: Optional[Callable[[str], None]]):
+        """从上游读取并分发给所有订阅者，与订阅者的生命周期无关"""
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._admit(time.monotonic())
+                try:
+                    async for chunk in open_stream():
+                        await flight.publish(chunk)
+                    break
+                except Exception as e:
+                    # 已经产出内容后无法透明重试
+                    if flight.chunks or attempt == self.max_retries or not is_retryable(e):
+                        self.stats.failures += 1
+                        raise
+                    error = e
+                finally:
+                    self._semaphore.release()
+                await self._delay(attempt, error)
+            if on_complete is not None and flight.chunks:
+                on_complete("".join(flight.chunks))
+            await flight.publish(done=True)
+        except BaseException as e:
+            await flight.publish(error=e, done=True)
+        finally:
+            if key is not None and self._streams.get(key) is flight:
+                del self._streams[key]
+
+    async def stream(self, key: Optional[str], open_stream: Callable[[], AsyncIterator[str]],
+                     on_complete: Optional[Callable[[str], None]] = None) -> AsyncIterator[str]:
+        """执行一个流式请求；key 相同的请求进行中时订阅同一个上游流
+
+        open_stream 每次调用都发起一次新的上游请求（重试时会再次调用）；
+        on_complete 在上游完整结束后以全文调用一次。
+        """
+        if not self.coalesce:
+            key = None
+        flight = self._streams.get(key) if key is not None else None
+        if flight is not None:
+            self.stats.coalesced += 1
+        else:
+            flight = _Flight()
+            if key is not None:
+                self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, open_stream, on_complete))
+
+        async for chunk in flight.subscribe():
+            yield chunk
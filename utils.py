@@ -1,6 +1,11 @@
+import re
+import time
 import streamlit as st
-import markdown
 from typing import List, Dict
+from markdown_renderer import get_renderer
+
+_LIST_ITEM = re.compile(r"\s*(?:[-*+]|\d+[.)])\s")
+_FENCE = re.compile(r"\s*(```|~~~)")
 
 def init_session_state():
     """初始化会话状态变量"""
@@ -10,9 +15,6 @@ def init_session_state():
     if "conversation_history" not in st.session_state:
         st.session_state.conversation_history = []
         
-    if "learning_history" not in st.session_state:
-        st.session_state.learning_history = []
-        
     if "current_section" not in st.session_state:
         st.session_state.current_section = None
         
@@ -20,28 +22,101 @@ def init_session_state():
         st.session_state.current_subsection = None
 
 def render_markdown(content: str) -> str:
-    """渲染markdown内容为HTML，并保持原始格式"""
-    # 使用 markdown 扩展来更好地处理内容
-    md = markdown.Markdown(extensions=[
-        'markdown.extensions.extra',  # 包含表格、代码块等扩展
-        'markdown.extensions.toc',    # 支持目录
-        'markdown.extensions.fenced_code',  # 支持代码块
-        'markdown.extensions.tables'  # 支持表格
-    ])
-    return content  # 直接返回原始内容，让 streamlit 处理 markdown
+    """返回交给 st.markdown 显示的 markdown 内容（原样返回）"""
+    return content
+
+def show_markdown(content: str, parent=None):
+    """把 markdown 渲染为 HTML（代码块已高亮，相同内容直接使用缓存）后用 st.html 显示"""
+    html = get_renderer().render(content)
+    if html:
+        (parent or st).html(html)
+
+class StreamingMarkdown:
+    """流式回答的增量渲染
+
+    - 分块保存在列表中，结束时只拼接一次
+    - 界面更新按时间间隔（或累计字符数）节流，而不是每个分块都刷新
+    - 已完成的 markdown 块（空行分隔，且不在代码块内、不会被后续列表项接续）
+      写入各自固定的占位符后不再改动，每次只重新渲染最后一个未完成的块
+    """
+
+    def __init__(self, parent=None, interval: float = 0.1, min_chars: int = 0,
+                 cursor: str = "▌"):
+        self.container = (parent or st).container()
+        self.interval = interval
+        self.min_chars = min_chars
+        self.cursor = cursor
+        self._chunks: List[str] = []
+        self._tail: List[str] = []
+        self._pending = 0
+        self._last_render = 0.0
+        self._slot = self.container.empty()
+
+    def write(self, chunk: str):
+        """追加一个分块，到达节流条件时刷新界面"""
+        if not chunk:
+            return
+        self._chunks.append(chunk)
+        self._tail.append(chunk)
+        self._pending += len(chunk)
+        now = time.monotonic()
+        if now - self._last_render >= self.interval or (self.min_chars and self._pending >= self.min_chars):
+            self._render(now)
+
+    def _render(self, now: float):
+        tail = "".join(self._tail)
+        boundary = self._stable_boundary(tail)
+        if boundary:
+            # 固定已完成的块，后续内容写入新的占位符
+            self._slot.markdown(tail[:boundary])
+            self._slot = self.container.empty()
+            tail = tail[boundary:]
+        self._tail = [tail]
+        self._slot.markdown(tail + self.cursor)
+        self._pending = 0
+        self._last_render = now
+
+    @staticmethod
+    def _stable_boundary(text: str) -> int:
+        """返回最后一个可以安全固定的块边界（其前的内容不会再改变），没有则返回 0
+
+        边界是空行之后新块的第一行：不在代码块内、没有缩进（否则可能是上一块的延续），
+        且不是接在列表之后的列表项（列表要作为整体渲染，保证编号和间距正确）。
+        最后一行可能尚未输出完整，不参与判断。
+        """
+        boundary = 0
+        offset = 0
+        in_fence = False
+        after_blank = False
+        list_block = False
+        for line in text.split("\n")[:-1]:
+            if in_fence:
+                if _FENCE.match(line):
+                    in_fence = False
+            elif not line.strip():
+                after_blank = True
+            else:
+                is_item = bool(_LIST_ITEM.match(line))
+                indented = line[:1].isspace()
+                if offset == 0:
+                    list_block = is_item
+                elif after_blank:
+                    if not indented and not (list_block and is_item):
+                        boundary = offset
+                        list_block = is_item
+                elif not indented:
+                    list_block = list_block or is_item
+                after_blank = False
+                if _FENCE.match(line):
+                    in_fence = True
+            offset += len(line) + 1
+        return boundary
+
+    def finish(self) -> str:
+        """渲染剩余内容（不带光标）并返回完整回答"""
+        self._slot.markdown("".join(self._tail))
+        return "".join(self._chunks)
 
 def add_message(role: str, content: str):
     """添加消息到对话历史"""
     st.session_state.messages.append({"role": role, "content": content})
-
-def save_learning_progress(section: str, subsection: str, prompt: str, response: str):
-    """保存学习进度"""
-    if "learning_history" not in st.session_state:
-        st.session_state.learning_history = []
-        
-    st.session_state.learning_history.append({
-        "section": section,
-        "subsection": subsection,
-        "prompt": prompt,
-        "response": response
-    })
\ No newline at end of file